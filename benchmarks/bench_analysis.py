@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Analyze.calculate with a growing number of worker processes."""
+
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BENCH_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'tests'))
+
+# pylint: disable=wrong-import-position
+
+import synthetic
+from analysis import Analyze
+
+# pylint: enable=wrong-import-position
+
+
+def main():
+    """Time calculate() for 1, 2, 4 ... --max-workers workers"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    data = synthetic.companies(args.symbols)
+    symbols = list(data)
+    workers = 1
+    single = None
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}")
+    while workers <= args.max_workers:
+        started = time.perf_counter()
+        Analyze(data, symbols, workers=workers).calculate()
+        elapsed = time.perf_counter() - started
+        single = single or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{single / elapsed:>9.1f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Fundamentals fetch throughput against the local stand-in server."""
+
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BENCH_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'tests'))
+
+# pylint: disable=wrong-import-position
+
+from fetcher import Fetcher, get_headers
+from stub_server import StubServer
+
+# pylint: enable=wrong-import-position
+
+
+def run(pages, concurrency, server):
+    """Pages per second for one concurrency level"""
+    queries = [(f"/q/S{number}/f/y/", server.url) for number in range(pages)]
+    started = time.perf_counter()
+    if concurrency:
+        with Fetcher(concurrency) as fetcher:
+            fetcher.get_many(queries)
+    else:
+        for query, url in queries:
+            requests.get(f"{url}{query}", headers=get_headers(query, url))
+    return pages / (time.perf_counter() - started)
+
+
+def main():
+    """Compare sequential requests.get with the pooled fetcher"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    with StubServer(latency=args.latency) as server:
+        for concurrency in [0, 1, 4, 16]:
+            title = f"pooled x{concurrency}" if concurrency else "requests.get"
+            print(f"{title:>14}: {run(args.pages, concurrency, server):8.1f}"
+                  " pages/s")
+
+
+if __name__ == "__main__":
+    main()
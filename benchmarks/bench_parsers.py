@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Parser backends on the saved fixture pages."""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BENCH_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'tests'))
+
+# pylint: disable=wrong-import-position
+
+import parsers
+from scrapping import Scrapper
+from stub_server import read_fixture
+
+# pylint: enable=wrong-import-position
+
+
+def listing_page(rows):
+    """usa.html with its table rows repeated up to the wanted size"""
+    page = read_fixture('usa.html')
+    table_rows = re.findall(r'<tr>\n<td>.*?</tr>', page, re.S)
+    body = '\n'.join(table_rows[number % len(table_rows)]
+                     for number in range(rows))
+    return page.replace('\n'.join(table_rows), body)
+
+
+def measure(function, html, repeat):
+    """Best time of repeat runs in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(html)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    """Compare soup, stream and lxml backends"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    pages = {'usa listing': ('parse_body', listing_page(args.rows)),
+             'shares listing': ('parse_body', read_fixture('shares.html')),
+             'financials': ('parse_body_financial',
+                            read_fixture('financials.html'))}
+    names = ['soup', 'stream'] + (['lxml'] if parsers.LXML else [])
+    print(f"{'page':>16}" + ''.join(f"{name:>10}" for name in names))
+    for title, (method, html) in pages.items():
+        timings = [measure(getattr(Scrapper([], parser=name), method), html,
+                           args.repeat) for name in names]
+        print(f"{title:>16}" + ''.join(f"{timing:8.2f}ms"
+                                       for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
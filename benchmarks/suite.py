@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark suite of the scrapping, parsing and analysis hot paths.
+
+Reports latency percentiles, throughput and peak memory of every case
+and compares them with a stored baseline:
+
+    python benchmarks/suite.py --save benchmarks/baseline.json
+    python benchmarks/suite.py --compare benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BENCH_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'tests'))
+sys.path.insert(0, BENCH_DIR)
+
+# pylint: disable=wrong-import-position
+
+import synthetic
+from analysis import Analyze
+from batch import BatchAnalyze
+from crosssection import CrossSection
+from scrapping import Scrapper
+from stub_server import read_fixture
+
+# pylint: enable=wrong-import-position
+
+SIZES = [10, 1000, 10000]
+
+
+class Case:
+    """One benchmark, run() is timed, items is the work done per run"""
+
+    def __init__(self, name, run, items=1, repeat=20, inner=1):
+        self.name = name
+        self.run = run
+        self.items = items
+        self.repeat = repeat
+        self.inner = inner
+
+    def measure(self):
+        """Latency percentiles (ms), throughput (items/s), peak KiB"""
+        self.run()
+        latencies = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            for _ in range(self.inner):
+                self.run()
+            latencies.append((time.perf_counter() - started) / self.inner)
+        tracemalloc.start()
+        self.run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        return {'p50': p50, 'p95': p95, 'p99': p99,
+                'throughput': self.items / (p50 / 1000),
+                'peak_kib': peak / 1024}
+
+
+def parsing_cases():
+    """Fixture pages through the default parser backend"""
+    scrapper = Scrapper([])
+    usa, shares = read_fixture('usa.html'), read_fixture('shares.html')
+    financials = read_fixture('financials.html')
+    return [
+        Case('parse_body usa', lambda: scrapper.parse_body(usa),
+             len(scrapper.parse_body(usa))),
+        Case('parse_body shares', lambda: scrapper.parse_body(shares),
+             len(scrapper.parse_body(shares))),
+        Case('parse_body_financial',
+             lambda: scrapper.parse_body_financial(financials)),
+    ]
+
+
+def analysis_cases(sizes):
+    """Per series functions and full calculate of synthetic universes"""
+    values = synthetic.companies(1)['S0']['data']
+    analyze = Analyze({}, [])
+    cases = [
+        Case('regression', lambda: analyze.regression(values['revenue']),
+             inner=200),
+        Case('regression_stat_model',
+             lambda: analyze.regression_stat_model(values['revenue']),
+             inner=200),
+        Case('limitations', lambda: analyze.limitations('p_s', values['p_s']),
+             inner=200),
+    ]
+    for size in sizes:
+        data = synthetic.companies(size)
+        symbols = list(data)
+        repeat = max(2, min(20, 20000 // size))
+        cases.append(Case(f"calculate {size}",
+                          lambda data=data, symbols=symbols:
+                          Analyze(data, symbols).calculate(),
+                          size, repeat))
+        cases.append(Case(f"batch calculate {size}",
+                          lambda data=data, symbols=symbols:
+                          BatchAnalyze(data, symbols).calculate(),
+                          size, repeat))
+        batch = BatchAnalyze(data, symbols)
+        batch.pack()
+        packed = batch.index, batch.values, batch.lengths
+        cases.append(Case(f"cross section {size}",
+                          lambda data=data, symbols=symbols, packed=packed:
+                          CrossSection(data, symbols,
+                                       packed=packed).calculate(),
+                          size, repeat))
+    return cases
+
+
+def compare(results, baseline, tolerance):
+    """Names of the cases slower or bigger than the baseline allows"""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['p50'] > expected['p50'] * (1 + tolerance) \
+                or result['peak_kib'] > expected['peak_kib'] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def report(results, baseline, regressions):
+    """Print the results table, cases missing from the baseline are
+    marked new until make bench-baseline saves them"""
+    print(f"{'case':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'items/s':>12}{'peak KiB':>10}{'vs base':>9}")
+    for name, result in results.items():
+        change = 'new'
+        if name in baseline:
+            change = f"{result['p50'] / baseline[name]['p50'] - 1:+.0%}"
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f"{name:<24}{result['p50']:>10.3f}{result['p95']:>10.3f}"
+              f"{result['p99']:>10.3f}{result['throughput']:>12.0f}"
+              f"{result['peak_kib']:>10.0f}{change:>9}{flag}")
+
+
+def main():
+    """Run the suite"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs='+', default=SIZES)
+    parser.add_argument("--filter", default='',
+                        help="Run only cases containing the text")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="Baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown before a case is flagged")
+    parser.add_argument("--save", metavar="FILE",
+                        help="Store the results as the new baseline")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', RuntimeWarning)
+
+    cases = [case for case in parsing_cases() + analysis_cases(args.sizes)
+             if args.filter in case.name]
+    results = {case.name: case.measure() for case in cases}
+    baseline = {}
+    if args.compare and os.path.isfile(args.compare):
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, args.tolerance)
+    report(results, baseline, regressions)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write('\n')
+    if regressions:
+        print(f"{len(regressions)} regression(s) over "
+              f"{args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,42 @@
 
 """Module for data analyzing."""
 
-import re
+import collections
+import functools
 import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import statsmodels.api as sm
+
+import metrics
+import normalize
+import ols
+
+CRITERIA_REGRESSION = ['market_cap', 'debt', 'assets', 'revenue', 'net_income']
+CRITERIA = ['p_e', 'p_s', 'p_bv', 'ev_ebitda', 'debt_ebitda']
+CALCULATIONS = [f"{key}_regression" for key in CRITERIA_REGRESSION] \
+    + [f"{key}_limitations" for key in CRITERIA] \
+    + ['l_a', 'ros', 'roe', 'roa'] \
+    + [f"{key}_regression_statsmodels" for key in CRITERIA_REGRESSION]
+
+
+def calculate_chunk(data, statsmodels=False):
+    """Per symbol stage of Analyze.calculate for one chunk of symbols"""
+    return Analyze(data, list(data), statsmodels).calculate_symbols()
 
 
 class Analyze:
     """Analyze module"""
 
-    def __init__(self, data, symbols):
-        self.data = data
+    def __init__(self, data, symbols, statsmodels=False, workers=1):
+        self.data = normalize.normalize(data)
         self.points = {}
         self.calculations = {}
         self.symbols = symbols
+        self.statsmodels = statsmodels
+        self.workers = workers or 1
+        self.timings = collections.defaultdict(float)
 
     @staticmethod
     def clear_points(points):
@@ -44,39 +66,38 @@ class Analyze:
 
     @staticmethod
     def parse_float(number_to_validate):
-        """Parse float number"""
-        result = 0.0
-        if number_to_validate \
-                and isinstance(number_to_validate, str):
-            number_to_validate = \
-                number_to_validate.replace(" ", "")
-            number_to_validate = \
-                number_to_validate.replace(",", ".")
-            if re.match(r'^-?\d+(?:\.\d+)?$', '32.2') is not None:
-                result = float(number_to_validate)
-        else:
-            if number_to_validate \
-                    and isinstance(number_to_validate, float):
-                result = number_to_validate
+        """Parse float number, 0.0 for empty or invalid cells"""
+        result = normalize.parse_cell(number_to_validate)
+        if np.isnan(result):
+            result = 0.0
         return result
 
-    def regression(self, values):
-        """Regression modeling"""
-        x_axis = []
-        y_axis = []
-        counter = 0
-        for item in values:
-            y_axis.append(self.parse_float(item))
-            x_axis.append(counter)
-            counter = counter + 1
-        x_axis, y_axis = np.array(x_axis), np.array(y_axis)
+    @staticmethod
+    def filled(values):
+        """Series (or raw cells) as floats, gaps as 0.0"""
+        return normalize.series(values).filled().tolist()
 
-        element_number = len(y_axis)
-        sum_x_axis = np.sum(x_axis)
-        sum_y_axis = np.sum(y_axis)
-        sum_multiply_axis = np.sum(np.multiply(x_axis, y_axis))
-        sum_power_x_axis = np.sum(np.power(x_axis, 2))
-        sum_power_y_axis = np.sum(np.power(y_axis, 2))
+    @staticmethod
+    def regression_sums(values):
+        """Sufficient statistics n, Σx, Σy, Σxy, Σx², Σy² of a series"""
+        y_axis = np.array(Analyze.filled(values))
+        x_axis = np.arange(len(y_axis))
+        return {'n': len(y_axis),
+                'sum_x': np.sum(x_axis),
+                'sum_y': np.sum(y_axis),
+                'sum_xy': np.sum(np.multiply(x_axis, y_axis)),
+                'sum_xx': np.sum(np.power(x_axis, 2)),
+                'sum_yy': np.sum(np.power(y_axis, 2))}
+
+    @staticmethod
+    def regression_from_sums(sums):
+        """Regression of the sufficient statistics"""
+        element_number = sums['n']
+        sum_x_axis = np.float64(sums['sum_x'])
+        sum_y_axis = np.float64(sums['sum_y'])
+        sum_multiply_axis = np.float64(sums['sum_xy'])
+        sum_power_x_axis = np.float64(sums['sum_xx'])
+        sum_power_y_axis = np.float64(sums['sum_yy'])
 
         top_b_coef = (element_number * sum_multiply_axis - sum_x_axis * sum_y_axis)
         bottom_b_coef = (element_number * sum_power_x_axis - np.power(sum_x_axis, 2))
@@ -92,7 +113,8 @@ class Analyze:
         s_power_y = sum_power_y_axis / element_number - math.pow(y_middle, 2)
 
         s_sqrt_x = math.sqrt(s_power_x)
-        s_sqrt_y = math.sqrt(s_power_y)
+        # flat series can round to a tiny negative variance
+        s_sqrt_y = math.sqrt(max(s_power_y, 0))
 
         rsquared_top = xy_middle - x_middle * y_middle
         rsquared_bottom = s_sqrt_x * s_sqrt_y
@@ -107,6 +129,10 @@ class Analyze:
                 'params': {"a_coef": a_coef, "b_coef": b_coef},
                 'point': 0}
 
+    def regression(self, values):
+        """Regression modeling"""
+        return self.regression_from_sums(self.regression_sums(values))
+
     def limitations(self, key, values):
         """Limitations modeling"""
         result = {}
@@ -114,8 +140,7 @@ class Analyze:
         if key == 'p_e':
             point = 0
             parts = 1 / len(values)
-            for item in values:
-                value = self.parse_float(item)
+            for value in self.filled(values):
                 if value < 8:
                     point += parts
             if result['regression_coef'] > 0:
@@ -124,8 +149,7 @@ class Analyze:
         if key == 'p_bv':
             point = 0
             parts = 1 / len(values)
-            for item in values:
-                value = self.parse_float(item)
+            for value in self.filled(values):
                 if value < 1:
                     point += parts
             if result['regression_coef'] > 0:
@@ -134,8 +158,7 @@ class Analyze:
         if key == 'p_s':
             point = 0
             parts = 1 / (2 * len(values))
-            for item in values:
-                value = self.parse_float(item)
+            for value in self.filled(values):
                 if 2 > value > 1:
                     point += parts
                 if value < 1:
@@ -146,8 +169,7 @@ class Analyze:
         if key == 'ev_ebitda':
             point = 0
             parts = 1 / (2 * len(values))
-            for item in values:
-                value = self.parse_float(item)
+            for value in self.filled(values):
                 if 10 > value > 6:
                     point += parts
                 if value <= 6:
@@ -158,8 +180,7 @@ class Analyze:
         if key == 'debt_ebitda':
             point = 0
             parts = 1 / (2 * len(values))
-            for item in values:
-                value = self.parse_float(item)
+            for value in self.filled(values):
                 if 6 > value > 3:
                     point += parts
                 if value <= 3:
@@ -172,20 +193,18 @@ class Analyze:
 
     def regression_stat_model(self, values):
         """Regression with regression_stat_model modeling"""
-        x_axis = []
-        y_axis = []
-        counter = 0
-        for item in values:
-            y_axis.append(self.parse_float(item))
-            x_axis.append(counter)
-            counter = counter + 1
-        x_axis, y_axis = np.array(x_axis), np.array(y_axis)
-        x_axis = sm.add_constant(x_axis)
-        model = sm.OLS(y_axis, x_axis)
-        results = model.fit()
-        return {'rsquared': results.rsquared,
-                'rsquared_adj': results.rsquared_adj,
-                'params': results.params}
+        return self.regression_stat_models([values])[0]
+
+    def regression_stat_models(self, series):
+        """Regression with regression_stat_model for many series at once.
+        Series of equal length are fitted in one least squares solve,
+        statsmodels OLS is used only when asked for."""
+        y_axes = [self.filled(values) for values in series]
+        metrics.count('ols_fits', len(y_axes),
+                      backend='statsmodels' if self.statsmodels else 'numpy')
+        if self.statsmodels:
+            return [ols.fit_statsmodels(y_axis) for y_axis in y_axes]
+        return ols.fit_many(y_axes)
 
     def liabilities_assets(self, values):
         """Liabilities/Assets"""
@@ -193,10 +212,11 @@ class Analyze:
         counter = 0
         point = 0
         sum_l_a = 0
-        parts = 1 / (2 * len(values['market_cap']))
-        for item in values['market_cap']:
-            debt = self.parse_float(values['debt'][counter])
-            precents = debt / self.parse_float(item) * 100
+        market_cap = self.filled(values['market_cap'])
+        debt = self.filled(values['debt'])
+        parts = 1 / (2 * len(market_cap))
+        for item in market_cap:
+            precents = debt[counter] / item * 100
             sum_l_a += precents
             if precents < 50:
                 point += 2 * parts
@@ -233,9 +253,10 @@ class Analyze:
         counter = 0
         point = 0
         sum_ros = 0
-        for item in values['revenue']:
-            debt = self.parse_float(values['net_income'][counter])
-            precents = debt / self.parse_float(item) * 100
+        revenue = self.filled(values['revenue'])
+        net_income = self.filled(values['net_income'])
+        for item in revenue:
+            precents = net_income[counter] / item * 100
             sum_ros += precents
             if precents > 81:
                 point += 0.5
@@ -249,7 +270,7 @@ class Analyze:
                 point += 0.0375
             result.append(precents)
             counter = counter + 1
-        avg = sum_ros / len(values['revenue'])
+        avg = sum_ros / len(revenue)
         if avg > 81:
             point += 0.5
         if 80 >= avg > 61:
@@ -268,23 +289,20 @@ class Analyze:
         counter = 0
         point = 0
         sum_ros = 0
-        for item in values['roe']:
-            val = item.replace("%", "")
-            if val != '':
-                precents = self.parse_float(val)
-                sum_ros += precents
-                if precents > 81:
-                    point += 0.5
-                if 80 >= precents > 61:
-                    point += 0.25
-                if 60 >= precents > 41:
-                    point += 0.125
-                if 40 >= precents > 21:
-                    point += 0.075
-                if 20 >= precents > 0:
-                    point += 0.0375
-                result.append(precents)
-                counter = counter + 1
+        for precents in normalize.series(values['roe']).present().tolist():
+            sum_ros += precents
+            if precents > 81:
+                point += 0.5
+            if 80 >= precents > 61:
+                point += 0.25
+            if 60 >= precents > 41:
+                point += 0.125
+            if 40 >= precents > 21:
+                point += 0.075
+            if 20 >= precents > 0:
+                point += 0.0375
+            result.append(precents)
+            counter = counter + 1
         avg = sum_ros / counter
         if avg > 81:
             point += 0.5
@@ -304,23 +322,20 @@ class Analyze:
         counter = 0
         point = 0
         sum_roa = 0
-        for item in values['roa']:
-            val = item.replace("%", "")
-            if val != '':
-                precents = self.parse_float(val)
-                sum_roa += precents
-                if precents > 81:
-                    point += 0.5
-                if 80 >= precents > 61:
-                    point += 0.25
-                if 60 >= precents > 41:
-                    point += 0.125
-                if 40 >= precents > 21:
-                    point += 0.075
-                if 20 >= precents > 0:
-                    point += 0.0375
-                result.append(precents)
-                counter = counter + 1
+        for precents in normalize.series(values['roa']).present().tolist():
+            sum_roa += precents
+            if precents > 81:
+                point += 0.5
+            if 80 >= precents > 61:
+                point += 0.25
+            if 60 >= precents > 41:
+                point += 0.125
+            if 40 >= precents > 21:
+                point += 0.075
+            if 20 >= precents > 0:
+                point += 0.0375
+            result.append(precents)
+            counter = counter + 1
         avg = sum_roa / counter
         if avg > 81:
             point += 0.5
@@ -335,15 +350,8 @@ class Analyze:
         return {'result': result, 'points': point}
 
     def return_ev_ebitda(self, values):
-        """Calucalte retrun ev_ebitda"""
-        x_axis = []
-        y_axis = []
-        counter = 0
-        for item in values:
-            y_axis.append(self.parse_float(item))
-            x_axis.append(counter)
-            counter = counter + 1
-        x_axis, y_axis = np.array(x_axis), np.array(y_axis)
+        """Calucalte retrun ev_ebitda, the parsed series for now"""
+        return np.array(self.filled(values))
 
     @staticmethod
     def get_points(title, values):
@@ -479,27 +487,77 @@ class Analyze:
 
         return scores
 
+    @staticmethod
+    def chunks(data, count):
+        """Split {symbol: values} into count ordered chunks"""
+        items = list(data.items())
+        size = -(-len(items) // max(1, count))
+        return [dict(items[start:start + size])
+                for start in range(0, len(items), size)]
+
+    def timed(self, family, function, *args):
+        """Call function, time is added to the metric family"""
+        started = time.perf_counter()
+        result = function(*args)
+        self.timings[family] += time.perf_counter() - started
+        return result
+
+    def calculate_symbols(self):
+        """Per symbol calculations, independent between symbols"""
+        calculations = {title: {} for title in CALCULATIONS}
+        stat_models = []
+        for symbol, values in self.data.items():
+            for key, data in values['data'].items():
+                if key in CRITERIA_REGRESSION:
+                    stat_model_title = f"{key}_regression_statsmodels"
+                    stat_models.append((stat_model_title, symbol, data))
+                    title = f"{key}_regression"
+                    calculations[title][symbol] = self.timed(
+                        'regression', self.regression, data)
+                if key in CRITERIA:
+                    title = f"{key}_limitations"
+                    calculations[title][symbol] = self.timed(
+                        'limitations', self.limitations, key, data)
+            fields = values['data']
+            calculations['l_a'][symbol] = self.timed(
+                'l_a', self.liabilities_assets, fields)
+            calculations['ros'][symbol] = self.timed(
+                'ros', self.return_on_sales, fields)
+            calculations['roe'][symbol] = self.timed(
+                'roe', self.return_on_equity, fields)
+            calculations['roa'][symbol] = self.timed(
+                'roa', self.return_on_assets, fields)
+        stat_models_results = self.timed(
+            'statsmodels', self.regression_stat_models,
+            [data for _, _, data in stat_models])
+        for (title, symbol, _), result in zip(stat_models,
+                                              stat_models_results):
+            calculations[title][symbol] = result
+        for family, seconds in self.timings.items():
+            metrics.observe('analysis_seconds', seconds, family=family)
+        self.timings.clear()
+        return calculations
+
+    def calculate_parallel(self):
+        """Per symbol calculations sharded over a process pool,
+        chunks and the metrics of the workers are merged back in symbol
+        order"""
+        calculations = None
+        chunks = self.chunks(self.data, 4 * self.workers)
+        with ProcessPoolExecutor(self.workers) as executor:
+            for chunk, recorded in executor.map(
+                    functools.partial(metrics.collect, calculate_chunk),
+                    chunks, [self.statsmodels] * len(chunks)):
+                metrics.REGISTRY.merge(recorded)
+                if calculations is None:
+                    calculations = chunk
+                    continue
+                for title, values in chunk.items():
+                    calculations[title].update(values)
+        return calculations
+
     def calculate(self):
         """Make all calculations"""
-        self.calculations = {'market_cap_regression': {},
-                             'debt_regression': {},
-                             'assets_regression': {},
-                             'revenue_regression': {},
-                             'net_income_regression': {},
-                             'p_e_limitations': {},
-                             'p_s_limitations': {},
-                             'p_bv_limitations': {},
-                             'ev_ebitda_limitations': {},
-                             'debt_ebitda_limitations': {},
-                             'l_a': {},
-                             'ros': {},
-                             'roe': {},
-                             'roa': {},
-                             'market_cap_regression_statsmodels': {},
-                             'debt_regression_statsmodels': {},
-                             'assets_regression_statsmodels': {},
-                             'revenue_regression_statsmodels': {},
-                             'net_income_regression_statsmodels': {}}
         self.points = {'market_cap': {},
                        'debt': {},
                        'assets': {},
@@ -510,29 +568,19 @@ class Analyze:
                        'p_bv': {},
                        'ev_ebitda': {},
                        'debt_ebitda': {}}
-        criteria_regression = ['market_cap', 'debt', 'assets', 'revenue', 'net_income']
-        criteria = ['p_e', 'p_s', 'p_bv',
-                    'ev_ebitda', 'debt_ebitda']
         if self.data:
-            for symbol, values in self.data.items():
-                for key, data in values['data'].items():
-                    if key in criteria_regression:
-                        stat_model_title = f"{key}_regression_statsmodels"
-                        self.calculations[stat_model_title][symbol] = \
-                            self.regression_stat_model(data)
-                        title = f"{key}_regression"
-                        self.calculations[title][symbol] = self.regression(data)
-                    if key in criteria:
-                        title = f"{key}_limitations"
-                        self.calculations[title][symbol] = self.limitations(key, data)
-                self.calculations['l_a'][symbol] = self.liabilities_assets(values['data'])
-                self.calculations['ros'][symbol] = self.return_on_sales(values['data'])
-                self.calculations['roe'][symbol] = self.return_on_equity(values['data'])
-                self.calculations['roa'][symbol] = self.return_on_assets(values['data'])
+            started = time.perf_counter()
+            if self.workers > 1 and len(self.data) > 1:
+                self.calculations = self.calculate_parallel()
+            else:
+                self.calculations = self.calculate_symbols()
+            metrics.observe('analysis_stage_seconds',
+                            time.perf_counter() - started, stage='symbols')
+            started = time.perf_counter()
 
             for item in self.calculations.items():
                 title = item[0].replace("_regression", "").replace("_limitations", "")
-                if title in criteria_regression or title in criteria \
+                if title in CRITERIA_REGRESSION or title in CRITERIA \
                         or title in ['l_a', 'ros', 'roe', 'roa']:
                     self.points[title] = self.get_points(title, item[1])
             final_points = {}
@@ -541,8 +589,8 @@ class Analyze:
             total_points = {}
             for symbol in self.symbols:
                 total_points[symbol] = 0
-                for index, values in final_points.items():
-                    for symbol_in_params, point in values.items():
-                        if symbol_in_params == symbol:
-                            total_points[symbol] += point
+                for values in final_points.values():
+                    total_points[symbol] += values.get(symbol, 0)
+            metrics.observe('analysis_stage_seconds',
+                            time.perf_counter() - started, stage='points')
             return {'points': self.points, 'total_points': total_points}
@@ -16,16 +16,33 @@ __status__ = "Development"
 
 import os
 import sys
+import time
 import argparse
-from logzero import logger
+import json
 
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, PROJECT_DIR)
 
 # pylint: disable=wrong-import-position
 
-import scrapping
-import analysis
+import metrics
+from lazy import lazy_import
+
+logzero = lazy_import('logzero')
+scrapping = lazy_import('scrapping')
+analysis = lazy_import('analysis')
+archive = lazy_import('archive')
+incremental = lazy_import('incremental')
+batch = lazy_import('batch')
+crosssection = lazy_import('crosssection')
+cache = lazy_import('cache')
+daemon = lazy_import('daemon')
+persistence = lazy_import('persistence')
+periods = lazy_import('periods')
+pipeline = lazy_import('pipeline')
+ranking = lazy_import('ranking')
+rules = lazy_import('rules')
+storage = lazy_import('storage')
 
 # pylint: enable=wrong-import-position
 
@@ -35,8 +52,15 @@ def log(function):
 
     def inner(*args, **kwargs):
         """Inter method."""
-        logger.debug(function)
-        function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe('call_seconds', elapsed,
+                            function=function.__qualname__)
+            logzero.logger.debug("%s took %.3fs", function.__qualname__,
+                                 elapsed)
 
     return inner
 
@@ -88,6 +112,195 @@ class Application:
             self.symbols = []
 
 
+def stream_companies(scrapper, symbols, symbols_file, financials_file):
+    """Fetch fundamentals of the symbols as soon as their listing
+    records arrive"""
+    companies = {}
+    wanted = set(symbols)
+    for record in scrapper.stream_symbols(symbols_file):
+        symbol = record.symbol
+        if symbol in wanted and symbol not in companies:
+            companies[symbol] = scrapper.get_fundamental_analysis(
+                symbol, financials_file.format(symbol=symbol))
+    for symbol in symbols:
+        if symbol not in companies:
+            companies[symbol] = scrapper.get_fundamental_analysis(
+                symbol, financials_file.format(symbol=symbol))
+    return {symbol: companies[symbol] for symbol in symbols}
+
+
+def get_companies(args, app, file_path, symbols=None):
+    """Scrap stock symbols and fundamentals of the symbols, the app
+    symbols by default"""
+    if symbols is None:
+        symbols = app.symbols
+    page_cache = None
+    if args.cache:
+        page_cache = cache.PageCache(f"{file_path}data/cache.db",
+                                     ttl=args.ttl * 60 * 60)
+    page_archive = None
+    if args.archive:
+        page_archive = archive.PageArchive(f"{file_path}data/pages")
+    scrapper = scrapping.Scrapper(app.markets, parser=args.parser,
+                                  cache=page_cache, archive=page_archive,
+                                  period='q' if args.quarterly else 'y')
+    symbols_file = f"{file_path}data/stocks.json"
+    financials_file = f"{file_path}data/{{symbol}}_financials" \
+        f"{'_q' if args.quarterly else ''}.json"
+    if args.use_async:
+        return pipeline.Pipeline(scrapper, args.concurrency, rate=args.rate)\
+            .refresh(symbols_file, symbols, financials_file)
+
+    if args.stream:
+        return stream_companies(scrapper, symbols, symbols_file,
+                                financials_file)
+
+    scrapper.get_symbols(symbols_file)
+    if args.concurrency > 1:
+        return scrapper.get_fundamental_analysis_bulk(
+            symbols, financials_file,
+            concurrency=args.concurrency, rate=args.rate)
+    companies = {}
+    for symbol in symbols:
+        file_name = financials_file.format(symbol=symbol)
+        companies[symbol] =\
+            scrapper.get_fundamental_analysis(symbol,
+                                              file_name)
+    return companies
+
+
+def cross_section_groups(groups, symbols):
+    """{symbol: group} of --groups: market, a JSON file or None"""
+    if groups is None:
+        return None
+    if groups == 'market':
+        return {symbol: crosssection.market(symbol) for symbol in symbols}
+    with open(groups) as groups_file:
+        return json.load(groups_file)
+
+
+def serve(args, app, file_path):
+    """Keep the app symbols warm and answer score queries until stopped"""
+    page_cache = cache.PageCache(f"{file_path}data/cache.db",
+                                 ttl=args.ttl * 60 * 60)
+    page_archive = None
+    if args.archive:
+        page_archive = archive.PageArchive(f"{file_path}data/pages")
+    scrapper = scrapping.Scrapper(app.markets, parser=args.parser,
+                                  cache=page_cache, archive=page_archive)
+    symbols_file = f"{file_path}data/stocks.json"
+    scrapper.get_symbols(symbols_file)
+    financials_file = f"{file_path}data/{{symbol}}_financials.json"
+    service = daemon.Daemon(
+        app.symbols,
+        lambda symbol, revalidate: scrapper.get_fundamental_analysis(
+            symbol, financials_file.format(symbol=symbol),
+            revalidate=revalidate),
+        interval=args.refresh, results=f"{file_path}data/analysis.db",
+        listing=lambda: scrapper.get_symbols(symbols_file, revalidate=True))
+    service.warm()
+    service.start()
+    httpd = daemon.server(service, args.listen)
+    logzero.logger.info("serving %s symbols on %s", len(app.symbols),
+                        args.listen)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.stop()
+
+
+def stored_companies(args, app, file_path):
+    """Companies of the --store with floats, only the symbols it does not
+    hold yet are scrapped and added, returns (companies, packed)"""
+    store = storage.FundamentalsStore(f"{file_path}data/fundamentals.db")
+    try:
+        companies = store.load(app.symbols)
+        missing = [symbol for symbol in app.symbols
+                   if symbol not in companies]
+        if missing:
+            scrapped = get_companies(args, app, file_path, missing)
+            store.put_many(scrapped)
+            loaded = store.load(missing)
+            for symbol in missing:
+                companies[symbol] = loaded.get(symbol, scrapped.get(symbol))
+        packed = store.load_matrix(app.symbols)
+    finally:
+        store.close()
+    return {symbol: companies[symbol] for symbol in app.symbols}, packed
+
+
+def load_companies(args, app, file_path):
+    """Companies of the --store or scrapped, returns (companies, packed)
+    with the BatchAnalyze matrix of the store"""
+    if args.store and app.symbols:
+        return stored_companies(args, app, file_path)
+    return get_companies(args, app, file_path), None
+
+
+def keep_companies(args, app, companies, file_path):
+    """Companies through the --periods/--since/--until and --postgres
+    stores, returns (companies, database)"""
+    if args.periods or args.since or args.until:
+        history = periods.PeriodStore(f"{file_path}data/periods.db")
+        frequency = periods.QUARTERLY if args.quarterly else periods.YEARLY
+        history.put_many(companies, frequency)
+        companies = history.load(app.symbols, frequency=frequency,
+                                 last=args.periods, start=args.since,
+                                 end=args.until)
+        history.close()
+    database = None
+    if args.postgres is not None:
+        database = persistence.PostgresStore(args.postgres)
+        database.put_many(companies)
+        companies = database.load(app.symbols)
+    return companies, database
+
+
+def analyze_companies(args, app, companies, packed, file_path):
+    """Scores of the companies by the --batch, --cross-section,
+    --incremental or the default engine"""
+    if args.batch:
+        scoring = rules.Rules.load(args.rules) if args.rules else None
+        return batch.BatchAnalyze(companies, app.symbols, packed=packed,
+                                  scoring=scoring).calculate()
+    if args.cross_section:
+        scoring = rules.Rules.load(args.rules) if args.rules else None
+        return crosssection.CrossSection(
+            companies, app.symbols,
+            groups=cross_section_groups(args.groups, app.symbols),
+            packed=packed, scoring=scoring).calculate()
+    if args.incremental:
+        results = incremental.ResultStore(f"{file_path}data/analysis.db")
+        try:
+            return incremental.IncrementalAnalyze(
+                companies, app.symbols, results,
+                statsmodels=args.statsmodels,
+                workers=args.workers).calculate()
+        finally:
+            results.close()
+    return analysis.Analyze(companies, app.symbols,
+                            statsmodels=args.statsmodels,
+                            workers=args.workers).calculate()
+
+
+def report(args, app, companies, result, database):
+    """Print the scores and the --top-points ranking, keep the scores in
+    the --postgres store"""
+    print(result)
+    if args.top_points:
+        stream = database.stream(app.symbols) \
+            if database is not None else companies.items()
+        print({'top_points': ranking.top(stream, args.top_points,
+                                         statsmodels=args.statsmodels)})
+    if database is not None:
+        if result:
+            database.save_scores(result)
+        database.close()
+
+
 def main(args):
     """ Main entry point of the app """
     app = Application()
@@ -100,37 +313,116 @@ def main(args):
     if args and app.markets:
         file_path = './../'
 
-        scrapper = scrapping.Scrapper(app.markets)
-        scrapper.get_symbols(f"{file_path}data/stocks.json")
+        if args.daemon:
+            serve(args, app, file_path)
+            return
+
+        if args.postgres is not None:
+            persistence.connection_dsn(args.postgres)
+        companies, packed = load_companies(args, app, file_path)
 
         if len(app.symbols) > 0:
-            companies = {}
-            for symbol in app.symbols:
-                file_name = f"{file_path}data/{symbol}_financials.json"
-                companies[symbol] =\
-                    scrapper.get_fundamental_analysis(symbol,
-                                                      file_name)
             print(companies)
-            analysis_companies = analysis.Analyze(companies, app.symbols)
-            result = analysis_companies.calculate()
-            print(result)
+            companies, database = keep_companies(args, app, companies,
+                                                 file_path)
+            result = analyze_companies(args, app, companies, packed,
+                                       file_path)
+            report(args, app, companies, result, database)
 
-    logger.info(args)
+    logzero.logger.info(args)
 
 
-if __name__ == "__main__":
-    PARSER = argparse.ArgumentParser()
+def arguments():
+    """Command line arguments of the app"""
+    parser = argparse.ArgumentParser()
 
     # Optional argument flag which defaults to False
-    PARSER.add_argument("-f", "--flag", action="store_true", default=False)
+    parser.add_argument("-f", "--flag", action="store_true", default=False)
 
     # Optional argument which requires a parameter (eg. -d test)
-    PARSER.add_argument("-n", "--name", action="store", dest="name")
-    PARSER.add_argument("-m", "--markets", action="store", dest="markets")
-    PARSER.add_argument("-s", "--symbols", action="store", dest="symbols")
+    parser.add_argument("-n", "--name", action="store", dest="name")
+    parser.add_argument("-m", "--markets", action="store", dest="markets")
+    parser.add_argument("-s", "--symbols", action="store", dest="symbols")
+    parser.add_argument("-b", "--batch", action="store_true", default=False,
+                        help="Score all symbols with the vectorized engine")
+    parser.add_argument("--rules", action="store", default=None,
+                        metavar="FILE",
+                        help="Scoring rules JSON for --batch "
+                             "(resources/scoring.json)")
+    parser.add_argument("--top-points", action="store", type=int,
+                        default=None, dest="top_points", metavar="K",
+                        help="Stream the K symbols with the most summed "
+                             "criteria points (not total_points)")
+    parser.add_argument("--cross-section", action="store_true",
+                        default=False, dest="cross_section",
+                        help="Score percentile ranks and z-scores against "
+                             "the other symbols")
+    parser.add_argument("--groups", action="store", default=None,
+                        help="Rank inside groups: market or a JSON file of "
+                             "{symbol: sector}")
+    parser.add_argument("--incremental", action="store_true", default=False,
+                        help="Recalculate only the symbols whose fundamentals "
+                             "changed since data/analysis.db")
+    parser.add_argument("--statsmodels", action="store_true", default=False,
+                        help="Fit regression_statsmodels with statsmodels OLS")
+    parser.add_argument("-c", "--concurrency", action="store", type=int,
+                        default=1, help="Parallel page requests")
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        default=1, help="Analysis processes")
+    parser.add_argument("--rate", action="store", type=float, default=None,
+                        help="Requests per second per host")
+    parser.add_argument("--async", action="store_true", default=False,
+                        dest="use_async",
+                        help="Overlap downloads and parsing with asyncio")
+    parser.add_argument("--parser", action="store", default=None,
+                        choices=["lxml", "stream", "soup"],
+                        help="HTML parser backend (lxml when installed)")
+    parser.add_argument("--stream", action="store_true", default=False,
+                        help="Fetch fundamentals while listing pages "
+                             "are streamed to NDJSON")
+    parser.add_argument("--cache", action="store_true", default=False,
+                        help="Refresh through the TTL page cache")
+    parser.add_argument("--ttl", action="store", type=float, default=24,
+                        help="Page cache TTL in hours")
+    parser.add_argument("--archive", action="store_true", default=False,
+                        help="Keep raw pages in data/pages and skip parsing "
+                             "unchanged ones")
+    parser.add_argument("--quarterly", action="store_true", default=False,
+                        help="Scrap the quarterly /f/q/ fundamentals pages")
+    parser.add_argument("--periods", action="store", type=int, default=None,
+                        help="Analyze the last N periods of data/periods.db")
+    parser.add_argument("--since", action="store", default=None,
+                        help="First period to analyze, like 2015 or 2019Q2")
+    parser.add_argument("--until", action="store", default=None,
+                        help="Last period to analyze, like 2019 or LTM")
+    parser.add_argument("--store", action="store_true", default=False,
+                        help="Analyze fundamentals of data/fundamentals.db, "
+                             "only the symbols it lacks are scrapped")
+    parser.add_argument("--postgres", action="store", nargs="?", default=None,
+                        const="", metavar="DSN",
+                        help="Keep fundamentals and scores in PostgreSQL "
+                             "(POSTGRES_DSN by default)")
+    parser.add_argument("--daemon", action="store_true", default=False,
+                        help="Keep scores warm and serve them over HTTP")
+    parser.add_argument("--listen", action="store", default="127.0.0.1:8750",
+                        metavar="ADDRESS",
+                        help="Daemon address, host:port or unix:/path")
+    parser.add_argument("--refresh", action="store", type=float,
+                        default=3600, metavar="SECONDS",
+                        help="Daemon refresh interval of every symbol")
+
+    parser.add_argument("--metrics", action="store", default=None,
+                        metavar="FILE",
+                        help="Write run metrics, Prometheus text for "
+                             "*.prom, JSON otherwise, - for stdout")
+    parser.add_argument("--profile", action="store", default=None,
+                        metavar="FILE", help="Profile the run into FILE")
+    parser.add_argument("--profiler", action="store", default="cprofile",
+                        choices=["cprofile", "sampling"],
+                        help="cProfile stats or folded stack samples")
 
     # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
-    PARSER.add_argument(
+    parser.add_argument(
         "-v",
         "--verbose",
         action="count",
@@ -138,10 +430,16 @@ if __name__ == "__main__":
         help="Verbosity (-v, -vv, etc)")
 
     # Specify output of "--version"
-    PARSER.add_argument(
+    parser.add_argument(
         "--version",
         action="version",
         version="%(prog)s (version {version})".format(version=__version__))
+    return parser
+
 
-    MYARGS = PARSER.parse_args()
-    main(MYARGS)
+if __name__ == "__main__":
+    MYARGS = arguments().parse_args()
+    with metrics.profiled(MYARGS.profile, MYARGS.profiler):
+        main(MYARGS)
+    if MYARGS.metrics:
+        metrics.REGISTRY.write(MYARGS.metrics)
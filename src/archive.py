@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the compressed raw page archive."""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    hash TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    parsed TEXT,
+    parser TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pages (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    stored REAL NOT NULL,
+    hash TEXT NOT NULL REFERENCES bodies (hash)
+);
+CREATE INDEX IF NOT EXISTS pages_symbol_date ON pages (symbol, date);
+"""
+
+
+def page_hash(body):
+    """sha256 of a page body"""
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class PageArchive:
+    """Append-only archive of raw pages with their parsed results.
+
+    Every distinct body is written once to pages.gz as its own gzip
+    member, index.db keeps the (offset, length) of each body by content
+    hash, the parse result of the body and one row per symbol and date
+    the body was seen, so a page is read back by seeking to one member.
+    """
+
+    def __init__(self, directory, clock=time.time):
+        os.makedirs(directory, exist_ok=True)
+        self.file_name = os.path.join(directory, 'pages.gz')
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'),
+                                          check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute(
+            "PRAGMA table_info(bodies)")]
+        if 'parser' not in columns:
+            # index.db of before the parser stamp, its results are stale
+            self.connection.execute(
+                "ALTER TABLE bodies ADD COLUMN parser TEXT")
+            self.connection.commit()
+
+    def date(self):
+        """UTC date of the clock"""
+        return time.strftime('%Y-%m-%d', time.gmtime(self.clock()))
+
+    def append(self, body):
+        """Write a compressed body at the end of the data file,
+        returns (offset, length)"""
+        member = gzip.compress(body.encode(), mtime=0)
+        with open(self.file_name, 'ab') as data_file:
+            offset = data_file.seek(0, os.SEEK_END)
+            data_file.write(member)
+        return offset, len(member)
+
+    def put(self, symbol, body, parsed=None, parser=None):
+        """Archive the page of a symbol, a body already stored is not
+        written again, parsed is the result of the parser stamp.
+        Returns the content hash."""
+        digest = page_hash(body)
+        date = self.date()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT hash FROM bodies WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                offset, length = self.append(body)
+                self.connection.execute(
+                    "INSERT INTO bodies (hash, offset, length, size, parsed, "
+                    "parser) VALUES (?, ?, ?, ?, ?, ?)",
+                    (digest, offset, length, len(body),
+                     None if parsed is None else json.dumps(parsed),
+                     None if parsed is None else parser))
+            elif parsed is not None:
+                self.connection.execute(
+                    "UPDATE bodies SET parsed = ?, parser = ? WHERE hash = ?",
+                    (json.dumps(parsed), parser, digest))
+            latest = self.connection.execute(
+                "SELECT date, hash FROM pages WHERE symbol = ? "
+                "ORDER BY date DESC, stored DESC LIMIT 1",
+                (symbol,)).fetchone()
+            if latest != (date, digest):
+                self.connection.execute(
+                    "INSERT INTO pages (symbol, date, stored, hash) "
+                    "VALUES (?, ?, ?, ?)",
+                    (symbol, date, self.clock(), digest))
+            self.connection.commit()
+        return digest
+
+    def entry(self, symbol, date=None):
+        """(hash, offset, length) of the last page of a symbol stored on
+        or before date (YYYY-MM-DD), None when missing"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT bodies.hash, offset, length FROM pages "
+                "JOIN bodies ON bodies.hash = pages.hash "
+                "WHERE symbol = ? AND date <= ? "
+                "ORDER BY date DESC, stored DESC LIMIT 1",
+                (symbol, date or '9999-12-31')).fetchone()
+
+    def get(self, symbol, date=None):
+        """Page body of a symbol on or before date, None when missing"""
+        entry = self.entry(symbol, date)
+        if entry is None:
+            return None
+        _, offset, length = entry
+        with open(self.file_name, 'rb') as data_file:
+            data_file.seek(offset)
+            return gzip.decompress(data_file.read(length)).decode()
+
+    def dates(self, symbol):
+        """Dates a page of the symbol was archived on"""
+        with self.lock:
+            return [date for date, in self.connection.execute(
+                "SELECT DISTINCT date FROM pages WHERE symbol = ? "
+                "ORDER BY date", (symbol,))]
+
+    def parsed(self, digest, parser=None):
+        """Stored parse result of a body by the same parser stamp, None
+        when missing or parsed by another backend or result format"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT parsed FROM bodies WHERE hash = ? AND parser IS ?",
+                (digest, parser)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def known(self, symbol, body, parser=None):
+        """Stored parse result of a body parsed before by the parser
+        stamp, the page is archived for the symbol, None for a new body"""
+        result = self.parsed(page_hash(body), parser)
+        if result is not None:
+            metrics.count('page_archive', result='unchanged')
+            self.put(symbol, body)
+        return result
+
+    def keep(self, symbol, body, result, parser=None):
+        """Archive the page of a symbol with its parse result"""
+        metrics.count('page_archive', result='parsed')
+        self.put(symbol, body, result, parser)
+        return result
+
+    def parse(self, symbol, body, parse, parser=None):
+        """parse(body) of a page, skipped when the same body was parsed
+        before by the same parser stamp (backend/format version)"""
+        result = self.known(symbol, body, parser)
+        if result is None:
+            result = self.keep(symbol, body, parse(body), parser)
+        return result
+
+    def size(self):
+        """Bytes of the data file and number of distinct bodies"""
+        with self.lock:
+            count = self.connection.execute(
+                "SELECT COUNT(*) FROM bodies").fetchone()[0]
+        if not os.path.isfile(self.file_name):
+            return 0, count
+        return os.path.getsize(self.file_name), count
+
+    def close(self):
+        """Close the index"""
+        self.connection.close()
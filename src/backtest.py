@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the historical backtest of the scoring model."""
+
+import argparse
+import bisect
+import csv
+import datetime
+import json
+import sys
+
+import numpy as np
+
+import metrics
+from analysis import CALCULATIONS, Analyze
+from batch import METRICS
+from crosssection import percentiles
+from incremental import IncrementalAnalyze, ResultStore, by_symbol
+from periods import PeriodStore
+
+# annual reports of a fiscal year are public by this day of the next year
+PUBLICATION = '04-01'
+# a close older than this many days before a date is no price of that date
+PRICE_TOLERANCE = 31
+
+
+def load_prices(file_name):
+    """{symbol: (dates, closes)} of a date,symbol,close CSV file,
+    dates (YYYY-MM-DD) sorted"""
+    rows = {}
+    with open(file_name, newline='') as prices_file:
+        for row in csv.DictReader(prices_file):
+            try:
+                close = float(row['close'])
+            except (TypeError, ValueError):
+                continue
+            rows.setdefault(row['symbol'], []).append((row['date'], close))
+    prices = {}
+    for symbol, closes in rows.items():
+        closes.sort()
+        prices[symbol] = ([date for date, _ in closes],
+                          [close for _, close in closes])
+    return prices
+
+
+def price_on(prices, symbol, date):
+    """Last close of a symbol on or before date, None when there is no
+    recent one"""
+    if symbol not in prices:
+        return None
+    dates, closes = prices[symbol]
+    position = bisect.bisect_right(dates, date) - 1
+    if position < 0:
+        return None
+    age = datetime.date.fromisoformat(date) \
+        - datetime.date.fromisoformat(dates[position])
+    if age.days > PRICE_TOLERANCE:
+        return None
+    return closes[position]
+
+
+def forward_return(prices, symbol, start, end):
+    """Price return of a symbol from start to end, None without prices"""
+    first = price_on(prices, symbol, start)
+    last = price_on(prices, symbol, end)
+    if first is None or last is None or first <= 0:
+        return None
+    return last / first - 1
+
+
+def rank_correlation(scores, returns):
+    """Spearman correlation of two equally long lists, None when one
+    of them is constant"""
+    if len(scores) < 2:
+        return None
+    ranks = percentiles(np.column_stack([scores, returns]).astype(float),
+                        np.zeros(len(scores), dtype=np.int64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.corrcoef(ranks[:, 0], ranks[:, 1])[0, 1]
+    return None if np.isnan(correlation) else float(correlation)
+
+
+class YearAnalyze(Analyze):
+    """Analyze of one rebalance year over calculated per-symbol results,
+    only the cross symbol get_points/clear_points ranking runs"""
+
+    def __init__(self, results, symbols):
+        super().__init__({symbol: {'data': {}} for symbol in results},
+                         symbols)
+        self.results = results
+
+    def calculate_symbols(self):
+        """Per symbol results in symbol order"""
+        calculations = {title: {} for title in CALCULATIONS}
+        for symbol, results in self.results.items():
+            for title, result in results.items():
+                calculations[title][symbol] = result
+        return calculations
+
+
+class Backtest:
+    """Replay of the scoring model year by year.
+
+    The universe of a fiscal year is read from a PeriodStore with the
+    periods up to that year only (LTM is never used), scored with
+    Analyze at the publication date of the next year and held until
+    the following one. Per-symbol results are kept in a ResultStore
+    under symbol@year with the hash of the series, so a new run only
+    calculates views whose data changed, in a process pool with
+    workers > 1.
+    """
+
+    def __init__(self, store, prices, symbols=None, results=None, top=10,
+                 window=None, min_periods=3, statsmodels=False, workers=1):
+        self.store = store
+        self.prices = prices
+        self.symbols = symbols
+        self.results = results if results is not None \
+            else ResultStore(':memory:')
+        self.top = top
+        self.window = window
+        self.min_periods = min_periods
+        self.statsmodels = statsmodels
+        self.workers = workers
+        self.dirty = []
+
+    @staticmethod
+    def rebalance_date(year):
+        """Date the fundamentals of a fiscal year are scored on"""
+        return f"{year + 1}-{PUBLICATION}"
+
+    def views(self, year):
+        """{symbol: company} with the periods known after the fiscal
+        year, symbols with a short history or a missing metric are left
+        out"""
+        companies = self.store.load(self.symbols, end=str(year),
+                                    last=self.window)
+        return {symbol: company for symbol, company in companies.items()
+                if len(company['data']['header_row']) >= self.min_periods
+                and all(metric in company['data'] for metric in METRICS)}
+
+    def intermediates(self, views):
+        """{year: {symbol: per-symbol results}} of {year: views}, stored
+        results are reused"""
+        data = {f"{symbol}@{year}": company
+                for year, companies in views.items()
+                for symbol, company in companies.items()}
+        if not data:
+            return {year: {} for year in views}
+        analyze = IncrementalAnalyze(data, list(data), self.results,
+                                     statsmodels=self.statsmodels,
+                                     workers=self.workers)
+        if self.workers > 1 and len(data) > 1:
+            calculations = analyze.calculate_parallel()
+        else:
+            calculations = analyze.calculate_symbols()
+        self.dirty = analyze.dirty
+        metrics.count('backtest_views', len(data) - len(self.dirty),
+                      result='reused')
+        metrics.count('backtest_views', len(self.dirty), result='recomputed')
+        results = by_symbol(calculations)
+        return {year: {symbol: results.get(f"{symbol}@{year}", {})
+                       for symbol in companies}
+                for year, companies in views.items()}
+
+    def evaluate(self, year, scores):
+        """Forward returns of the top and of the whole scored universe"""
+        start = self.rebalance_date(year)
+        end = self.rebalance_date(year + 1)
+        returns = {symbol: forward_return(self.prices, symbol, start, end)
+                   for symbol in scores}
+        priced = [symbol for symbol in scores if returns[symbol] is not None]
+        ranked = sorted(priced, key=lambda symbol: -scores[symbol])
+        picks = ranked[:self.top]
+        universe = [returns[symbol] for symbol in priced]
+        held = [returns[symbol] for symbol in picks]
+        top_return = float(np.mean(held)) if held else None
+        universe_return = float(np.mean(universe)) if universe else None
+        return {'year': year, 'start': start, 'end': end,
+                'scored': len(scores), 'priced': len(priced),
+                'picks': picks, 'top_return': top_return,
+                'universe_return': universe_return,
+                'excess': None if top_return is None
+                else top_return - universe_return,
+                'ic': rank_correlation([scores[symbol] for symbol in priced],
+                                       universe)}
+
+    @staticmethod
+    def summary(years):
+        """Mean returns, hit rate and growth of the evaluated years"""
+        evaluated = [year for year in years if year['top_return'] is not None]
+        if not evaluated:
+            return {'years': 0}
+        top_growth = float(np.prod([1 + year['top_return']
+                                    for year in evaluated]))
+        universe_growth = float(np.prod([1 + year['universe_return']
+                                         for year in evaluated]))
+        excess = [year['excess'] for year in evaluated]
+        ics = [year['ic'] for year in evaluated if year['ic'] is not None]
+        return {'years': len(evaluated),
+                'top_return': float(np.mean([year['top_return']
+                                             for year in evaluated])),
+                'universe_return': float(np.mean([year['universe_return']
+                                                  for year in evaluated])),
+                'excess': float(np.mean(excess)),
+                'hit_rate': sum(value > 0 for value in excess) / len(excess),
+                'ic': float(np.mean(ics)) if ics else None,
+                'top_growth': top_growth,
+                'universe_growth': universe_growth}
+
+    def run(self, start, end):
+        """Backtest fiscal years start..end, returns {'years': [...],
+        'summary': {...}}"""
+        views = {year: self.views(year) for year in range(start, end + 1)}
+        intermediates = self.intermediates(views)
+        years = []
+        for year in range(start, end + 1):
+            results = intermediates[year]
+            scores = {}
+            if results:
+                scores = YearAnalyze(results, list(results)) \
+                    .calculate()['total_points']
+            years.append(self.evaluate(year, scores))
+        return {'years': years, 'summary': self.summary(years)}
+
+
+def main(args):
+    """Backtest a periods store against a price file"""
+    store = PeriodStore(args.store)
+    results = ResultStore(args.results)
+    try:
+        report = Backtest(store, load_prices(args.prices), top=args.top,
+                          results=results, window=args.window,
+                          min_periods=args.min_periods,
+                          statsmodels=args.statsmodels,
+                          workers=args.workers).run(args.start, args.end)
+    finally:
+        results.close()
+        store.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(
+        description="Replay the scoring model over a periods store")
+    PARSER.add_argument("store", help="periods.PeriodStore file")
+    PARSER.add_argument("prices", help="CSV file with date,symbol,close")
+    PARSER.add_argument("--start", type=int, required=True,
+                        help="First fiscal year")
+    PARSER.add_argument("--end", type=int, required=True,
+                        help="Last fiscal year")
+    PARSER.add_argument("--top", type=int, default=10,
+                        help="Symbols held every year")
+    PARSER.add_argument("--window", type=int, default=None,
+                        help="Periods scored per year, all when missing")
+    PARSER.add_argument("--min-periods", type=int, default=3,
+                        dest="min_periods")
+    PARSER.add_argument("--results", default=":memory:",
+                        help="ResultStore file of the per-symbol results")
+    PARSER.add_argument("--statsmodels", action="store_true", default=False)
+    PARSER.add_argument("-w", "--workers", type=int, default=1)
+    main(PARSER.parse_args(sys.argv[1:]))
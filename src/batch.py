@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for batch data analyzing."""
+
+import numpy as np
+
+import normalize
+import ols
+import rules
+from analysis import CRITERIA_REGRESSION, CRITERIA
+
+METRICS = CRITERIA_REGRESSION + CRITERIA + ['roe', 'roa']
+
+
+class BatchAnalyze:
+    """Batch analyze module.
+
+    Packs every symbol into a dense symbol x year x metric matrix
+    (NaN for gaps) and scores the whole universe with array operations,
+    point bands and bonuses come from the scoring rules.
+    """
+
+    def __init__(self, data, symbols, packed=None, scoring=None):
+        self.data = data
+        self.points = {}
+        self.calculations = {}
+        self.symbols = symbols
+        self.index = []
+        self.values = None
+        self.lengths = None
+        self.packed = packed
+        self.rules = scoring or rules.default()
+
+    @staticmethod
+    def parse_cell(cell):
+        """Parse table cell, NaN for gaps"""
+        return normalize.parse_cell(cell)
+
+    @staticmethod
+    def column(metric):
+        """Metric column in the packed matrix"""
+        return METRICS.index(metric)
+
+    def pack(self):
+        """Pack yearly series into symbol x year x metric matrix"""
+        data = normalize.normalize(self.data)
+        self.index = [symbol for symbol, values in data.items()
+                      if isinstance(values, dict)
+                      and isinstance(values.get('data'), dict)]
+        years = 0
+        for symbol in self.index:
+            for metric, series in data[symbol]['data'].items():
+                if metric in METRICS:
+                    years = max(years, len(series))
+
+        self.values = np.full((len(self.index), years, len(METRICS)), np.nan)
+        self.lengths = np.zeros((len(self.index), len(METRICS)), dtype=int)
+        for row, symbol in enumerate(self.index):
+            fields = data[symbol]['data']
+            for column, metric in enumerate(METRICS):
+                series = fields.get(metric)
+                if series is not None and len(series):
+                    self.lengths[row, column] = len(series)
+                    self.values[row, :len(series), column] = \
+                        normalize.series(series).values
+        return self.values
+
+    @staticmethod
+    def mask(values, lengths):
+        """Mask of the years inside every series"""
+        years = np.arange(values.shape[1])[None, :, None]
+        return years < lengths[:, None, :]
+
+    @staticmethod
+    def filled(values, lengths):
+        """Gaps inside series as zero (like parse_float), NaN outside"""
+        mask = BatchAnalyze.mask(values, lengths)
+        return np.where(mask, np.nan_to_num(values), np.nan)
+
+    @staticmethod
+    def regression(values, lengths):
+        """Regression modeling for every series at once"""
+        mask = BatchAnalyze.mask(values, lengths)
+        x_axis = np.where(mask, np.arange(values.shape[1])[None, :, None], 0.0)
+        y_axis = np.where(mask, np.nan_to_num(values), 0.0)
+
+        element_number = lengths.astype(float)
+        sum_x_axis = np.sum(x_axis, axis=1)
+        sum_y_axis = np.sum(y_axis, axis=1)
+        sum_multiply_axis = np.sum(x_axis * y_axis, axis=1)
+        sum_power_x_axis = np.sum(np.power(x_axis, 2), axis=1)
+        sum_power_y_axis = np.sum(np.power(y_axis, 2), axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            top_b_coef = (element_number * sum_multiply_axis
+                          - sum_x_axis * sum_y_axis)
+            bottom_b_coef = (element_number * sum_power_x_axis
+                             - np.power(sum_x_axis, 2))
+            b_coef = top_b_coef / bottom_b_coef
+            a_coef = (sum_y_axis - b_coef * sum_x_axis) / element_number
+
+            x_middle = sum_x_axis / element_number
+            y_middle = sum_y_axis / element_number
+            xy_middle = sum_multiply_axis / element_number
+
+            s_sqrt_x = np.sqrt(sum_power_x_axis / element_number
+                               - np.power(x_middle, 2))
+            s_sqrt_y = np.sqrt(sum_power_y_axis / element_number
+                               - np.power(y_middle, 2))
+
+            rsquared = (xy_middle - x_middle * y_middle) \
+                / (s_sqrt_x * s_sqrt_y)
+            regression_coef = rsquared * s_sqrt_y / s_sqrt_x
+            regression_adj = \
+                (rsquared * ((-1) * x_middle / s_sqrt_x)) * s_sqrt_y + y_middle
+
+        return {'rsquared': rsquared,
+                'regression_coef': regression_coef,
+                'regression_adj': regression_adj,
+                'params': {"a_coef": a_coef, "b_coef": b_coef}}
+
+    def limitations(self, key, values, lengths):
+        """Limitations points for one criteria column"""
+        return self.rules.limitation_points(key, values, lengths)
+
+    def liabilities_points(self, precents):
+        """Liabilities/Assets ladder in parts"""
+        return self.rules.l_a(precents)
+
+    def return_points(self, precents):
+        """ROS/ROE/ROA ladder"""
+        return self.rules.returns(precents)
+
+    @staticmethod
+    def ratio(numerator, denominator):
+        """Yearly ratio in percents, NaN where it is undefined"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precents = numerator / denominator * 100
+        return np.where(np.isfinite(precents), precents, np.nan)
+
+    def liabilities_assets(self, filled):
+        """Liabilities/Assets"""
+        market_cap = filled[:, :, self.column('market_cap')]
+        precents = self.ratio(filled[:, :, self.column('debt')], market_cap)
+        precents = np.where(np.isnan(market_cap), np.nan, precents)
+        element_number = self.lengths[:, self.column('market_cap')]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            parts = 1 / (self.rules.l_a_parts * element_number)
+            avg = self.total(precents) / element_number
+        point = rules.accumulate(rules.in_parts(
+            self.liabilities_points(precents), parts[:, None])) \
+            + rules.in_parts(self.liabilities_points(avg), parts)
+        return {'result': precents, 'points': point}
+
+    @staticmethod
+    def total(precents):
+        """Yearly ratios summed in year order, NaN years skipped"""
+        return rules.accumulate(np.where(np.isnan(precents), 0.0, precents))
+
+    def return_on_sales(self, filled):
+        """ROS (Return on Sales)"""
+        revenue = filled[:, :, self.column('revenue')]
+        precents = self.ratio(filled[:, :, self.column('net_income')], revenue)
+        precents = np.where(np.isnan(revenue), np.nan, precents)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg = self.total(precents) \
+                / self.lengths[:, self.column('revenue')]
+        point = rules.accumulate(self.return_points(precents)) \
+            + self.return_points(avg)
+        return {'result': precents, 'points': point}
+
+    def return_on(self, metric):
+        """ROE/ROA, empty years are skipped"""
+        mask = self.mask(self.values, self.lengths)[:, :, self.column(metric)]
+        precents = np.where(mask, self.values[:, :, self.column(metric)],
+                            np.nan)
+        counter = np.sum(~np.isnan(precents), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg = self.total(precents) / counter
+        point = rules.accumulate(self.return_points(precents)) \
+            + self.return_points(avg)
+        return {'result': precents, 'points': point}
+
+    def get_points(self, title, coef, points=None):
+        """Get points for one metric column"""
+        if title in self.rules.trend:
+            trend = self.rules.trend[title]
+            candidates = trend['sign'] * coef > 0
+            best = np.where(candidates, trend['sign'] * coef, -np.inf).argmax()
+            # points are accumulated across symbols like Analyze.get_points
+            scores = np.cumsum(candidates) * trend['step']
+            if candidates.any():
+                scores[best] += trend['best']
+            return scores
+        if title in self.rules.rank_bonus:
+            return points + self.rules.rank_bonus[title] * (coef > 0)
+        return points
+
+    @staticmethod
+    def clear_points(scores):
+        """Clear points"""
+        max_value = np.max(np.where(np.isnan(scores), -np.inf, scores),
+                           initial=0)
+        return (scores == max_value).astype(int)
+
+    def calculate(self):
+        """Make all calculations"""
+        if self.packed is None:
+            self.pack()
+        else:
+            self.index, self.values, self.lengths = self.packed
+        self.calculations = {}
+        self.points = {}
+        if not self.index:
+            return None
+
+        filled = self.filled(self.values, self.lengths)
+        present = self.lengths > 0
+        regression = self.regression(self.values, self.lengths)
+        self.calculations['regression'] = regression
+
+        scores = {}
+        for title in CRITERIA_REGRESSION:
+            column = self.column(title)
+            rows = present[:, column]
+            self.calculations[f"{title}_regression_statsmodels"] = \
+                ols.fit(filled[:, :, column])
+            scores[title] = (rows, self.get_points(
+                title, regression['regression_coef'][rows, column]))
+        for title in CRITERIA:
+            column = self.column(title)
+            rows = present[:, column]
+            coef = regression['regression_coef'][:, column]
+            point = self.limitations(title, filled[:, :, column],
+                                     self.lengths[:, column])
+            point = point + self.rules.trend_bonus(title) * (coef > 0)
+            self.calculations[f"{title}_limitations"] = point
+            scores[title] = (rows, self.get_points(title, coef[rows],
+                                                   point[rows]))
+        ratios = {'l_a': ('market_cap', self.liabilities_assets(filled)),
+                  'ros': ('revenue', self.return_on_sales(filled)),
+                  'roe': ('roe', self.return_on('roe')),
+                  'roa': ('roa', self.return_on('roa'))}
+        for title, (metric, result) in ratios.items():
+            self.calculations[title] = result
+            rows = present[:, self.column(metric)]
+            scores[title] = (rows, result['points'][rows])
+
+        total = np.zeros(len(self.index), dtype=int)
+        for title, (rows, score) in scores.items():
+            symbols = [symbol for symbol, row in zip(self.index, rows) if row]
+            self.points[title] = dict(zip(symbols, score.tolist()))
+            total[rows] += self.clear_points(score)
+
+        position = {symbol: row for row, symbol in enumerate(self.index)}
+        total_points = {}
+        for symbol in self.symbols:
+            total_points[symbol] = int(total[position[symbol]]) \
+                if symbol in position else 0
+        return {'points': self.points, 'total_points': total_points}
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the on-disk page and result cache."""
+
+import sqlite3
+import threading
+import time
+
+import metrics
+
+DAY = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    body TEXT,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    expires REAL NOT NULL,
+    used REAL NOT NULL,
+    negative INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+
+
+class PageCache:
+    """Cache of pages (keyed by url) and parsed results (keyed by symbol).
+
+    Every entry has its own expiry, failed fetches are stored as
+    negative entries with a short expiry, stale pages are revalidated
+    with ETag/Last-Modified and the least recently used entries are
+    evicted once the cache grows over max_bytes.
+    """
+
+    def __init__(self, file_name, ttl=DAY, negative_ttl=DAY / 24,
+                 max_bytes=256 * 1024 * 1024, clock=time.time):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_name, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        # bytes of the entries, kept on every write so put needs no SUM
+        self.total = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def symbol_key(symbol, kind='financials'):
+        """Key of a parsed result"""
+        return f"{kind}:{symbol}"
+
+    def lookup(self, key):
+        """Entry dict, stale entries included, None when missing"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, expires, negative, etag, last_modified "
+                "FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE entries SET used = ? "
+                                    "WHERE key = ?", (self.clock(), key))
+            self.connection.commit()
+        return {'body': row[0], 'fresh': row[1] > self.clock(),
+                'negative': bool(row[2]), 'etag': row[3],
+                'last_modified': row[4]}
+
+    def get(self, key, stale=False):
+        """Cached body, None when missing, expired or negative"""
+        entry = self.lookup(key)
+        if entry is None or entry['negative'] \
+                or not (entry['fresh'] or stale):
+            return None
+        return entry['body']
+
+    def put(self, key, body, ttl=None, etag=None, last_modified=None,
+            negative=False):
+        """Store an entry"""
+        now = self.clock()
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        size = len(body or '')
+        with self.lock:
+            old = self.connection.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, body, size, stored, "
+                "expires, used, negative, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, body, size, now, now + ttl, now,
+                 int(negative), etag, last_modified))
+            self.total += size - (old[0] if old else 0)
+            self.evict()
+            self.connection.commit()
+
+    def put_negative(self, key, ttl=None):
+        """Remember a failed fetch until it expires"""
+        self.put(key, None, ttl=ttl, negative=True)
+
+    def touch(self, key, ttl=None):
+        """Extend a revalidated entry"""
+        now = self.clock()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE entries SET expires = ?, used = ? WHERE key = ?",
+                (now + (self.ttl if ttl is None else ttl), now, key))
+            self.connection.commit()
+
+    def evict(self, batch=32):
+        """Drop least recently used entries over max_bytes, a few at a
+        time through the used index"""
+        while self.total > self.max_bytes:
+            rows = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY used LIMIT ?",
+                (batch,)).fetchall()
+            if not rows:
+                self.total = 0
+                return
+            for key, size in rows:
+                self.connection.execute("DELETE FROM entries WHERE key = ?",
+                                        (key,))
+                self.total -= size
+                if self.total <= self.max_bytes:
+                    return
+
+    def size(self):
+        """Bytes and number of cached entries"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+            ).fetchone()
+
+    def fetch(self, key, send, revalidate=False):
+        """Page body through the cache.
+
+        send(headers) makes the request and returns a requests response.
+        Returns (body, changed); body is '' for a failed fetch and changed
+        is False when the body came from the cache or a 304 revalidation.
+        A stale body is served when send raises (timeout, open circuit)
+        or the answer is no 200/304. With revalidate a fresh page is
+        revalidated as if it had expired, negative entries still wait.
+        """
+        entry = self.lookup(key)
+        if entry is not None and entry['fresh'] \
+                and (entry['negative'] or not revalidate):
+            metrics.count('page_cache', result='negative' if entry['negative']
+                          else 'fresh')
+            return entry['body'] or '', False
+
+        headers = {}
+        if entry is not None and not entry['negative']:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            res = send(headers)
+        except OSError:
+            return self.failed(key, entry)
+        if res.status_code == 304 and headers:
+            metrics.count('page_cache', result='revalidated')
+            self.touch(key)
+            return entry['body'], False
+        if res.status_code != 200:
+            return self.failed(key, entry)
+        metrics.count('page_cache', result='miss' if entry is None
+                      else 'stale')
+        self.put(key, res.text, etag=res.headers.get('ETag'),
+                 last_modified=res.headers.get('Last-Modified'))
+        return res.text, True
+
+    def failed(self, key, entry):
+        """(body, changed) of a failed fetch: the stale body is served
+        and kept, a negative entry is stored only when nothing is
+        cached"""
+        if entry is not None and not entry['negative'] and entry['body']:
+            metrics.count('page_cache', result='stale_error')
+            return entry['body'], False
+        metrics.count('page_cache', result='error')
+        self.put_negative(key)
+        return '', True
+
+    def close(self):
+        """Close the index"""
+        self.connection.close()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the cross-sectional percentile and z-score ranking."""
+
+import numpy as np
+
+import rules
+from analysis import CRITERIA_REGRESSION, CRITERIA
+from batch import BatchAnalyze, METRICS
+
+# listing rows of the shares page have bare tickers, usa rows EXCHANGE:TICKER
+DEFAULT_MARKET = 'MOEX'
+RETURNS = ['roe', 'roa']
+
+
+def market(symbol):
+    """Exchange of a listing symbol, NYSE of NYSE:DDD or NYSE.BRK"""
+    for separator in (':', '.'):
+        if separator in symbol:
+            return symbol.split(separator, 1)[0]
+    return DEFAULT_MARKET
+
+
+def group_codes(index, groups):
+    """(codes, names) of the symbols, symbols without a group share
+    one"""
+    if groups is None:
+        return np.zeros(len(index), dtype=np.int64), [None]
+    names = list(dict.fromkeys(groups.get(symbol) for symbol in index))
+    code = {name: number for number, name in enumerate(names)}
+    return np.array([code[groups.get(symbol)] for symbol in index],
+                    dtype=np.int64), names
+
+
+def flat_groups(values, codes):
+    """(cell, group) of the finite cells of a symbols x features
+    matrix, every (group, feature) pair is a group of its own"""
+    count = int(codes.max()) + 1 if len(codes) else 0
+    groups = (codes[:, None]
+              + np.arange(values.shape[1])[None, :] * count).ravel()
+    flat = values.ravel()
+    cells = np.flatnonzero(np.isfinite(flat))
+    return cells, groups[cells], count * values.shape[1]
+
+
+def percentiles(values, codes):
+    """Percentile rank in [0, 1] of every cell inside its group and
+    column, ties share their mid rank, a lone value is 0.5, NaN stays.
+
+    One lexsort over (group, value) of all the columns at once, the
+    rank inside a group is the sorted position minus the group start.
+    """
+    result = np.full(values.size, np.nan)
+    cells, groups, count = flat_groups(values, codes)
+    if not len(cells):
+        return result.reshape(values.shape)
+    flat = values.ravel()[cells]
+    order = np.lexsort((flat, groups))
+    ordered_groups = groups[order]
+    ordered = flat[order]
+    size = np.bincount(groups, minlength=count)
+    start = np.cumsum(size) - size
+    change = np.ones(len(order), dtype=bool)
+    change[1:] = (ordered_groups[1:] != ordered_groups[:-1]) \
+        | (ordered[1:] != ordered[:-1])
+    run = np.cumsum(change) - 1
+    run_start = np.flatnonzero(change)
+    run_end = np.append(run_start[1:], len(order)) - 1
+    middle = (run_start + run_end)[run] / 2 - start[ordered_groups]
+    members = size[ordered_groups]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[cells[order]] = np.where(members > 1,
+                                        middle / (members - 1), 0.5)
+    return result.reshape(values.shape)
+
+
+def zscores(values, codes):
+    """z-score of every cell inside its group and column, 0 when the
+    group has no spread, NaN stays"""
+    result = np.full(values.size, np.nan)
+    cells, groups, count = flat_groups(values, codes)
+    if not len(cells):
+        return result.reshape(values.shape)
+    flat = values.ravel()[cells]
+    size = np.bincount(groups, minlength=count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(groups, weights=flat, minlength=count) / size
+        deviation = flat - mean[groups]
+        spread = np.sqrt(np.bincount(groups, weights=deviation ** 2,
+                                     minlength=count) / size)[groups]
+        result[cells] = np.where(spread > 0, deviation / spread, 0.0)
+    return result.reshape(values.shape)
+
+
+def latest(values, lengths):
+    """Last present value of every series of a symbol x year x metric
+    matrix, NaN when there is none"""
+    mask = BatchAnalyze.mask(values, lengths) & ~np.isnan(values)
+    if not values.shape[1]:
+        return np.full((values.shape[0], values.shape[2]), np.nan)
+    last = values.shape[1] - 1 - np.argmax(mask[:, ::-1, :], axis=1)
+    picked = np.take_along_axis(values, last[:, None, :], axis=1)[:, 0, :]
+    return np.where(mask.any(axis=1), picked, np.nan)
+
+
+class CrossSection:
+    """Relative standing of every symbol against the universe.
+
+    Features are the trend (regression coefficient) of the regression
+    criteria and the last value of the multiples and returns, signed so
+    that higher is better. Every feature gets a percentile rank and a
+    z-score across all symbols, or inside the groups of a
+    {symbol: group} mapping (market or sector), and total_points is the
+    mean percentile of a symbol.
+    """
+
+    def __init__(self, data, symbols, groups=None, packed=None,
+                 scoring=None):
+        self.data = data
+        self.symbols = symbols
+        self.groups = groups
+        self.packed = packed
+        self.rules = scoring or rules.default()
+        self.index = []
+        self.features = []
+
+    def signs(self):
+        """(feature, metric, sign) of every feature"""
+        res = [(f"{title}_trend", title, self.rules.trend[title]['sign'])
+               for title in CRITERIA_REGRESSION]
+        res += [(title, title, -1) for title in CRITERIA]
+        res += [(title, title, 1) for title in RETURNS]
+        return res
+
+    def matrix(self):
+        """Symbols x features matrix of signed values"""
+        if self.packed is None:
+            batch = BatchAnalyze(self.data, self.symbols)
+            batch.pack()
+            self.packed = batch.index, batch.values, batch.lengths
+        self.index, values, lengths = self.packed
+        coef = BatchAnalyze.regression(values, lengths)['regression_coef']
+        last = latest(values, lengths)
+        columns = []
+        self.features = []
+        for feature, metric, sign in self.signs():
+            column = METRICS.index(metric)
+            source = coef if feature.endswith('_trend') else last
+            columns.append(sign * source[:, column])
+            self.features.append(feature)
+        return np.stack(columns, axis=1) if columns \
+            else np.empty((len(self.index), 0))
+
+    def calculate(self):
+        """{'points': {feature: {symbol: percentile}},
+        'zscores': {feature: {symbol: z}}, 'total_points': {symbol: mean
+        percentile}, 'groups': {symbol: group}}"""
+        values = self.matrix()
+        if not self.index:
+            return None
+        codes, names = group_codes(self.index, self.groups)
+        ranks = percentiles(values, codes)
+        scores = zscores(values, codes)
+        points = {}
+        standard = {}
+        for column, feature in enumerate(self.features):
+            present = np.flatnonzero(np.isfinite(ranks[:, column]))
+            symbols = [self.index[row] for row in present]
+            points[feature] = dict(zip(symbols,
+                                       ranks[present, column].tolist()))
+            standard[feature] = dict(zip(symbols,
+                                         scores[present, column].tolist()))
+        counted = np.isfinite(ranks).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(counted > 0,
+                            np.nansum(ranks, axis=1) / counted, 0.0)
+        position = {symbol: row for row, symbol in enumerate(self.index)}
+        total_points = {symbol: float(mean[position[symbol]])
+                        if symbol in position else 0.0
+                        for symbol in self.symbols}
+        return {'points': points, 'zscores': standard,
+                'total_points': total_points,
+                'groups': {symbol: names[code] for symbol, code
+                           in zip(self.index, codes.tolist())}}
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the long-running daemon serving warm scores."""
+
+import heapq
+import json
+import os
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import logzero
+
+import incremental
+import metrics
+
+JSON = 'application/json'
+
+
+def dumps(document):
+    """JSON bytes, numpy numbers as floats"""
+    return json.dumps(document, default=float).encode('utf-8')
+
+
+class Daemon:
+    """Fundamentals and scores kept in memory between requests.
+
+    Every symbol has its own refresh deadline, interval long with a
+    random jitter so the refreshes of the symbols are spread out. Due
+    symbols are fetched again, scores are recalculated incrementally and
+    the JSON answers are rendered once per refresh, so a query is one
+    dict lookup.
+
+    fetch(symbol, revalidate) returns the company of a symbol,
+    revalidate is True for the scheduled refreshes so that a page cache
+    checks its pages before their TTL ends. listing(), when given, is
+    called every listing_interval (interval by default) to refresh the
+    symbol listing the fetches look symbols up in.
+    """
+
+    def __init__(self, symbols, fetch, interval=3600.0, jitter=0.1,
+                 results=':memory:', clock=time.monotonic, seed=None,
+                 listing=None, listing_interval=None):
+        self.symbols = list(symbols)
+        self.fetch = fetch
+        self.interval = interval
+        self.jitter = jitter
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.results = incremental.ResultStore(results)
+        self.listing = listing
+        self.listing_interval = listing_interval or interval
+        self.listing_deadline = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.companies = {}
+        self.deadlines = []
+        self.ranked = []
+        self.responses = {}
+        self.refreshed = None
+
+    def deadline(self, now):
+        """Next refresh time of a symbol"""
+        return now + self.interval * (
+            1 + self.random.uniform(-self.jitter, self.jitter))
+
+    def load(self, symbol, revalidate=False):
+        """Fetch one symbol, the old values are kept on failure"""
+        try:
+            self.companies[symbol] = self.fetch(symbol, revalidate)
+            metrics.count('daemon_refresh', result='ok')
+        except Exception:  # pylint: disable=broad-except
+            metrics.count('daemon_refresh', result='error')
+            logzero.logger.exception("refresh of %s failed", symbol)
+
+    def load_listing(self, now):
+        """Refresh the symbol listing when it is due"""
+        if self.listing is None or self.listing_deadline is None \
+                or self.listing_deadline > now:
+            return
+        self.listing_deadline = now + self.listing_interval
+        try:
+            self.listing()
+            metrics.count('daemon_listing', result='ok')
+        except Exception:  # pylint: disable=broad-except
+            metrics.count('daemon_listing', result='error')
+            logzero.logger.exception("refresh of the symbol listing failed")
+
+    def warm(self):
+        """Fetch and score every symbol"""
+        with self.lock:
+            now = self.clock()
+            self.deadlines = []
+            for symbol in self.symbols:
+                self.load(symbol)
+                heapq.heappush(self.deadlines, (self.deadline(now), symbol))
+            if self.listing is not None:
+                self.listing_deadline = now + self.listing_interval
+            self.rescore()
+
+    def refresh_due(self):
+        """Refresh the listing and fetch the symbols past their deadline,
+        rescore, due symbols are returned"""
+        with self.lock:
+            now = self.clock()
+            self.load_listing(now)
+            due = []
+            while self.deadlines and self.deadlines[0][0] <= now:
+                due.append(heapq.heappop(self.deadlines)[1])
+            for symbol in due:
+                self.load(symbol, revalidate=True)
+                heapq.heappush(self.deadlines, (self.deadline(now), symbol))
+            if due:
+                self.rescore()
+        return due
+
+    def rescore(self):
+        """Scores of the warm companies, answers are rendered once"""
+        companies = {symbol: values for symbol, values
+                     in self.companies.items()
+                     if isinstance(values, dict)
+                     and isinstance(values.get('data'), dict)}
+        symbols = [symbol for symbol in self.symbols if symbol in companies]
+        result = incremental.IncrementalAnalyze(
+            companies, symbols, self.results).calculate() or \
+            {'points': {}, 'total_points': {}}
+        self.refreshed = time.time()
+        totals = result['total_points']
+        responses = {'/scores': dumps({'refreshed': self.refreshed,
+                                       'scores': totals})}
+        for symbol, total in totals.items():
+            responses[f"/scores/{symbol}"] = dumps({
+                'symbol': symbol, 'score': total,
+                'points': {criterion: points[symbol]
+                           for criterion, points in result['points'].items()
+                           if symbol in points}})
+        self.ranked = sorted(totals.items(), key=lambda item: -item[1])
+        self.responses = responses
+
+    def response(self, path):
+        """(status, content type, body) of a GET path"""
+        url = urlsplit(path)
+        route = url.path.rstrip('/') or '/'
+        if route == '/health':
+            return 200, JSON, dumps({'symbols': len(self.companies),
+                                     'refreshed': self.refreshed,
+                                     'next': self.next_deadline()})
+        if route == '/metrics':
+            return 200, 'text/plain; version=0.0.4', \
+                metrics.REGISTRY.to_prometheus().encode('utf-8')
+        if route == '/top':
+            try:
+                k = int(parse_qs(url.query).get('k', ['10'])[0])
+            except ValueError:
+                return 400, JSON, dumps({'error': 'k must be a number'})
+            return 200, JSON, dumps([{'symbol': symbol, 'score': score}
+                                     for symbol, score in self.ranked[:k]])
+        body = self.responses.get(route)
+        if body is None:
+            return 404, JSON, dumps({'error': f"unknown path {route}"})
+        return 200, JSON, body
+
+    def next_deadline(self):
+        """Seconds to the next refresh, None without symbols or
+        listing"""
+        deadlines = [self.deadlines[0][0]] if self.deadlines else []
+        if self.listing_deadline is not None:
+            deadlines.append(self.listing_deadline)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - self.clock())
+
+    def run(self):
+        """Refresh loop, until stop()"""
+        while not self.stopped.is_set():
+            self.refresh_due()
+            wait = self.next_deadline()
+            self.stopped.wait(self.interval if wait is None else wait)
+
+    def start(self):
+        """Refresh in a background thread"""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the refresh thread"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.results.close()
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    """GET /scores, /scores/SYMBOL, /top?k=N, /health, /metrics"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Handle GET"""
+        status, content_type, body = self.server.app.response(self.path)
+        metrics.count('daemon_requests', status=status)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Requests are counted in metrics instead"""
+
+
+class UnixDaemonHandler(DaemonHandler):
+    """Handler without the TCP socket options"""
+
+    disable_nagle_algorithm = False
+
+
+class DaemonHTTPServer(ThreadingHTTPServer):
+    """HTTP over TCP answering from a Daemon"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, app):
+        self.app = app
+        super().__init__(address, handler)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    """HTTP over a Unix socket answering from a Daemon"""
+
+    daemon_threads = True
+
+    def __init__(self, path, handler, app):
+        self.app = app
+        super().__init__(path, handler)
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+def server(app, address):
+    """HTTP server of the daemon, 'unix:/path' for a Unix socket,
+    'host:port' otherwise"""
+    if address.startswith('unix:'):
+        path = address[len('unix:'):]
+        if os.path.exists(path):
+            os.remove(path)
+        return UnixHTTPServer(path, UnixDaemonHandler, app)
+    host, _, port = address.rpartition(':')
+    return DaemonHTTPServer((host or '127.0.0.1', int(port)), DaemonHandler,
+                            app)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for pooled, resilient page fetching."""
+
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import metrics
+
+# (connect, read) seconds, a hung socket fails instead of stalling a run
+DEFAULT_TIMEOUT = (5.0, 30.0)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+
+class CircuitOpenError(ConnectionError):
+    """Requests to the host are stopped by its circuit breaker"""
+
+
+def get_headers(query, url):
+    """Browser-like request headers"""
+    moz = 'Mozilla/5.0 (Windows NT 6.1)'
+    apple = 'AppleWebKit/537.36 (KHTML, like Gecko)'
+    chrome = 'Chrome/41.0.2228.0'
+    safari = 'Safari/537.36'
+    application_html = 'application/xhtml+xml'
+    application_xml = 'application/xml;q=0.9'
+    image = 'application/xml;q=0.9'
+    return {
+        'Accept': f"text/html,{application_html},"
+                  f"{application_xml},{image}",
+        'Accept-Encoding': "gzip, deflate, br",
+        'User-Agent': f"{moz} {apple} {chrome} {safari}",
+        'Referer': f"{url}{query}",
+    }
+
+
+class RateLimiter:
+    """Per host rate limiter, rate is requests per second (None - no limit)"""
+
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def host_interval(self, host):
+        """Seconds between two requests to the host"""
+        # pylint: disable=unused-argument
+        return self.interval
+
+    def wait(self, host):
+        """Block until the host has a free slot"""
+        with self.lock:
+            interval = self.host_interval(host)
+            if not interval:
+                return
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def feedback(self, host, status, seconds):
+        """Outcome of a request, a fixed rate ignores it"""
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """Per host AIMD rate limiter.
+
+    429/503 answers, errors (status None) and answers slower than slow
+    seconds cut the rate of the host by decrease, every other answer
+    adds increase requests per second up to rate. Without a rate hosts
+    are not limited until they throttle, throttled hosts start at
+    throttled requests per second.
+    """
+
+    def __init__(self, rate=None, minimum=0.2, increase=0.5, decrease=0.5,
+                 slow=None, throttled=10.0):
+        super().__init__(rate)
+        self.ceiling = rate
+        self.minimum = minimum
+        self.increase = increase
+        self.decrease = decrease
+        self.slow = slow
+        self.throttled = throttled
+        self.rates = {}
+
+    def rate(self, host):
+        """Current requests per second of the host, None - no limit"""
+        return self.rates.get(host, self.ceiling)
+
+    def host_interval(self, host):
+        rate = self.rate(host)
+        return 1 / rate if rate else 0
+
+    def feedback(self, host, status, seconds):
+        congested = status is None or status in THROTTLE_STATUS \
+            or (self.slow is not None and seconds > self.slow)
+        with self.lock:
+            rate = self.rate(host)
+            if congested:
+                rate = max(self.minimum,
+                           (rate or self.throttled) * self.decrease)
+                metrics.count('fetch_rate_changes', host=host,
+                              direction='down')
+            elif host in self.rates:
+                rate += self.increase
+                metrics.count('fetch_rate_changes', host=host,
+                              direction='up')
+                if rate >= (self.ceiling or self.throttled):
+                    del self.rates[host]
+                    return
+            else:
+                return
+            self.rates[host] = rate
+
+
+class CircuitBreaker:
+    """Per host circuit breaker.
+
+    threshold failures in a row open the circuit of the host, requests
+    fail fast for reset seconds, then one probe request is let through
+    (half open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset = reset
+        self.clock = clock
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def state(self, host):
+        """closed, open or half_open"""
+        return self.hosts.get(host, ('closed', 0, 0.0))[0]
+
+    def transition(self, host, state, failures, opened=0.0):
+        """Set the state of the host, transitions are counted"""
+        if self.state(host) != state:
+            metrics.count('fetch_circuit', host=host, state=state)
+        self.hosts[host] = (state, failures, opened)
+
+    def allow(self, host):
+        """Whether a request to the host may be sent"""
+        with self.lock:
+            state, failures, opened = self.hosts.get(host, ('closed', 0, 0.0))
+            if state == 'closed':
+                return True
+            if state == 'open' and self.clock() - opened >= self.reset:
+                self.transition(host, 'half_open', failures, opened)
+                return True
+            metrics.count('fetch_circuit_rejected', host=host)
+            return False
+
+    def success(self, host):
+        """Host answered"""
+        with self.lock:
+            self.transition(host, 'closed', 0)
+
+    def failure(self, host):
+        """Host failed or throttled"""
+        with self.lock:
+            state, failures, _ = self.hosts.get(host, ('closed', 0, 0.0))
+            failures += 1
+            if state == 'half_open' or failures >= self.threshold:
+                self.transition(host, 'open', failures, self.clock())
+            else:
+                self.transition(host, state, failures)
+
+
+class Backoff:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, base=0.5, cap=30.0, rnd=None):
+        self.base = base
+        self.cap = cap
+        self.random = rnd or random.Random()
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the retry after attempt (0 based),
+        at least the Retry-After of the answer"""
+        delay = self.random.uniform(0, min(self.cap,
+                                           self.base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(self.cap, retry_after))
+        return delay
+
+
+def retry_after(res):
+    """Retry-After seconds of an answer, None when missing"""
+    try:
+        return float(res.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class Fetcher:
+    """Concurrent fetcher over one pooled keep-alive session.
+
+    Requests have a timeout, failed and throttled ones are retried with
+    jittered exponential backoff, every host has a circuit breaker and
+    an AIMD rate limiter.
+    """
+
+    def __init__(self, concurrency=8, rate=None, timeout=DEFAULT_TIMEOUT,
+                 retries=3, backoff=None, breaker=None, limiter=None,
+                 sleep=time.sleep):
+        # pylint: disable=import-outside-toplevel,too-many-arguments
+        from requests import Session
+        from requests.adapters import HTTPAdapter
+
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveRateLimiter(rate)
+        self.sleep = sleep
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=self.concurrency,
+                              pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, query, url, headers=None):
+        """Make request to page, returns the response.
+
+        Errors and 429/5xx answers are retried; after the last attempt
+        the answer is returned and errors are raised (OSError, like
+        CircuitOpenError when the host circuit is open).
+        """
+        host = urlsplit(url).netloc
+        request_headers = get_headers(query, url)
+        request_headers.update(headers or {})
+        attempt = 0
+        while True:
+            if not self.breaker.allow(host):
+                raise CircuitOpenError(f"circuit open for {host}")
+            self.limiter.wait(host)
+            started = time.perf_counter()
+            try:
+                res = self.session.get(f"{url}{query}",
+                                       headers=request_headers,
+                                       timeout=self.timeout)
+            except OSError as error:
+                # requests exceptions (timeouts, resets) are OSError
+                self.limiter.feedback(host, None,
+                                      time.perf_counter() - started)
+                self.breaker.failure(host)
+                metrics.count('fetch_errors', host=host,
+                              kind=type(error).__name__)
+                if attempt >= self.retries:
+                    raise
+                delay = self.backoff.delay(attempt)
+            else:
+                seconds = time.perf_counter() - started
+                metrics.record_response(res, seconds, host)
+                self.limiter.feedback(host, res.status_code, seconds)
+                if res.status_code not in RETRY_STATUS:
+                    self.breaker.success(host)
+                    return res
+                self.breaker.failure(host)
+                if attempt >= self.retries:
+                    return res
+                delay = self.backoff.delay(attempt, retry_after(res))
+            metrics.count('fetch_retries', host=host)
+            self.sleep(delay)
+            attempt += 1
+
+    def get(self, query, url):
+        """Make request to page, '' when it fails or is not 200"""
+        try:
+            res = self.request(query, url)
+        except OSError:
+            return ''
+        data = ''
+        if res.status_code == 200:
+            data = res.text
+        return data
+
+    def get_many(self, pages):
+        """Fetch (query, url) pairs concurrently, keeps the order"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(lambda page: self.get(*page), pages))
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@functools.lru_cache(maxsize=None)
+def default_fetcher():
+    """Shared fetcher of the single page requests"""
+    return Fetcher(concurrency=1)
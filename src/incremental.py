@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the incremental re-analysis of changed symbols."""
+
+import hashlib
+import json
+import pickle
+import sqlite3
+
+import numpy as np
+
+import metrics
+import normalize
+from analysis import CALCULATIONS, CRITERIA, CRITERIA_REGRESSION, Analyze
+
+# bump when the per symbol calculations change, stored results are redone
+VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intermediates (
+    symbol TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    calculations BLOB NOT NULL,
+    sums TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(values, statsmodels=False):
+    """sha256 of the normalized series of one company"""
+    digest = hashlib.sha256(f"{VERSION}:{statsmodels}".encode())
+    for metric, cells in sorted(values['data'].items()):
+        digest.update(f"\0{metric}:{len(cells)}\0".encode())
+        if isinstance(cells, normalize.Series):
+            digest.update(cells.filled(np.nan).tobytes())
+        else:
+            digest.update(json.dumps(cells, default=str).encode())
+    return digest.hexdigest()
+
+
+def regression_sums(fields):
+    """{metric: sufficient statistics} of the regression inputs"""
+    return {metric: {name: float(value) for name, value
+                     in Analyze.regression_sums(fields[metric]).items()}
+            for metric in CRITERIA_REGRESSION + CRITERIA if metric in fields}
+
+
+def by_symbol(calculations):
+    """{title: {symbol: result}} as {symbol: {title: result}}"""
+    results = {}
+    for title, values in calculations.items():
+        for symbol, result in values.items():
+            results.setdefault(symbol, {})[title] = result
+    return results
+
+
+class ResultStore:
+    """SQLite store of per-symbol intermediate results.
+
+    Every symbol keeps the hash of the series it was calculated from,
+    its calculate_symbols results (pickled, they hold numpy values) and
+    the regression sufficient statistics as JSON. Callers using the
+    store from several threads serialize the calls.
+    """
+
+    def __init__(self, file_name):
+        self.connection = sqlite3.connect(file_name, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def get_many(self, hashes, size=500):
+        """{symbol: calculations} of the symbols stored with the same hash"""
+        results = {}
+        symbols = list(hashes)
+        for start in range(0, len(symbols), size):
+            chunk = symbols[start:start + size]
+            rows = self.connection.execute(
+                "SELECT symbol, hash, calculations FROM intermediates "
+                f"WHERE symbol IN ({','.join('?' * len(chunk))})", chunk)
+            for symbol, stored, calculations in rows:
+                if stored == hashes[symbol]:
+                    results[symbol] = pickle.loads(calculations)
+        return results
+
+    def put_many(self, records):
+        """Store (symbol, hash, calculations, sums) records"""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO intermediates "
+            "(symbol, hash, calculations, sums) VALUES (?, ?, ?, ?)",
+            [(symbol, content, pickle.dumps(calculations),
+              json.dumps(sums, sort_keys=True))
+             for symbol, content, calculations, sums in records])
+        self.connection.commit()
+
+    def sums(self, symbol):
+        """Stored sufficient statistics of a symbol, None when missing"""
+        row = self.connection.execute("SELECT sums FROM intermediates "
+                                      "WHERE symbol = ?", (symbol,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        """Close the connection"""
+        self.connection.close()
+
+
+class IncrementalAnalyze(Analyze):
+    """Analyze reusing the stored results of unchanged symbols.
+
+    Only the symbols whose series hash differs from the stored one are
+    calculated (in a process pool with workers > 1), then the cross
+    symbol get_points/clear_points ranking runs over all of them.
+    """
+
+    def __init__(self, data, symbols, store, statsmodels=False, workers=1):
+        super().__init__(data, symbols, statsmodels, workers)
+        self.store = store
+        self.dirty = []
+
+    def calculate_symbols(self):
+        """Per symbol calculations of the changed symbols"""
+        return self.incremental(super().calculate_symbols)
+
+    def calculate_parallel(self):
+        """Changed symbols sharded over a process pool"""
+        return self.incremental(super().calculate_parallel)
+
+    def incremental(self, calculate):
+        """Stored results merged with calculate() of the dirty symbols,
+        in symbol order"""
+        hashes = {symbol: content_hash(values, self.statsmodels)
+                  for symbol, values in self.data.items()}
+        cached = self.store.get_many(hashes)
+        self.dirty = [symbol for symbol in self.data if symbol not in cached]
+        metrics.count('incremental_symbols', len(cached), result='reused')
+        metrics.count('incremental_symbols', len(self.dirty),
+                      result='recomputed')
+        fresh = {}
+        if self.dirty:
+            data = self.data
+            self.data = {symbol: data[symbol] for symbol in self.dirty}
+            try:
+                fresh = by_symbol(calculate())
+            finally:
+                self.data = data
+            self.store.put_many([
+                (symbol, hashes[symbol], fresh.get(symbol, {}),
+                 regression_sums(self.data[symbol]['data']))
+                for symbol in self.dirty])
+        calculations = {title: {} for title in CALCULATIONS}
+        for symbol in self.data:
+            results = cached[symbol] if symbol in cached \
+                else fresh.get(symbol, {})
+            for title, result in results.items():
+                calculations[title][symbol] = result
+        return calculations
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for deferred imports of the heavy modules."""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Module executed on its first attribute access.
+
+    Keeps numpy, requests and bs4 out of the start of code paths that
+    never touch them (--version, cached analysis).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
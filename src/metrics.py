@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for run metrics, timings and profiling hooks."""
+
+import collections
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'financials_'
+
+
+def label_key(labels):
+    """Hashable, sorted labels"""
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Thread safe counters and timers with labels.
+
+    Counters are plain sums, timers keep count, sum and max of the
+    observed seconds. Exported as Prometheus text or a JSON summary.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        self.timers = {}
+        self.help = {}
+
+    def count(self, name, value=1, **labels):
+        """Add value to a counter"""
+        with self.lock:
+            self.counters[(name, label_key(labels))] += value
+
+    def observe(self, name, seconds, **labels):
+        """Add one observation to a timer"""
+        key = (name, label_key(labels))
+        with self.lock:
+            timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Time the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def describe(self, name, text):
+        """HELP text of a metric"""
+        self.help[name] = text
+
+    def reset(self):
+        """Drop every value"""
+        with self.lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def snapshot(self):
+        """Picklable copy of the values, for Registry.merge"""
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'timers': {key: list(timer)
+                               for key, timer in self.timers.items()}}
+
+    def merge(self, snapshot):
+        """Add the values of another registry snapshot, a pool worker
+        one"""
+        with self.lock:
+            for key, value in snapshot['counters'].items():
+                self.counters[key] += value
+            for key, (number, seconds, maximum) in \
+                    snapshot['timers'].items():
+                timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+                timer[0] += number
+                timer[1] += seconds
+                timer[2] = max(timer[2], maximum)
+
+    def summary(self):
+        """JSON friendly summary"""
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self.counters.items()]
+            timers = [{'name': name, 'labels': dict(labels), 'count': count,
+                       'seconds': seconds, 'max': maximum}
+                      for (name, labels), (count, seconds, maximum)
+                      in self.timers.items()]
+        return {'counters': sorted(counters, key=lambda item: item['name']),
+                'timers': sorted(timers, key=lambda item: item['name'])}
+
+    def to_json(self):
+        """Summary as a JSON document"""
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        summary = self.summary()
+        seen = set()
+
+        def header(name, kind, suffix=''):
+            if name not in seen:
+                seen.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {PREFIX}{name}{suffix} "
+                                 f"{self.help[name]}")
+                lines.append(f"# TYPE {PREFIX}{name}{suffix} {kind}")
+
+        for item in summary['counters']:
+            # counters are exposed as <name>_total
+            suffix = '' if item['name'].endswith('_total') else '_total'
+            header(item['name'], 'counter', suffix)
+            lines.append(f"{PREFIX}{item['name']}{suffix}"
+                         f"{labels_text(item['labels'])} {item['value']:g}")
+        for item in summary['timers']:
+            header(item['name'], 'summary')
+            labels = labels_text(item['labels'])
+            lines.append(f"{PREFIX}{item['name']}_count{labels} "
+                         f"{item['count']}")
+            lines.append(f"{PREFIX}{item['name']}_sum{labels} "
+                         f"{item['seconds']:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_name):
+        """Write Prometheus text for *.prom/*.txt files, JSON otherwise"""
+        text = self.to_prometheus() \
+            if file_name.endswith(('.prom', '.txt')) else self.to_json()
+        if file_name == '-':
+            sys.stdout.write(text + '\n')
+            return
+        with open(file_name, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+
+def labels_text(labels):
+    """{a="1",b="2"}"""
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"'
+                          for name, value in zip(labels, escaped)) + '}'
+
+
+REGISTRY = Registry()
+REGISTRY.describe('http_requests', 'Page requests by host and status code')
+REGISTRY.describe('http_response_bytes', 'Bytes of the page bodies')
+REGISTRY.describe('http_request_seconds', 'Page request latency')
+REGISTRY.describe('file_cache', 'Saved JSON files found or missing')
+REGISTRY.describe('page_cache', 'Page cache lookups by result')
+REGISTRY.describe('page_archive', 'Archived pages parsed or unchanged')
+REGISTRY.describe('parse_seconds', 'Page parse time by page kind')
+REGISTRY.describe('analysis_seconds', 'Analyze time by metric family')
+REGISTRY.describe('analysis_stage_seconds',
+                  'Analyze per-symbol stage and cross-symbol ranking time')
+REGISTRY.describe('call_seconds', 'Time of the app.log decorated calls')
+REGISTRY.describe('incremental_symbols',
+                  'Symbols reused or recomputed by the incremental analysis')
+REGISTRY.describe('backtest_views',
+                  'Backtest symbol years reused or recomputed')
+REGISTRY.describe('daemon_refresh', 'Daemon symbol refreshes by result')
+REGISTRY.describe('daemon_listing',
+                  'Daemon symbol listing refreshes by result')
+REGISTRY.describe('daemon_requests', 'Daemon API requests by status code')
+REGISTRY.describe('fetch_retries', 'Retried page requests by host')
+REGISTRY.describe('fetch_errors', 'Page request errors by host and kind')
+REGISTRY.describe('fetch_circuit', 'Circuit breaker transitions by state')
+REGISTRY.describe('fetch_circuit_rejected',
+                  'Requests failed fast by an open circuit')
+REGISTRY.describe('fetch_rate_changes', 'AIMD rate changes by direction')
+REGISTRY.describe('ols_fits', 'Fitted regression_statsmodels series')
+count = REGISTRY.count
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+
+
+def collect(function, *args):
+    """Call function in a process pool worker, returns (result, snapshot
+    of the metrics it recorded) for REGISTRY.merge in the parent.
+    Values the worker had before, forked from the parent, are dropped."""
+    REGISTRY.reset()
+    result = function(*args)
+    return result, REGISTRY.snapshot()
+
+
+def record_response(res, seconds, host):
+    """Latency, status code and size of one page request"""
+    observe('http_request_seconds', seconds, host=host)
+    count('http_requests', host=host, status=res.status_code)
+    count('http_response_bytes', len(res.content or b''), host=host)
+
+
+class Sampler:
+    """Sampling profiler of one thread.
+
+    Every interval the stack of the thread is recorded, stacks are
+    written in the folded format flame graph tools read.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        """Sampling loop"""
+        while not self.stopped.wait(self.interval):
+            # pylint: disable=protected-access
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:"
+                             f"{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        """Start sampling"""
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, file_name):
+        """Folded stacks, one 'frame;frame count' line each"""
+        with open(file_name, 'w', encoding='utf-8') as file:
+            for stack, samples in self.stacks.most_common():
+                file.write(f"{stack} {samples}\n")
+
+
+@contextmanager
+def profiled(file_name, profiler='cprofile'):
+    """Profile the with block into file_name, no-op without a file"""
+    if not file_name:
+        yield
+        return
+    if profiler == 'sampling':
+        sampler = Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(file_name)
+        return
+    # pylint: disable=import-outside-toplevel
+    import cProfile
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(file_name)
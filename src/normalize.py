@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the one-pass normalization of scrapped cells."""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+NUMBER = re.compile(r'^-?\d+(?:\.\d+)?$')
+CELL = str.maketrans({' ': None, '\xa0': None, '%': None, ',': '.'})
+
+
+class Series(namedtuple('Series', ['values', 'mask'])):
+    """Typed yearly series, mask is True where the cell had a number"""
+
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.values)
+
+    def filled(self, fill=0.0):
+        """Values with gaps replaced by fill"""
+        return np.where(self.mask, self.values, fill)
+
+    def present(self):
+        """Values of the cells that had a number"""
+        return self.values[self.mask]
+
+
+def parse_cell(cell):
+    """Parse table cell ("1 234,5", "12%", "", None), NaN for gaps"""
+    if isinstance(cell, str):
+        cell = cell.translate(CELL)
+        if NUMBER.match(cell) is None:
+            return np.nan
+        return float(cell)
+    if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+        return float(cell)
+    return np.nan
+
+
+def series(cells):
+    """Series of a list of cells, Series are returned as they are"""
+    if isinstance(cells, Series):
+        return cells
+    values = np.array([parse_cell(cell) for cell in cells], dtype=float)
+    return Series(values, ~np.isnan(values))
+
+
+def normalize_company(values):
+    """{'data': {...}} with every metric list as a Series,
+    header_row and other fields are kept, records.Fundamentals give
+    their Series views"""
+    if hasattr(values, 'normalized'):
+        return values.normalized()
+    if not isinstance(values, dict) or not isinstance(values.get('data'),
+                                                      dict):
+        return values
+    fields = {}
+    for metric, cells in values['data'].items():
+        if metric != 'header_row' and isinstance(cells, (list, Series)):
+            cells = series(cells)
+        fields[metric] = cells
+    return dict(values, data=fields)
+
+
+def normalize(data):
+    """Normalize every company of {symbol: {'data': {...}}}"""
+    return {symbol: normalize_company(values)
+            for symbol, values in data.items()}
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for batched least squares trend fitting."""
+
+import numpy as np
+
+
+def design(years):
+    """Design matrix with constant for x = 0..years-1"""
+    return np.column_stack([np.ones(years), np.arange(years, dtype=float)])
+
+
+def fit(y_axis, mask=None):
+    """Fit y = a + b * x for every row of y_axis (series x year).
+
+    Rows share x = 0..n-1; years where mask is False (or y is NaN)
+    are left out of the fit. Returns statsmodels-like rsquared,
+    rsquared_adj and params ([const, x1]) for every row.
+    """
+    y_axis = np.atleast_2d(np.asarray(y_axis, dtype=float))
+    valid = ~np.isnan(y_axis)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool)
+    if valid.all():
+        return fit_complete(y_axis)
+    return fit_masked(y_axis, valid)
+
+
+def fit_complete(y_axis):
+    """All series of equal length without gaps in one matrix solve"""
+    series, years = y_axis.shape
+    x_axis = design(years)
+    params = y_axis @ np.linalg.pinv(x_axis).T
+    residuals = y_axis - params @ x_axis.T
+    nobs = np.full(series, years, dtype=float)
+    rank = np.full(series, np.linalg.matrix_rank(x_axis), dtype=float)
+    return summary(y_axis, np.ones_like(y_axis, dtype=bool), residuals,
+                   params, nobs, rank)
+
+
+def fit_masked(y_axis, valid):
+    """Series with masked years, closed form on centered sums"""
+    x_axis = np.broadcast_to(np.arange(y_axis.shape[1], dtype=float),
+                             y_axis.shape)
+    weight = valid.astype(float)
+    y_values = np.where(valid, y_axis, 0.0)
+    nobs = weight.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_middle = (weight * x_axis).sum(axis=1) / nobs
+        y_middle = y_values.sum(axis=1) / nobs
+        x_centered = (x_axis - x_middle[:, None]) * weight
+        sum_xx = (x_centered ** 2).sum(axis=1)
+        sum_xy = (x_centered * (y_values - y_middle[:, None])).sum(axis=1)
+        b_coef = sum_xy / sum_xx
+        a_coef = y_middle - b_coef * x_middle
+    params = np.column_stack([a_coef, b_coef])
+    rank = np.where(sum_xx > 0, 2.0, np.minimum(nobs, 1.0))
+
+    # rank deficient rows (one observation) follow the pinv solution
+    for row in np.flatnonzero((sum_xx <= 0) & (nobs > 0)):
+        columns = valid[row]
+        params[row] = np.linalg.pinv(design(y_axis.shape[1])[columns]) \
+            @ y_axis[row, columns]
+
+    residuals = np.where(valid, y_values - (params[:, :1]
+                                            + params[:, 1:] * x_axis), 0.0)
+    return summary(y_values, valid, residuals, params, nobs, rank)
+
+
+def summary(y_axis, valid, residuals, params, nobs, rank):
+    """R-squared values the way statsmodels OLS reports them"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y_middle = np.where(valid, y_axis, 0.0).sum(axis=1) / nobs
+        centered_tss = (np.where(valid, y_axis - y_middle[:, None], 0.0)
+                        ** 2).sum(axis=1)
+        ssr = (residuals ** 2).sum(axis=1)
+        rsquared = 1 - ssr / centered_tss
+        df_resid = nobs - rank
+        rsquared_adj = 1 - (nobs - 1) / df_resid * (1 - rsquared)
+    return {'rsquared': rsquared,
+            'rsquared_adj': rsquared_adj,
+            'params': params}
+
+
+def fit_many(series_list):
+    """Fit a list of series, grouping series of equal length"""
+    results = [None] * len(series_list)
+    groups = {}
+    for position, series in enumerate(series_list):
+        groups.setdefault(len(series), []).append(position)
+    for years, positions in groups.items():
+        if years == 0:
+            continue
+        stacked = np.array([series_list[position] for position in positions],
+                           dtype=float)
+        result = fit(stacked)
+        for row, position in enumerate(positions):
+            results[position] = {'rsquared': result['rsquared'][row],
+                                 'rsquared_adj': result['rsquared_adj'][row],
+                                 'params': result['params'][row]}
+    return results
+
+
+def fit_statsmodels(y_axis):
+    """Fit one series with statsmodels OLS"""
+    # pylint: disable=import-outside-toplevel
+    import statsmodels.api as sm
+
+    x_axis = sm.add_constant(np.arange(len(y_axis)))
+    results = sm.OLS(np.asarray(y_axis, dtype=float), x_axis).fit()
+    return {'rsquared': results.rsquared,
+            'rsquared_adj': results.rsquared_adj,
+            'params': results.params}
+
+
+class RegressionAccumulator:
+    """Updatable y = a + b * x trend of (x, y) points.
+
+    Keeps the count, the means and the centered co-moments of x and y
+    with Welford updates, so appending a year, dropping the oldest one
+    and merging two partial accumulators are O(1) and stable. x defaults
+    to the next year index, the result is the one of Analyze.regression
+    with the oldest kept year as x = 0.
+    """
+
+    __slots__ = ('count', 'first', 'mean_x', 'mean_y', 'm2_x', 'm2_y',
+                 'c_xy')
+
+    def __init__(self, first=0):
+        self.first = first
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+
+    @classmethod
+    def from_series(cls, y_axis, first=0):
+        """Accumulator of y values at x = first, first + 1, ..."""
+        accumulator = cls(first)
+        for y_value in y_axis:
+            accumulator.add(y_value)
+        return accumulator
+
+    @classmethod
+    def from_sums(cls, sums, first=0):
+        """Accumulator of the Analyze.regression_sums statistics"""
+        accumulator = cls(first)
+        count = sums['n']
+        if count:
+            accumulator.count = count
+            accumulator.mean_x = sums['sum_x'] / count + first
+            accumulator.mean_y = sums['sum_y'] / count
+            accumulator.m2_x = sums['sum_xx'] - sums['sum_x'] ** 2 / count
+            accumulator.m2_y = sums['sum_yy'] - sums['sum_y'] ** 2 / count
+            accumulator.c_xy = sums['sum_xy'] \
+                - sums['sum_x'] * sums['sum_y'] / count
+        return accumulator
+
+    def add(self, y_value, x_value=None):
+        """Append a point, x is the next year by default"""
+        if x_value is None:
+            x_value = self.first + self.count
+        self.count += 1
+        delta_x = x_value - self.mean_x
+        delta_y = y_value - self.mean_y
+        self.mean_x += delta_x / self.count
+        self.mean_y += delta_y / self.count
+        self.m2_x += delta_x * (x_value - self.mean_x)
+        self.m2_y += delta_y * (y_value - self.mean_y)
+        self.c_xy += delta_x * (y_value - self.mean_y)
+        return self
+
+    def remove(self, y_value, x_value=None):
+        """Drop a point, the oldest year by default"""
+        if x_value is None:
+            x_value = self.first
+            self.first += 1
+        if self.count <= 1:
+            self.__init__(self.first)
+            return self
+        count = self.count - 1
+        mean_x = self.mean_x - (x_value - self.mean_x) / count
+        mean_y = self.mean_y - (y_value - self.mean_y) / count
+        self.m2_x -= (x_value - mean_x) * (x_value - self.mean_x)
+        self.m2_y -= (y_value - mean_y) * (y_value - self.mean_y)
+        self.c_xy -= (x_value - mean_x) * (y_value - self.mean_y)
+        self.count, self.mean_x, self.mean_y = count, mean_x, mean_y
+        return self
+
+    def merge(self, other):
+        """Combine with another accumulator of other points"""
+        if not other.count:
+            return self
+        if not self.count:
+            for name in self.__slots__:
+                setattr(self, name, getattr(other, name))
+            return self
+        count = self.count + other.count
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.count * other.count / count
+        self.m2_x += other.m2_x + delta_x * delta_x * weight
+        self.m2_y += other.m2_y + delta_y * delta_y * weight
+        self.c_xy += other.c_xy + delta_x * delta_y * weight
+        self.mean_x += delta_x * other.count / count
+        self.mean_y += delta_y * other.count / count
+        self.count = count
+        self.first = min(self.first, other.first)
+        return self
+
+    def sums(self):
+        """n, Σx, Σy, Σxy, Σx², Σy² with the oldest year as x = 0"""
+        count = self.count
+        mean_x = self.mean_x - self.first
+        return {'n': count,
+                'sum_x': count * mean_x,
+                'sum_y': count * self.mean_y,
+                'sum_xy': self.c_xy + count * mean_x * self.mean_y,
+                'sum_xx': self.m2_x + count * mean_x * mean_x,
+                'sum_yy': self.m2_y + count * self.mean_y * self.mean_y}
+
+    def result(self):
+        """rsquared, regression_coef, regression_adj and params of
+        Analyze.regression"""
+        mean_x = np.float64(self.mean_x - self.first)
+        mean_y = np.float64(self.mean_y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            b_coef = np.float64(self.c_xy) / self.m2_x
+            a_coef = mean_y - b_coef * mean_x
+            s_sqrt_x = np.sqrt(np.float64(self.m2_x) / self.count)
+            s_sqrt_y = np.sqrt(max(self.m2_y, 0.0) / np.float64(self.count))
+            rsquared = np.float64(self.c_xy) / self.count \
+                / (s_sqrt_x * s_sqrt_y)
+            regression_coef = rsquared * s_sqrt_y / s_sqrt_x
+            regression_adj = rsquared * (-mean_x / s_sqrt_x) * s_sqrt_y \
+                + mean_y
+        return {'rsquared': rsquared,
+                'regression_coef': regression_coef,
+                'regression_adj': regression_adj,
+                'params': {"a_coef": a_coef, "b_coef": b_coef},
+                'point': 0}
+
+
+def rolling_regressions(y_axis, window):
+    """Result of every window years long trend of the series"""
+    accumulator = RegressionAccumulator()
+    results = []
+    for position, y_value in enumerate(y_axis):
+        accumulator.add(y_value)
+        if position >= window:
+            accumulator.remove(y_axis[position - window])
+        if accumulator.count == window:
+            results.append(accumulator.result())
+    return results
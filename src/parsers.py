@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for html parsing backends.
+
+Backends extract only the target table (usa_shares, trades or
+financials) and return exactly what the BeautifulSoup path of
+Scrapper returns.
+"""
+
+import importlib.util
+from html.parser import HTMLParser
+
+from lazy import lazy_import
+
+records = lazy_import('records')
+
+LXML = importlib.util.find_spec('lxml') is not None
+
+CRITERIA = ['market_cap',
+            'debt', 'assets',
+            'revenue',
+            'net_income',
+            'p_e', 'p_s', 'p_bv',
+            'roe', 'roa', 'ev_ebitda',
+            'debt_ebitda']
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+             'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+CHUNK_SIZE = 65536
+# version of the parse results, bumped whenever their shape changes,
+# archived results of another version are parsed again
+FORMAT = 3
+
+
+def new_cell(attrs):
+    """Cell record: text, class and the links map_row looks for"""
+    return {'text': [], 'class': attrs.get('class'), 'forum': None,
+            'portfolio': False, 'symbol': None, 'chart': False}
+
+
+def map_row(cells):
+    """Mapping table rows to records.SymbolRecord"""
+    name = None
+    symbol = None
+    fundamental_analysis = False
+
+    number = 1
+    for cell in cells:
+        if cell['forum'] is not None:
+            name = ''.join(cell['forum'])
+            number = number + 1
+
+        if cell['portfolio']:
+            symbol = cell['symbol']
+            number = number + 1
+
+        if cell['chart']:
+            fundamental_analysis = True
+
+    if number > 2:
+        return records.SymbolRecord(symbol, name, fundamental_analysis)
+    return None
+
+
+def map_row_financial(cells, header=False):
+    """Mapping table financial rows, empty cells are None so that every
+    value keeps its column, the label cell leading a header row is left
+    out"""
+    res = []
+
+    number = 1
+    for cell in cells:
+        if cell['class'] is not None:
+            continue
+        text = ''.join(cell['text']).strip()
+        if text:
+            res.append(text)
+            number = number + 1
+        elif res or not header:
+            res.append(None)
+    if number > 2:
+        return res
+    return None
+
+
+def parse_table(rows):
+    """Parse listing table rows"""
+    res = []
+
+    if len(rows) > 1:
+        for row in rows:
+            if row['cells'] and len(row['cells']) > 1:
+                item = map_row(row['cells'])
+                if item is not None:
+                    res.append(item)
+
+    return res
+
+
+def parse_table_by_criteria(rows):
+    """Parse financial table rows"""
+    res = {}
+
+    if len(rows) > 1:
+        for row in rows:
+            field = row['attrs'].get('field')
+            class_name = (row['attrs'].get('class') or '').split()
+            columns = row['cells']
+            if (field in CRITERIA and columns and len(columns) > 1) \
+                    or 'header_row' in class_name:
+                item = map_row_financial(columns, 'header_row' in class_name)
+                if item is not None:
+                    if field:
+                        res[field] = item
+                    if class_name:
+                        res['header_row'] = item
+
+    return res
+
+
+def has_class(attrs, name):
+    """Class attribute contains name"""
+    return name in (attrs.get('class') or '')
+
+
+class TableExtractor(HTMLParser):
+    """Streaming extractor of the first element matching each target.
+
+    Only rows and cells inside a target are kept, the rest of the page
+    is dropped as it is read.
+    """
+
+    def __init__(self, targets):
+        super().__init__(convert_charrefs=True)
+        self.targets = targets
+        self.tables = {}
+        self.done = set()
+        self.stack = []
+
+    def inside(self):
+        """Parsing inside a target"""
+        return bool(self.stack)
+
+    def open_entries(self, kind):
+        """Open stack entries of a kind"""
+        return [entry for entry in self.stack if entry[1] == kind]
+
+    def start_target(self, tag, attrs):
+        """Push targets matching the tag"""
+        found = False
+        for name, predicate in self.targets:
+            if name not in self.tables and predicate(tag, attrs):
+                self.tables[name] = []
+                self.stack.append((tag, 'target', name))
+                found = True
+        return found
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.start_target(tag, attrs) or not self.inside():
+            return
+        if tag == 'tr':
+            row = {'attrs': attrs, 'cells': []}
+            for _, _, name in self.open_entries('target'):
+                self.tables[name].append(row)
+            entry = (tag, 'row', row)
+        elif tag == 'td':
+            cell = new_cell(attrs)
+            for _, _, row in self.open_entries('row'):
+                row['cells'].append(cell)
+            entry = (tag, 'cell', cell)
+        else:
+            entry = (tag, 'tag', self.start_link(tag, attrs))
+        if tag not in VOID_TAGS:
+            self.stack.append(entry)
+
+    def start_link(self, tag, attrs):
+        """Links and spans map_row looks for, returns forum captures"""
+        captures = []
+        for _, _, cell in self.open_entries('cell'):
+            if tag == 'a' and cell['forum'] is None \
+                    and 'forum' in (attrs.get('href') or ''):
+                cell['forum'] = []
+                captures.append(cell['forum'])
+            if tag == 'a' and has_class(attrs, 'charticon2'):
+                cell['chart'] = True
+            if tag == 'span' and not cell['portfolio'] \
+                    and has_class(attrs, 'portfolio_action'):
+                cell['portfolio'] = True
+                cell['symbol'] = attrs.get('symbol')
+        return captures
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for position in range(len(self.stack) - 1, -1, -1):
+            if self.stack[position][0] == tag:
+                for _, kind, name in self.stack[position:]:
+                    if kind == 'target':
+                        self.done.add(name)
+                del self.stack[position:]
+                return
+
+    def handle_data(self, data):
+        for _, kind, payload in self.stack:
+            if kind == 'cell':
+                payload['text'].append(data)
+            if kind == 'tag':
+                for capture in payload:
+                    capture.append(data)
+
+    def parse(self, html, stop):
+        """Feed the page until stop() says the wanted table is complete"""
+        for start in range(0, len(html), CHUNK_SIZE):
+            self.feed(html[start:start + CHUNK_SIZE])
+            if stop(self):
+                break
+        self.close()
+        return self.tables
+
+
+def is_usa_shares(_, attrs):
+    """Element with id usa_shares"""
+    return attrs.get('id') == 'usa_shares'
+
+
+def is_trades(tag, attrs):
+    """Table with trades class"""
+    return tag == 'table' and has_class(attrs, 'trades')
+
+
+def is_financials(tag, attrs):
+    """Table with financials class"""
+    return tag == 'table' and has_class(attrs, 'financials')
+
+
+class StreamingParser:
+    """html.parser based extractor, no tree is built"""
+
+    name = 'stream'
+
+    @staticmethod
+    def parse_body(html):
+        """Parse page body"""
+        tables = TableExtractor([('usa_shares', is_usa_shares),
+                                 ('trades', is_trades)]) \
+            .parse(html, lambda extractor: 'usa_shares' in extractor.done)
+        if 'usa_shares' in tables:
+            return parse_table(tables['usa_shares'])
+        if 'trades' in tables:
+            return parse_table(tables['trades'])
+        return []
+
+    @staticmethod
+    def parse_body_financial(html):
+        """Parse page financial body"""
+        tables = TableExtractor([('financials', is_financials)]) \
+            .parse(html, lambda extractor: 'financials' in extractor.done)
+        if 'financials' in tables:
+            return parse_table_by_criteria(tables['financials'])
+        return []
+
+
+class LxmlParser:
+    """lxml pull parser, the document tree is pruned while it is read"""
+
+    name = 'lxml'
+
+    @staticmethod
+    def rows(table):
+        """Row records of a table element"""
+        rows = []
+        for row in table.iter('tr'):
+            cells = []
+            for column in row.iter('td'):
+                cell = new_cell(column.attrib)
+                cell['text'] = [''.join(column.itertext())]
+                for link in column.iter('a', 'span'):
+                    if link.tag == 'a' and cell['forum'] is None \
+                            and 'forum' in (link.get('href') or ''):
+                        cell['forum'] = [''.join(link.itertext())]
+                    if link.tag == 'a' \
+                            and has_class(link.attrib, 'charticon2'):
+                        cell['chart'] = True
+                    if link.tag == 'span' and not cell['portfolio'] \
+                            and has_class(link.attrib, 'portfolio_action'):
+                        cell['portfolio'] = True
+                        cell['symbol'] = link.get('symbol')
+                cells.append(cell)
+            rows.append({'attrs': row.attrib, 'cells': cells})
+        return rows
+
+    @staticmethod
+    def open_path(root):
+        """Elements the pull parser may still add to, the chain of last
+        children from the root"""
+        path = [root]
+        while len(path[-1]):
+            path.append(path[-1][-1])
+        return path
+
+    def collect(self, root, path, targets, tables):
+        """Add the row records of the complete targets to tables,
+        returns the targets still on the open path"""
+        partial = []
+        for name, xpath in targets:
+            found = root.xpath(xpath) if name not in tables else []
+            if found and any(found[0] is node for node in path):
+                partial.append(found[0])
+            elif found:
+                tables[name] = self.rows(found[0])
+        return partial
+
+    def tables(self, html, targets, stop):
+        """{name: row records} of the first element matching the xpath
+        of each target, read until stop(tables) is true.
+
+        The page is fed to an HTMLPullParser in chunks. After every
+        chunk a target no longer on the open path is complete and
+        turned into row records, then the finished siblings along the
+        open path are dropped, so the tree never grows past the
+        elements still open and a partly read target.
+        """
+        tables = {}
+        if not html or not html.strip():
+            return tables
+        # pylint: disable=import-outside-toplevel
+        from lxml import etree
+
+        parser = etree.HTMLPullParser(events=('start',), tag='html')
+        root = None
+        chunks = [html[start:start + CHUNK_SIZE]
+                  for start in range(0, len(html), CHUNK_SIZE)] + [None]
+        for chunk in chunks:
+            if chunk is None:
+                parser.close()
+            else:
+                parser.feed(chunk)
+            for _, element in parser.read_events():
+                root = element
+            if root is None:
+                continue
+            path = self.open_path(root) if chunk is not None else []
+            partial = self.collect(root, path, targets, tables)
+            if stop(tables):
+                break
+            for node in path:
+                if any(node is target for target in partial):
+                    break
+                del node[:-1]
+        return tables
+
+    def parse_body(self, html):
+        """Parse page body"""
+        tables = self.tables(html, [
+            ('usa_shares', '//*[@id="usa_shares"]'),
+            ('trades', '//table[contains(@class, "trades")]')],
+            lambda tables: 'usa_shares' in tables)
+        if 'usa_shares' in tables:
+            return parse_table(tables['usa_shares'])
+        if 'trades' in tables:
+            return parse_table(tables['trades'])
+        return []
+
+    def parse_body_financial(self, html):
+        """Parse page financial body"""
+        tables = self.tables(html, [
+            ('financials', '//table[contains(@class, "financials")]')],
+            lambda tables: 'financials' in tables)
+        if 'financials' in tables:
+            return parse_table_by_criteria(tables['financials'])
+        return []
+
+
+def get_parser(name=None):
+    """Parser backend by name: lxml, stream or soup (None).
+    By default lxml when it is installed, stream otherwise."""
+    if name in (None, 'auto'):
+        name = 'lxml' if LXML else 'stream'
+    if name == 'soup':
+        return None
+    if name == 'lxml':
+        if not LXML:
+            raise ImportError("lxml is not installed")
+        return LxmlParser()
+    if name == 'stream':
+        return StreamingParser()
+    raise ValueError(f"unknown parser {name}")
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the period-indexed fundamentals store."""
+
+import re
+import sqlite3
+
+import normalize
+from records import Fundamentals
+
+YEARLY = 'y'
+QUARTERLY = 'q'
+FREQUENCIES = (YEARLY, QUARTERLY)
+# LTM (last twelve months) sorts after every fiscal period
+LTM = 2 ** 31 - 1
+
+YEAR = re.compile(r'^(\d{4})$')
+QUARTER = re.compile(r'^(\d{4})\s*Q([1-4])$', re.IGNORECASE)
+QUARTER_FIRST = re.compile(r'^([1-4])\s*(?:Q|кв\.?)\s*(\d{4})$',
+                           re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS periods (
+    symbol_id INTEGER NOT NULL,
+    frequency TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (symbol_id, frequency, period)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS observations (
+    symbol_id INTEGER NOT NULL,
+    frequency TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (symbol_id, frequency, period, metric)
+) WITHOUT ROWID;
+"""
+
+
+def period_ordinal(label, first=False):
+    """Ordinal of a header label, year * 4 + quarter - 1, a year is its
+    last quarter (its first one with first=True). None when the label
+    is no fiscal period."""
+    text = str(label).strip()
+    if text.upper() == 'LTM':
+        return LTM
+    match = YEAR.match(text)
+    if match:
+        return int(match.group(1)) * 4 + (0 if first else 3)
+    match = QUARTER.match(text)
+    if match:
+        return int(match.group(1)) * 4 + int(match.group(2)) - 1
+    match = QUARTER_FIRST.match(text)
+    if match:
+        return int(match.group(2)) * 4 + int(match.group(1)) - 1
+    return None
+
+
+def fields_of(values):
+    """Fields dict of a get_fundamental_analysis result
+    or a records.Fundamentals"""
+    if isinstance(values, Fundamentals):
+        return values.to_json()['data']
+    if isinstance(values, dict) and isinstance(values.get('data'), dict):
+        return values['data']
+    return {}
+
+
+def align(fields):
+    """([(period, label)], [(period, metric, value)]) of a parsed page.
+
+    The parsers keep empty cells after the first value as None and
+    leave out only the leading ones, the years before a company
+    reported, so a row shorter than header_row ends on its last
+    periods and every value is paired with its column. Labels that
+    are no period and gaps are left out.
+    """
+    header = ['' if label is None else str(label).strip()
+              for label in fields.get('header_row') or []]
+    ordinals = [period_ordinal(label) for label in header]
+    periods = [(period, label) for period, label in zip(ordinals, header)
+               if period is not None]
+    observations = []
+    for metric, cells in fields.items():
+        if metric == 'header_row' \
+                or not isinstance(cells, (list, normalize.Series)):
+            continue
+        values = normalize.series(cells)
+        offset = max(len(header) - len(values), 0)
+        for position in range(min(len(values), len(header))):
+            period = ordinals[offset + position]
+            if period is not None and values.mask[position]:
+                observations.append((period, metric,
+                                     float(values.values[position])))
+    return periods, observations
+
+
+class PeriodStore:
+    """SQLite store of fundamentals indexed by fiscal period.
+
+    Every value is keyed by symbol, frequency (yearly or quarterly),
+    period ordinal and metric, so a page scraped later adds its new
+    periods to the history and a metric with a gap keeps its values
+    on their periods. Range queries read only the wanted periods.
+    """
+
+    def __init__(self, file_name):
+        self.connection = sqlite3.connect(file_name)
+        self.connection.executescript(SCHEMA)
+
+    @staticmethod
+    def check(frequency):
+        """Raise ValueError for an unknown frequency"""
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"unknown frequency {frequency!r}")
+
+    def symbol_id(self, symbol):
+        """Id of the symbol, created when missing"""
+        self.connection.execute("INSERT OR IGNORE INTO symbols (symbol) "
+                                "VALUES (?)", (symbol,))
+        return self.connection.execute("SELECT id FROM symbols "
+                                       "WHERE symbol = ?", (symbol,)) \
+            .fetchone()[0]
+
+    def put(self, symbol, values, frequency=YEARLY):
+        """Store the periods of one page"""
+        return self.put_many({symbol: values}, frequency)
+
+    def put_many(self, companies, frequency=YEARLY):
+        """Store {symbol: {'data': {...}}} in one transaction, the periods
+        of a page replace the stored ones, older periods are kept.
+        Returns the stored symbols."""
+        self.check(frequency)
+        stored = []
+        with self.connection:
+            for symbol, values in companies.items():
+                periods, observations = align(fields_of(values))
+                if not periods:
+                    continue
+                symbol_id = self.symbol_id(symbol)
+                keys = [(symbol_id, frequency, period)
+                        for period, _ in periods]
+                self.connection.executemany(
+                    "DELETE FROM observations WHERE symbol_id = ? "
+                    "AND frequency = ? AND period = ?", keys)
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO periods VALUES (?, ?, ?, ?)",
+                    [key + (label,) for key, (_, label)
+                     in zip(keys, periods)])
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO observations "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(symbol_id, frequency, period, metric, value)
+                     for period, metric, value in observations])
+                stored.append(symbol)
+        return stored
+
+    def symbols(self):
+        """Stored symbols"""
+        return [row[0] for row in self.connection.execute(
+            "SELECT symbol FROM symbols ORDER BY id")]
+
+    def periods(self, symbol, frequency=YEARLY):
+        """Labels of the stored periods of a symbol, oldest first"""
+        return [label for label, in self.connection.execute(
+            "SELECT p.label FROM periods p "
+            "JOIN symbols s ON s.id = p.symbol_id "
+            "WHERE s.symbol = ? AND p.frequency = ? ORDER BY p.period",
+            (symbol, frequency))]
+
+    def select(self, symbols=None, metrics=None, frequency=YEARLY, last=None,
+               start=None, end=None):
+        """Rows (symbol, period, label, metric, value) of the wanted
+        periods, oldest first, metric and value are None for a period
+        without the wanted metrics.
+
+        last keeps the last N periods of every symbol, start and end are
+        inclusive period labels ('2015', '2019Q2', 'LTM').
+        """
+        self.check(frequency)
+        low = 0 if start is None else period_ordinal(start, first=True)
+        high = LTM if end is None else period_ordinal(end)
+        if low is None or high is None:
+            raise ValueError(f"unknown period {start if low is None else end}")
+        where = "p.frequency = ? AND p.period BETWEEN ? AND ?"
+        join = ""
+        params = [frequency, low, high]
+        if metrics is not None:
+            join = f" AND o.metric IN ({','.join('?' * len(metrics))})"
+        query = (
+            "WITH wanted AS (SELECT symbol_id, period, label FROM ("
+            "SELECT p.symbol_id, p.period, p.label, ROW_NUMBER() OVER ("
+            "PARTITION BY p.symbol_id ORDER BY p.period DESC) AS age "
+            "FROM periods p JOIN symbols s ON s.id = p.symbol_id "
+            f"WHERE {where}{{symbols}}) WHERE age <= ?) "
+            "SELECT s.symbol, w.period, w.label, o.metric, o.value "
+            "FROM wanted w JOIN symbols s ON s.id = w.symbol_id "
+            "LEFT JOIN observations o ON o.symbol_id = w.symbol_id "
+            f"AND o.frequency = ? AND o.period = w.period{join} "
+            "ORDER BY w.symbol_id, w.period, o.metric")
+        tail = [LTM if last is None else last, frequency] \
+            + list(metrics or [])
+        if symbols is None:
+            return self.connection.execute(query.format(symbols=''),
+                                           params + tail).fetchall()
+        rows = []
+        symbols = list(symbols)
+        for first in range(0, len(symbols), 500):
+            chunk = symbols[first:first + 500]
+            rows += self.connection.execute(
+                query.format(symbols=" AND s.symbol IN "
+                             f"({','.join('?' * len(chunk))})"),
+                params + chunk + tail).fetchall()
+        position = {symbol: row for row, symbol in enumerate(symbols)}
+        rows.sort(key=lambda row: position[row[0]])
+        return rows
+
+    def load(self, symbols=None, metrics=None, frequency=YEARLY, last=None,
+             start=None, end=None):
+        """Companies in the get_fundamental_analysis shape with floats.
+
+        header_row has the labels of the wanted periods, every metric
+        series starts at its first reported period and has None in its
+        gaps, so Analyze regressions keep the periods in place.
+        """
+        periods = {}
+        values = {}
+        for symbol, period, label, metric, value in self.select(
+                symbols, metrics, frequency, last, start, end):
+            labels = periods.setdefault(symbol, {})
+            labels[period] = label
+            if metric is not None:
+                values.setdefault(symbol, {}).setdefault(metric, {})[period] \
+                    = value
+        companies = {}
+        for symbol, labels in periods.items():
+            order = list(labels)
+            fields = {'header_row': [labels[period] for period in order]}
+            for metric, series in values.get(symbol, {}).items():
+                first = min(series)
+                fields[metric] = [series.get(period) for period in order
+                                  if period >= first]
+            companies[symbol] = {'data': fields}
+        return companies
+
+    def close(self):
+        """Close the store"""
+        self.connection.close()
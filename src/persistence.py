@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the PostgreSQL persistence layer."""
+
+import io
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from batch import METRICS
+from storage import FundamentalsStore
+
+
+def connection_dsn(dsn=None):
+    """The given DSN or POSTGRES_DSN, there is no built in default"""
+    dsn = dsn or os.environ.get('POSTGRES_DSN')
+    if not dsn:
+        raise ValueError("no PostgreSQL DSN, set POSTGRES_DSN "
+                         "or pass --postgres DSN")
+    return dsn
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    id SERIAL PRIMARY KEY,
+    symbol TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS headers (
+    symbol_id INTEGER NOT NULL REFERENCES symbols (id) ON DELETE CASCADE,
+    year SMALLINT NOT NULL,
+    label TEXT,
+    PRIMARY KEY (symbol_id, year)
+);
+CREATE TABLE IF NOT EXISTS fundamentals (
+    symbol_id INTEGER NOT NULL REFERENCES symbols (id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    year SMALLINT NOT NULL,
+    value DOUBLE PRECISION,
+    PRIMARY KEY (symbol_id, metric, year)
+);
+CREATE INDEX IF NOT EXISTS fundamentals_metric
+    ON fundamentals (metric, year);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id SERIAL PRIMARY KEY,
+    created TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS scores (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    symbol_id INTEGER NOT NULL REFERENCES symbols (id) ON DELETE CASCADE,
+    criterion TEXT NOT NULL,
+    points DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (snapshot_id, symbol_id, criterion)
+);
+"""
+
+TOTAL = 'total'
+
+
+def copy_buffer(rows):
+    """Rows as a COPY text format buffer, None as NULL"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(
+            '\\N' if field is None else str(field)
+            .replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+            for field in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+class PostgresStore:
+    """PostgreSQL store of parsed fundamentals and score snapshots.
+
+    Connections come from one thread safe pool, so scraping workers can
+    write through the same store. Writes are staged with COPY and merged
+    in one statement per table, reads stream through server side cursors.
+    """
+
+    def __init__(self, dsn=None, min_connections=1, max_connections=8):
+        # pylint: disable=import-outside-toplevel
+        from psycopg2.pool import ThreadedConnectionPool
+        self.pool = ThreadedConnectionPool(min_connections, max_connections,
+                                           connection_dsn(dsn))
+        self.slots = threading.BoundedSemaphore(max_connections)
+        with self.connection() as connection, \
+                connection.cursor() as cursor:
+            cursor.execute(SCHEMA)
+
+    @contextmanager
+    def connection(self):
+        """Pooled connection, committed on success, waits while all
+        connections are in use"""
+        with self.slots:
+            connection = self.pool.getconn()
+            try:
+                with connection:
+                    yield connection
+            finally:
+                self.pool.putconn(connection)
+
+    @staticmethod
+    def symbol_ids(cursor, symbols):
+        """{symbol: id}, missing symbols are created"""
+        cursor.execute("INSERT INTO symbols (symbol) SELECT symbol "
+                       "FROM unnest(%s::text[]) WITH ORDINALITY "
+                       "AS given (symbol, position) ORDER BY position "
+                       "ON CONFLICT DO NOTHING", (list(symbols),))
+        cursor.execute("SELECT symbol, id FROM symbols "
+                       "WHERE symbol = ANY(%s)", (list(symbols),))
+        return dict(cursor.fetchall())
+
+    @staticmethod
+    def copy(cursor, table, columns, rows):
+        """COPY rows into a table"""
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) "
+                           "FROM STDIN", copy_buffer(rows))
+
+    def put(self, symbol, values):
+        """Store one symbol, replacing what was stored before"""
+        self.put_many({symbol: values})
+
+    def put_many(self, companies):
+        """Store {symbol: {'data': {...}}} in one transaction"""
+        companies = {symbol: FundamentalsStore.fields(values)
+                     for symbol, values in companies.items()}
+        companies = {symbol: fields for symbol, fields in companies.items()
+                     if fields}
+        if not companies:
+            return
+        with self.connection() as connection, \
+                connection.cursor() as cursor:
+            ids = self.symbol_ids(cursor, list(companies))
+            cursor.execute("CREATE TEMP TABLE staging_headers "
+                           "(LIKE headers) ON COMMIT DROP")
+            cursor.execute("CREATE TEMP TABLE staging_fundamentals "
+                           "(LIKE fundamentals) ON COMMIT DROP")
+            self.copy(cursor, 'staging_headers',
+                      ('symbol_id', 'year', 'label'),
+                      ((ids[symbol], year, label)
+                       for symbol, fields in companies.items()
+                       for year, label
+                       in enumerate(fields.get('header_row', []))))
+            self.copy(cursor, 'staging_fundamentals',
+                      ('symbol_id', 'metric', 'year', 'value'),
+                      ((ids[symbol], metric, year,
+                        FundamentalsStore.value(cell))
+                       for symbol, fields in companies.items()
+                       for metric, series in fields.items()
+                       if metric in METRICS
+                       for year, cell in enumerate(series)))
+            for table in ('headers', 'fundamentals'):
+                cursor.execute(f"DELETE FROM {table} "
+                               "WHERE symbol_id = ANY(%s)",
+                               (list(ids.values()),))
+                cursor.execute(f"INSERT INTO {table} "
+                               f"SELECT * FROM staging_{table}")
+
+    def symbols(self):
+        """Stored symbols"""
+        with self.connection() as connection, \
+                connection.cursor() as cursor:
+            cursor.execute("SELECT symbol FROM symbols ORDER BY id")
+            return [row[0] for row in cursor]
+
+    def stream(self, symbols=None, metrics=None, itersize=10000):
+        """(symbol, {'data': {...}}) pairs read through a server side
+        cursor, one symbol at a time in the order of symbols when given"""
+        query = "SELECT s.symbol, f.metric, f.year, f.value " \
+                "FROM fundamentals f JOIN symbols s ON s.id = f.symbol_id " \
+                "WHERE TRUE"
+        params = []
+        if symbols is not None:
+            query += " AND s.symbol = ANY(%s)"
+            params.append(list(symbols))
+        if metrics is not None:
+            query += " AND f.metric = ANY(%s)"
+            params.append(list(metrics))
+        order = "f.symbol_id"
+        if symbols is not None:
+            order = "array_position(%s::text[], s.symbol)"
+            params.append(list(symbols))
+        query += f" ORDER BY {order}, f.metric, f.year"
+        with self.connection() as connection, \
+                connection.cursor(name='fundamentals_stream') as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            symbol, data = None, {}
+            for row_symbol, metric, year, value in cursor:
+                if row_symbol != symbol:
+                    if symbol is not None:
+                        yield symbol, {'data': data}
+                    symbol, data = row_symbol, {}
+                series = data.setdefault(metric, [])
+                series.extend([None] * (year + 1 - len(series)))
+                series[year] = value
+            if symbol is not None:
+                yield symbol, {'data': data}
+
+    def load(self, symbols=None, metrics=None):
+        """Companies in the get_fundamental_analysis shape with floats"""
+        companies = dict(self.stream(symbols, metrics))
+        if metrics is None:
+            for symbol, labels in self.headers(list(companies)).items():
+                companies[symbol]['data']['header_row'] = labels
+        return companies
+
+    def headers(self, symbols):
+        """header_row labels of the symbols"""
+        res = {}
+        with self.connection() as connection, \
+                connection.cursor() as cursor:
+            cursor.execute("SELECT s.symbol, h.label FROM headers h "
+                           "JOIN symbols s ON s.id = h.symbol_id "
+                           "WHERE s.symbol = ANY(%s) "
+                           "ORDER BY h.symbol_id, h.year", (list(symbols),))
+            for symbol, label in cursor:
+                res.setdefault(symbol, []).append(label)
+        return res
+
+    def load_matrix(self, symbols=None):
+        """Symbol x year x metric matrix for BatchAnalyze.
+
+        Returns (index, values, lengths) like BatchAnalyze.pack.
+        """
+        companies = self.load(symbols, METRICS)
+        index = list(companies)
+        width = max((len(series) for values in companies.values()
+                     for series in values['data'].values()), default=0)
+        values = np.full((len(index), width, len(METRICS)), np.nan)
+        lengths = np.zeros((len(index), len(METRICS)), dtype=int)
+        for row, symbol in enumerate(index):
+            for metric, series in companies[symbol]['data'].items():
+                column = METRICS.index(metric)
+                lengths[row, column] = len(series)
+                values[row, :len(series), column] = \
+                    [np.nan if value is None else value for value in series]
+        return index, values, lengths
+
+    def save_scores(self, result):
+        """Store a calculate() result as a new snapshot, returns its id"""
+        points = dict(result['points'])
+        points[TOTAL] = result['total_points']
+        symbols = list(dict.fromkeys(symbol for scores in points.values()
+                                     for symbol in scores))
+        with self.connection() as connection, \
+                connection.cursor() as cursor:
+            ids = self.symbol_ids(cursor, symbols)
+            cursor.execute("INSERT INTO snapshots DEFAULT VALUES "
+                           "RETURNING id")
+            snapshot_id = cursor.fetchone()[0]
+            self.copy(cursor, 'scores',
+                      ('snapshot_id', 'symbol_id', 'criterion', 'points'),
+                      ((snapshot_id, ids[symbol], criterion, float(value))
+                       for criterion, scores in points.items()
+                       for symbol, value in scores.items()))
+        return snapshot_id
+
+    def scores(self, snapshot_id=None, criterion=TOTAL):
+        """{symbol: points} of a snapshot, the latest one by default"""
+        with self.connection() as connection, \
+                connection.cursor() as cursor:
+            if snapshot_id is None:
+                cursor.execute("SELECT max(id) FROM snapshots")
+                snapshot_id = cursor.fetchone()[0]
+            cursor.execute("SELECT s.symbol, p.points FROM scores p "
+                           "JOIN symbols s ON s.id = p.symbol_id "
+                           "WHERE p.snapshot_id = %s AND p.criterion = %s "
+                           "ORDER BY s.id", (snapshot_id, criterion))
+            return dict(cursor.fetchall())
+
+    def close(self):
+        """Close pooled connections"""
+        self.pool.closeall()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the asyncio scrapping pipeline."""
+
+import asyncio
+import functools
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metrics
+import records
+from fetcher import Fetcher
+from scrapping import Scrapper
+
+STOP = None
+
+
+def parse_listing(html, parser=None):
+    """Parse listing page in an executor"""
+    return Scrapper([], parser).parse_body(html)
+
+
+def parse_financial(html, parser=None):
+    """Parse financials page in an executor"""
+    return Scrapper([], parser).parse_body_financial(html)
+
+
+class Pipeline:
+    """Bounded download -> parse pipeline.
+
+    Download workers put page bodies on a bounded queue, parse workers
+    hand them to an executor, so a full refresh is limited by the slower
+    stage instead of by the sum of both. Pages go through the page cache
+    and the archive of the scrapper when it has them.
+    """
+
+    def __init__(self, scrapper, concurrency=8, parse_workers=None,
+                 rate=None, queue_size=None):
+        self.scrapper = scrapper
+        self.concurrency = max(1, concurrency)
+        self.parse_workers = parse_workers
+        self.rate = rate
+        self.queue_size = queue_size or 2 * self.concurrency
+        parser = getattr(scrapper.parser, 'name', 'soup')
+        self.parse_listing = functools.partial(parse_listing, parser=parser)
+        self.parse_financial = functools.partial(parse_financial,
+                                                 parser=parser)
+
+    async def download(self, fetcher, downloads, pages, bodies):
+        """Download worker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await pages.get()
+            if item is STOP:
+                return
+            number, parser, query, url, symbol = item
+            if self.scrapper.cache is None:
+                body = await loop.run_in_executor(downloads, fetcher.get,
+                                                  query, url)
+                changed = True
+            else:
+                body, changed = await loop.run_in_executor(
+                    downloads, self.scrapper.get_page, query, url, fetcher)
+            await bodies.put((number, parser, body, changed, symbol))
+
+    async def parse(self, parsers, bodies, results):
+        """Parse worker"""
+        while True:
+            item = await bodies.get()
+            if item is STOP:
+                return
+            number, parser, body, changed, symbol = item
+            results[number] = []
+            if body != '':
+                results[number] = await self.parse_page(
+                    parsers, parser, body, changed, symbol)
+
+    async def parse_page(self, parsers, parser, body, changed, symbol):
+        """Parse a page in the executor. For the page of a symbol the
+        cached result is reused when the page is unchanged and the
+        archive skips bodies it parsed before."""
+        if symbol is None:
+            return await self.parsed(parsers, parser, body)
+        key = self.scrapper.page_key(symbol)
+        cache = self.scrapper.cache
+        if cache is not None and not changed:
+            stale = cache.get(cache.symbol_key(key), stale=True)
+            if stale is not None:
+                return json.loads(stale)['data']
+        archive = self.scrapper.archive
+        if archive is None:
+            return await self.parsed(parsers, parser, body)
+        stamp = self.scrapper.parser_stamp()
+        result = archive.known(key, body, stamp)
+        if result is None:
+            result = archive.keep(key, body, await self.parsed(
+                parsers, parser, body), stamp)
+        return result
+
+    @staticmethod
+    async def parsed(parsers, parser, body):
+        """Parse a page in the process pool, the metrics of the worker
+        are merged into the registry"""
+        result, recorded = await asyncio.get_running_loop().run_in_executor(
+            parsers, functools.partial(metrics.collect, parser), body)
+        metrics.REGISTRY.merge(recorded)
+        return result
+
+    async def feed(self, tasks, pages):
+        """Producer, blocks while the download queue is full"""
+        for number, task in enumerate(tasks):
+            task = tuple(task) + (None,) * (4 - len(task))
+            await pages.put((number,) + task)
+        for _ in range(self.concurrency):
+            await pages.put(STOP)
+
+    async def run(self, tasks):
+        """Run (parser, query, url) or (parser, query, url, symbol) tasks,
+        results keep the task order"""
+        results = [[] for _ in tasks]
+        if not tasks:
+            return results
+        pages = asyncio.Queue(self.queue_size)
+        bodies = asyncio.Queue(self.queue_size)
+        parse_workers = self.parse_workers or self.concurrency
+        with Fetcher(self.concurrency, self.rate) as fetcher, \
+                ThreadPoolExecutor(self.concurrency) as downloads, \
+                ProcessPoolExecutor(parse_workers) as parsers:
+            producer = asyncio.ensure_future(self.feed(tasks, pages))
+            downloaders = [asyncio.ensure_future(
+                self.download(fetcher, downloads, pages, bodies))
+                           for _ in range(self.concurrency)]
+            consumers = [asyncio.ensure_future(
+                self.parse(parsers, bodies, results))
+                         for _ in range(parse_workers)]
+            await asyncio.gather(producer, *downloaders)
+            for _ in consumers:
+                await bodies.put(STOP)
+            await asyncio.gather(*consumers)
+        return results
+
+    async def get_symbols(self, file_name):
+        """Get stock symbols scrapping process, through the page cache
+        of the scrapper when it has one"""
+        if self.scrapper.cache is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.scrapper.get_symbols, file_name)
+            return self.scrapper.list_symbols
+        bulk = self.scrapper.read_symbols(file_name)
+        if bulk is not None:
+            self.scrapper.list_symbols = bulk
+            return bulk
+        tasks = [(self.parse_listing, query, url)
+                 for url, values in self.scrapper.endpoints.items()
+                 for query in values]
+        table = records.SymbolTable(record for stock_list
+                                    in await self.run(tasks)
+                                    for record in stock_list)
+        self.scrapper.save_symbols(file_name, table)
+        return table
+
+    def stored(self, symbol, file_name):
+        """Fresh cached result of a symbol, or the saved file without a
+        page cache, None when it has to be scrapped"""
+        cache = self.scrapper.cache
+        if cache is None:
+            return self.scrapper.read_filename(file_name)
+        bulk = cache.get(cache.symbol_key(self.scrapper.page_key(symbol)))
+        return None if bulk is None else json.loads(bulk)
+
+    async def get_fundamental_analysis(self, symbols, file_name):
+        """Get fundamental finance analysis data for many symbols,
+        file_name is a format string with {symbol}."""
+        res = {}
+        tasks = []
+        for symbol in symbols:
+            res[symbol] = self.stored(symbol, file_name.format(symbol=symbol))
+            query = self.scrapper.get_fundamental_query(symbol)
+            if res[symbol] is None and query:
+                for url in self.scrapper.endpoints:
+                    tasks.append((symbol, query, url))
+        results = await self.run([(self.parse_financial, query, url, symbol)
+                                  for symbol, query, url in tasks])
+        parsed = {}
+        for (symbol, _, _), result in zip(tasks, results):
+            if result:
+                parsed[symbol] = result
+        cache = self.scrapper.cache
+        for symbol, bulk in res.items():
+            if bulk is None:
+                bulk = {'data': parsed.get(symbol, [])}
+                if cache is not None and bulk['data']:
+                    cache.put(cache.symbol_key(self.scrapper.page_key(
+                        symbol)), json.dumps(bulk))
+            elif cache is None:
+                continue
+            res[symbol] = self.scrapper.save_fundamental_analysis(
+                file_name.format(symbol=symbol), bulk['data'])
+        return res
+
+    def refresh(self, symbols_file, symbols, file_name):
+        """Symbols list and fundamentals in one event loop"""
+        async def refresh():
+            await self.get_symbols(symbols_file)
+            return await self.get_fundamental_analysis(symbols, file_name)
+        return asyncio.run(refresh())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the streaming top K ranking."""
+
+import heapq
+import itertools
+
+import rules
+from analysis import CRITERIA, calculate_chunk
+
+RATIOS = ['l_a', 'ros', 'roe', 'roa']
+
+
+def symbol_results(companies, statsmodels=False):
+    """(symbol, {title: result}) for every (symbol, values) pair,
+    one symbol in memory at a time"""
+    for symbol, values in companies:
+        if not isinstance(values, dict) \
+                or not isinstance(values.get('data'), dict):
+            continue
+        calculations = calculate_chunk({symbol: values}, statsmodels)
+        yield symbol, {title: results[symbol]
+                       for title, results in calculations.items()
+                       if symbol in results}
+
+
+class TopK:
+    """Bounded ranking of a stream of per-symbol results.
+
+    The score of a symbol is the sum of its get_points values, not the
+    total_points of Analyze, which counts the criteria a symbol leads
+    and needs every symbol to tell. Trend points are given per symbol
+    instead of accumulated over the symbols, the best trend bonus goes
+    to the running maximum (minimum for debt) of every regression
+    criteria. Holders of the bonus are kept aside with their base
+    score, so memory is O(k + criteria).
+    """
+
+    def __init__(self, k, scoring=None):
+        self.k = k
+        self.rules = scoring or rules.default()
+        self.heap = []
+        self.order = itertools.count()
+        self.holders = {}
+        self.held = {}
+
+    def base_points(self, symbol, calculations):
+        """Points of one symbol without the best trend bonuses"""
+        total = 0
+        for title, trend in self.rules.trend.items():
+            result = calculations.get(f"{title}_regression")
+            if result is None:
+                continue
+            coef = trend['sign'] * result['regression_coef']
+            if coef > 0:
+                total += trend['step']
+                holder = self.holders.get(title)
+                if holder is None or coef > holder[0]:
+                    self.holders[title] = (coef, symbol, trend['best'])
+        for title in CRITERIA:
+            result = calculations.get(f"{title}_limitations")
+            if result is None:
+                continue
+            total += result[title]['points']
+            if result['regression_coef'] > 0:
+                total += self.rules.rank_bonus.get(title, 0)
+        for title in RATIOS:
+            if title in calculations:
+                total += calculations[title]['points']
+        return total
+
+    def push(self, symbol, calculations):
+        """Add the per-symbol results of one symbol"""
+        item = (self.base_points(symbol, calculations), -next(self.order),
+                symbol)
+        holders = {holder[1] for holder in self.holders.values()}
+        self.held = {held: value for held, value in self.held.items()
+                     if held in holders}
+        if symbol in holders:
+            self.held[symbol] = item
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif self.k:
+            heapq.heappushpop(self.heap, item)
+
+    def extend(self, results):
+        """Push (symbol, calculations) pairs"""
+        for symbol, calculations in results:
+            self.push(symbol, calculations)
+        return self
+
+    def result(self):
+        """[(symbol, score)] of the top k, best first"""
+        bonus = {}
+        for _, symbol, best in self.holders.values():
+            bonus[symbol] = bonus.get(symbol, 0) + best
+        candidates = {symbol: (total, order)
+                      for total, order, symbol in self.heap}
+        for total, order, symbol in self.held.values():
+            candidates[symbol] = (total, order)
+        ranked = sorted(((total + bonus.get(symbol, 0), order, symbol)
+                         for symbol, (total, order) in candidates.items()),
+                        reverse=True)
+        return [(symbol, score) for score, _, symbol in ranked[:self.k]]
+
+
+def top(companies, k, scoring=None, statsmodels=False):
+    """Top k (symbol, score) of (symbol, values) pairs"""
+    return TopK(k, scoring).extend(
+        symbol_results(companies, statsmodels)).result()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the compact symbol and fundamentals records."""
+
+import numpy as np
+
+import normalize
+
+
+class SymbolRecord:
+    """One listing row of Scrapper.map_row"""
+
+    __slots__ = ('symbol', 'name', 'fundamental_analysis')
+
+    def __init__(self, symbol, name=None, fundamental_analysis=False):
+        self.symbol = symbol
+        self.name = name
+        self.fundamental_analysis = fundamental_analysis
+
+    @classmethod
+    def from_dict(cls, row):
+        """Record of a {"name", "symbol", "fundamental_analysis"} dict"""
+        return cls(row.get('symbol'), row.get('name'),
+                   bool(row.get('fundamental_analysis', False)))
+
+    def to_dict(self):
+        """Row dict in the map_row key order"""
+        row = {'fundamental_analysis': self.fundamental_analysis}
+        if self.name is not None:
+            row['name'] = self.name
+        if self.symbol is not None:
+            row['symbol'] = self.symbol
+        return row
+
+    def __eq__(self, other):
+        return isinstance(other, SymbolRecord) \
+            and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"SymbolRecord({self.symbol!r}, {self.name!r}, " \
+               f"{self.fundamental_analysis!r})"
+
+
+class SymbolTable:
+    """Symbol listing stored by column.
+
+    Symbols and names are two lists of strings, fundamental_analysis
+    flags one byte each, and a dict finds the rows of a symbol, so a
+    listing of 10k rows holds no per-row dicts.
+    """
+
+    __slots__ = ('symbols', 'names', 'flags', 'index')
+
+    def __init__(self, rows=()):
+        self.symbols = []
+        self.names = []
+        self.flags = bytearray()
+        self.index = {}
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_json(cls, bulk):
+        """Table of a {'data': [row, ...]} listing or a list of rows"""
+        if isinstance(bulk, dict):
+            bulk = bulk.get('data') or []
+        return cls(bulk)
+
+    def append(self, row):
+        """Add a row dict or SymbolRecord"""
+        if isinstance(row, dict):
+            row = SymbolRecord.from_dict(row)
+        position = len(self.symbols)
+        self.symbols.append(row.symbol)
+        self.names.append(row.name)
+        self.flags.append(1 if row.fundamental_analysis else 0)
+        stored = self.index.get(row.symbol)
+        if stored is None:
+            self.index[row.symbol] = position
+        else:
+            self.index[row.symbol] = (stored if isinstance(stored, tuple)
+                                      else (stored,)) + (position,)
+
+    def rows(self, symbol):
+        """Row positions of a symbol, listed more than once on some pages"""
+        stored = self.index.get(symbol)
+        if stored is None:
+            return ()
+        return stored if isinstance(stored, tuple) else (stored,)
+
+    def get(self, symbol):
+        """First record of a symbol, None when missing"""
+        rows = self.rows(symbol)
+        return self[rows[0]] if rows else None
+
+    def with_fundamentals(self):
+        """Symbols having a fundamental analysis page"""
+        return [symbol for symbol, flag in zip(self.symbols, self.flags)
+                if flag]
+
+    def to_json(self):
+        """{'data': [row, ...]} of the get_symbols files"""
+        return {'data': [record.to_dict() for record in self]}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getitem__(self, position):
+        return SymbolRecord(self.symbols[position], self.names[position],
+                            bool(self.flags[position]))
+
+    def __iter__(self):
+        for position in range(len(self.symbols)):
+            yield self[position]
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __eq__(self, other):
+        return isinstance(other, SymbolTable) \
+            and self.symbols == other.symbols \
+            and self.names == other.names and self.flags == other.flags
+
+
+class Fundamentals:
+    """Fundamentals of one company in one contiguous float block.
+
+    block is a metrics x years float64 array with NaN for gaps and for
+    the years after the end of a shorter series, lengths keeps the
+    length of every series. Analyze reads the rows as Series views and
+    the stores write them as floats without parsing cells again.
+    """
+
+    __slots__ = ('metrics', 'block', 'lengths', 'header')
+
+    def __init__(self, metrics, block, lengths, header=None):
+        self.metrics = tuple(metrics)
+        self.block = block
+        self.lengths = lengths
+        self.header = header
+
+    @classmethod
+    def from_json(cls, values):
+        """Record of a {'data': {metric: cells, 'header_row': labels}}"""
+        fields = values.get('data') if isinstance(values, dict) else None
+        if not isinstance(fields, dict):
+            fields = {}
+        series = {metric: normalize.series(cells)
+                  for metric, cells in fields.items()
+                  if metric != 'header_row'
+                  and isinstance(cells, (list, normalize.Series))}
+        years = max((len(values) for values in series.values()), default=0)
+        block = np.full((len(series), years), np.nan)
+        lengths = np.zeros(len(series), dtype=np.int32)
+        for row, values in enumerate(series.values()):
+            lengths[row] = len(values)
+            block[row, :len(values)] = np.where(values.mask, values.values,
+                                                np.nan)
+        header = fields.get('header_row')
+        return cls(series, block, lengths,
+                   list(header) if header is not None else None)
+
+    def series(self, metric):
+        """Series view of one metric row"""
+        row = self.metrics.index(metric)
+        values = self.block[row, :self.lengths[row]]
+        return normalize.Series(values, ~np.isnan(values))
+
+    def normalized(self):
+        """{'data': {metric: Series}} as normalize.normalize_company
+        returns it"""
+        fields = {}
+        if self.header is not None:
+            fields['header_row'] = self.header
+        for metric in self.metrics:
+            fields[metric] = self.series(metric)
+        return {'data': fields}
+
+    def to_json(self):
+        """{'data': {...}} with floats and None for gaps, the shape
+        FundamentalsStore.load returns"""
+        fields = {}
+        if self.header is not None:
+            fields['header_row'] = list(self.header)
+        for row, metric in enumerate(self.metrics):
+            values = self.block[row, :self.lengths[row]]
+            fields[metric] = [None if np.isnan(value) else float(value)
+                              for value in values]
+        return {'data': fields}
+
+    @property
+    def nbytes(self):
+        """Bytes of the float block"""
+        return self.block.nbytes + self.lengths.nbytes
+
+
+def from_companies(companies):
+    """{symbol: Fundamentals} of the companies with a data dict"""
+    return {symbol: Fundamentals.from_json(values)
+            for symbol, values in companies.items()
+            if isinstance(values, dict)
+            and isinstance(values.get('data'), dict)}
+
+
+def to_companies(records):
+    """{symbol: {'data': {...}}} of {symbol: Fundamentals}"""
+    return {symbol: record.to_json() for symbol, record in records.items()}
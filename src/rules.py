@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the table driven scoring rules."""
+
+import functools
+import json
+import os
+import re
+
+import numpy as np
+
+PROJECT_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir))
+RULES_FILE = os.path.join(PROJECT_DIR, 'resources', 'scoring.json')
+
+BOUND = r'\s*(-?inf|-?\d+(?:\.\d+)?)\s*'
+INTERVAL = re.compile(r'^\s*([\(\[])' + BOUND + ',' + BOUND + r'([\)\]])\s*$')
+
+
+def parse_interval(text):
+    """'(50, 60]' -> (50.0, 60.0, False, True)"""
+    match = INTERVAL.match(text)
+    if match is None:
+        raise ValueError(f"invalid band: {text!r}")
+    opening, lower, upper, closing = match.groups()
+    return float(lower), float(upper), opening == '[', closing == ']'
+
+
+def contains(interval, value):
+    """Value inside the interval"""
+    lower, upper, lower_closed, upper_closed = interval
+    above = value >= lower if lower_closed else value > lower
+    below = value <= upper if upper_closed else value < upper
+    return above and below
+
+
+def accumulate(points):
+    """Sum of a symbols x years matrix year after year, the order of the
+    Analyze loops, so totals are the same floats"""
+    total = np.zeros(points.shape[0])
+    for year in range(points.shape[1]):
+        total = total + points[:, year]
+    return total
+
+
+def in_parts(points, parts):
+    """Band points in parts of the years as Analyze adds them, a band of
+    1/3 is parts / 3 rather than parts * 0.333.."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return parts / (1 / points)
+
+
+class Ladder:
+    """Point bands compiled into a lookup table.
+
+    With the sorted band edges, searchsorted left + right gives an even
+    region for values between two edges and an odd one for values on an
+    edge, so open and closed bounds are both one table lookup.
+    """
+
+    def __init__(self, bands):
+        self.bands = [(parse_interval(text), float(points))
+                      for text, points in bands.items()]
+        self.edges = np.array(sorted({bound for interval, _ in self.bands
+                                      for bound in interval[:2]
+                                      if np.isfinite(bound)}))
+        self.table = np.array([
+            sum(points for interval, points in self.bands
+                if contains(interval, value))
+            for value in self.representatives()])
+
+    def representatives(self):
+        """One value of every region"""
+        edges = self.edges.tolist()
+        if not edges:
+            return [0.0]
+        values = [edges[0] - 1]
+        for lower, upper in zip(edges, edges[1:] + [None]):
+            values.append(lower)
+            values.append(lower + 1 if upper is None else (lower + upper) / 2)
+        return values
+
+    def __call__(self, values):
+        """Points of every value, 0 for NaN"""
+        values = np.asarray(values, dtype=float)
+        region = np.searchsorted(self.edges, values, 'left') \
+            + np.searchsorted(self.edges, values, 'right')
+        return np.where(np.isnan(values), 0.0, self.table[region])
+
+
+class Rules:
+    """Scoring model loaded from a JSON file.
+
+    limitations - yearly bands of p_e, p_s ... in parts of the years
+    and a bonus for a growing trend, l_a/returns - yearly and average
+    ratio bands, trend - points of the regression criteria, rank_bonus -
+    bonus added once more when the criteria are ranked.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.limitations = {metric: (Ladder(rule['bands']), rule['parts'],
+                                     rule.get('trend_bonus', 0))
+                            for metric, rule in config['limitations'].items()}
+        self.l_a = Ladder(config['l_a']['bands'])
+        self.l_a_parts = config['l_a']['parts']
+        self.returns = Ladder(config['returns']['bands'])
+        self.trend = config['trend']
+        self.rank_bonus = config.get('rank_bonus', {})
+
+    @classmethod
+    def load(cls, file_name=None):
+        """Rules from a JSON file, resources/scoring.json by default"""
+        with open(file_name or RULES_FILE) as file:
+            return cls(json.load(file))
+
+    def limitation_points(self, key, values, lengths):
+        """Points of the years of one criteria column, without the bonus"""
+        if key not in self.limitations:
+            return np.zeros(len(values))
+        ladder, parts, _ = self.limitations[key]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            part = 1 / (parts * lengths.astype(float))
+        return accumulate(in_parts(ladder(values), part[:, None]))
+
+    def trend_bonus(self, key):
+        """Bonus of a growing criteria"""
+        return self.limitations.get(key, (None, None, 0))[2]
+
+
+@functools.lru_cache(maxsize=None)
+def default():
+    """Rules of resources/scoring.json, loaded once"""
+    return Rules.load()
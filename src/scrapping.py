@@ -3,17 +3,33 @@
 
 """Module for data scrapping."""
 
-from os import path
+from os import path, remove, replace
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import json
 import re
-from requests import get
-from bs4 import BeautifulSoup
+
+import metrics
+import parsers
+from fetcher import Fetcher, default_fetcher
+from lazy import lazy_import
+
+records = lazy_import('records')
+
+FORUM_LINK = re.compile('forum')
+PORTFOLIO_ACTION = re.compile('portfolio_action')
+FUNDAMENTAL_ANALYSIS = re.compile('charticon2')
+TRADES = re.compile('trades')
+FINANCIALS = re.compile('financials')
+# yearly and quarterly fundamentals pages, /q/<symbol>/f/<period>/
+PERIODS = ('y', 'q')
 
 
 class Scrapper:
     """Scrapper module"""
 
-    def __init__(self, markets):
+    def __init__(self, markets, parser=None, cache=None, archive=None,
+                 period='y'):
         self.endpoints = {
             "https://smart-lab.ru/": [
                 'q/usa/',
@@ -21,7 +37,13 @@ class Scrapper:
             ]
         }
         self.markets = markets
-        self.list_symbols = []
+        self.list_symbols = None
+        self.parser = parsers.get_parser(parser)
+        self.cache = cache
+        self.archive = archive
+        if period not in PERIODS:
+            raise ValueError(f"unknown period {period!r}")
+        self.period = period
 
     @staticmethod
     def json_validator(data):
@@ -35,27 +57,63 @@ class Scrapper:
 
     @staticmethod
     def get_request(query, url):
-        """Make request to page"""
-        moz = 'Mozilla/5.0 (Windows NT 6.1)'
-        apple = 'AppleWebKit/537.36 (KHTML, like Gecko)'
-        chrome = 'Chrome/41.0.2228.0'
-        safari = 'Safari/537.36'
-        application_html = 'application/xhtml+xml'
-        application_xml = 'application/xml;q=0.9'
-        image = 'application/xml;q=0.9'
-        headers = {
-            'Accept': f"text/html,{application_html},"
-                      f"{application_xml},{image}",
-            'Accept-Encoding': "gzip, deflate, br",
-            'User-Agent': f"{moz} {apple} {chrome} {safari}",
-            'Referer': f"{url}{query}",
-        }
+        """Make request to page, '' when it fails or is not 200"""
+        return default_fetcher().get(query, url)
+
+    def get_page(self, query, url, fetcher=None, revalidate=False):
+        """Make request to page through the cache, returns (body, changed)"""
+        def send(headers):
+            return (fetcher or default_fetcher()).request(query, url, headers)
+
+        return self.cache.fetch(f"{url}{query}", send, revalidate=revalidate)
+
+    def get_cached(self, key, pages, parse, fetcher=None, revalidate=False):
+        """Parsed result of (query, url) pages through the cache.
+        An expired result is parsed again only when a page changed,
+        revalidate checks the pages of a fresh result too."""
+        bulk = None if revalidate else self.cache.get(key)
+        if bulk is not None:
+            return json.loads(bulk)
+        bodies = [self.get_page(query, url, fetcher, revalidate)
+                  for query, url in pages]
+        stale = self.cache.get(key, stale=True)
+        if stale is not None and not any(changed for _, changed in bodies):
+            self.cache.touch(key)
+            return json.loads(stale)
+        res = parse([body for body, _ in bodies if body != ''])
+        if res['data']:
+            self.cache.put(key, json.dumps(res))
+        return res
+
+    def parse_symbols(self, bodies):
+        """Parse listing pages to the {'data': [...]} cache document"""
+        return records.SymbolTable(record for response_body in bodies
+                                   for record in self.parse_body(
+                                       response_body)).to_json()
 
-        res = get(f"{url}{query}", headers=headers)
-        data = ''
-        if res.status_code == 200:
-            data = res.text
-        return data
+    def parse_fundamental_analysis(self, bodies, symbol=None):
+        """Parse financials pages"""
+        res = []
+        for response_body in bodies:
+            res = self.parse_financial_page(symbol, response_body)
+        return {'data': res}
+
+    def parse_financial_page(self, symbol, html):
+        """Parse a financials page, through the archive when there is one,
+        so an unchanged page is not parsed again"""
+        if self.archive is None or symbol is None:
+            return self.parse_body_financial(html)
+        return self.archive.parse(self.page_key(symbol), html,
+                                  self.parse_body_financial,
+                                  self.parser_stamp())
+
+    def parser_stamp(self):
+        """Backend and result format of the parser, backend/FORMAT"""
+        return f"{getattr(self.parser, 'name', 'soup')}/{parsers.FORMAT}"
+
+    def page_key(self, symbol):
+        """Symbol of the yearly pages, symbol/q of the quarterly ones"""
+        return symbol if self.period == 'y' else f"{symbol}/{self.period}"
 
     @staticmethod
     def read_filename(name):
@@ -65,50 +123,80 @@ class Scrapper:
             with open(name) as file_stream:
                 for json_obj in file_stream:
                     res = json.loads(json_obj)
+        metrics.count('file_cache', result='miss' if res is None else 'hit')
+        return res
 
+    @staticmethod
+    def read_symbols(name):
+        """records.SymbolTable of a file with symbols, {'data': [...]}
+        documents and NDJSON symbol records alike"""
+        if not path.isfile(name):
+            metrics.count('file_cache', result='miss')
+            return None
+        metrics.count('file_cache', result='hit')
+        res = None
+        rows = records.SymbolTable()
+        with open(name) as file_stream:
+            for line in file_stream:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'data' in record:
+                    res = records.SymbolTable.from_json(record)
+                else:
+                    rows.append(record)
+        if rows:
+            res = rows
         return res
 
     @staticmethod
     def map_row(columns):
-        """Mapping table rows"""
-        res = {
-            "fundamental_analysis": False
-        }
+        """Mapping table rows to records.SymbolRecord"""
+        name = None
+        symbol = None
+        fundamental_analysis = False
 
         number = 1
         for column in columns:
             forum_link = \
-                column.find("a", href=re.compile('forum'))
+                column.find("a", href=FORUM_LINK)
             portfolio_action = \
-                column.find("span", class_=re.compile('portfolio_action'))
-            fundamental_analysis = \
-                column.find("a", class_=re.compile('charticon2'))
+                column.find("span", class_=PORTFOLIO_ACTION)
+            chart_link = \
+                column.find("a", class_=FUNDAMENTAL_ANALYSIS)
 
             if forum_link:
-                res["name"] = forum_link.text
+                name = forum_link.text
                 number = number + 1
 
             if portfolio_action:
-                res["symbol"] = portfolio_action.get('symbol')
+                symbol = portfolio_action.get('symbol')
                 number = number + 1
 
-            if fundamental_analysis:
-                res["fundamental_analysis"] = True
+            if chart_link:
+                fundamental_analysis = True
 
         if number > 2:
-            return res
+            return records.SymbolRecord(symbol, name, fundamental_analysis)
         return None
 
     @staticmethod
-    def map_row_financial(columns):
-        """Mapping table financial rows"""
+    def map_row_financial(columns, header=False):
+        """Mapping table financial rows, empty cells are None so that
+        every value keeps its column, the label cell leading a header row
+        is left out"""
         res = []
 
         number = 1
         for column in columns:
-            if column.text and column.get('class') is None:
-                res.append(column.text.strip())
+            if column.get('class') is not None:
+                continue
+            text = column.text.strip() if column.text else ''
+            if text:
+                res.append(text)
                 number = number + 1
+            elif res or not header:
+                res.append(None)
         if number > 2:
             return res
         return None
@@ -130,12 +218,21 @@ class Scrapper:
 
     def parse_body(self, html):
         """Parse page body"""
-        res = []
+        with metrics.timed('parse_seconds', page='listing'):
+            return self.parse_listing_body(html)
+
+    def parse_listing_body(self, html):
+        """Parse listing page body with the parser backend"""
+        if self.parser is not None:
+            return self.parser.parse_body(html)
+        # pylint: disable=import-outside-toplevel
+        from bs4 import BeautifulSoup
 
+        res = []
         soup = BeautifulSoup(html, features="html.parser")
         trades_table = soup.find_all(id='usa_shares')
         trades_table_class = soup \
-            .find_all("table", class_=re.compile('trades'))
+            .find_all("table", class_=TRADES)
 
         if trades_table:
             res = self.parse_table(trades_table)
@@ -164,7 +261,9 @@ class Scrapper:
                 columns = row.find_all('td')
                 if (field in criteria and columns and len(columns) > 1) \
                         or (class_name and 'header_row' in class_name):
-                    item = self.map_row_financial(columns)
+                    item = self.map_row_financial(
+                        columns, bool(class_name
+                                      and 'header_row' in class_name))
                     if item is not None:
                         if field:
                             res[field] = item
@@ -175,68 +274,173 @@ class Scrapper:
 
     def parse_body_financial(self, html):
         """Parse page financial body"""
-        res = []
+        with metrics.timed('parse_seconds', page='financial'):
+            return self.parse_financial_body(html)
+
+    def parse_financial_body(self, html):
+        """Parse financials page body with the parser backend"""
+        if self.parser is not None:
+            return self.parser.parse_body_financial(html)
+        # pylint: disable=import-outside-toplevel
+        from bs4 import BeautifulSoup
 
+        res = []
         soup = BeautifulSoup(html, features="html.parser")
         financial_table = soup \
-            .find_all("table", class_=re.compile('financials'))
+            .find_all("table", class_=FINANCIALS)
 
         if financial_table:
             res = self.parse_table_by_criteria(financial_table)
 
         return res
 
-    def get_symbols(self, file_name):
-        """Get stock symbols scrapping process"""
-        bulk = self.read_filename(file_name)
+    def get_symbols(self, file_name, revalidate=False):
+        """Get stock symbols scrapping process, revalidate checks the
+        cached pages even before they expire"""
+        if self.cache is not None:
+            pages = [(query, url) for url, values in self.endpoints.items()
+                     for query in values]
+            self.save_symbols(file_name, records.SymbolTable.from_json(
+                self.get_cached('symbols:list', pages, self.parse_symbols,
+                                revalidate=revalidate)))
+            return
+        bulk = self.read_symbols(file_name)
         if bulk is None:
-            data_to_save = {'data': []}
-            for url, values in self.endpoints.items():
-                for query in values:
-                    response_body = self.get_request(query, url)
-                    stock_list = []
-                    if response_body != '':
-                        stock_list = self.parse_body(response_body)
-                    data_to_save['data'] = data_to_save['data'] + stock_list
-            self.list_symbols = data_to_save
-            if self.json_validator(json.dumps(data_to_save)):
-                data_file = open(file_name, "w")
-                data_file.write(json.dumps(data_to_save))
-                data_file.close()
+            self.save_symbols(file_name,
+                              records.SymbolTable(self.iter_symbols()))
         else:
             self.list_symbols = bulk
 
-    def get_fundamental_analysis(self, symbol, file_name):
-        """Get fundamental finance analysis data"""
-        res = []
+    def iter_symbols(self):
+        """Yield symbol records page by page as they are parsed"""
+        for url, values in self.endpoints.items():
+            for query in values:
+                response_body = self.get_request(query, url)
+                if response_body != '':
+                    yield from self.parse_body(response_body)
+
+    def stream_symbols(self, file_name):
+        """Get stock symbols as a stream of records.
+
+        Records are written to file_name as NDJSON while they are yielded
+        and added to list_symbols, so fundamentals of the first symbols
+        can be fetched before the last listing page is downloaded.
+        """
+        bulk = self.read_symbols(file_name)
+        if bulk is not None:
+            self.list_symbols = bulk
+            yield from bulk
+            return
+        self.list_symbols = records.SymbolTable()
+        part_name = f"{file_name}.part"
+        try:
+            with open(part_name, "w") as data_file:
+                for record in self.iter_symbols():
+                    data_file.write(json.dumps(record.to_dict()))
+                    data_file.write("\n")
+                    self.list_symbols.append(record)
+                    yield record
+            if self.list_symbols:
+                replace(part_name, file_name)
+        finally:
+            if path.isfile(part_name):
+                remove(part_name)
+
+    def save_symbols(self, file_name, table):
+        """Save a records.SymbolTable of stock symbols, failed fetches
+        are not saved"""
+        self.list_symbols = table
+        if table:
+            with open(file_name, "w") as data_file:
+                data_file.write(json.dumps(table.to_json()))
+
+    def get_fundamental_query(self, symbol):
+        """Fundamental analysis page query for the symbol"""
+        query = ''
+        if self.list_symbols and symbol:
+            table = self.list_symbols
+            for row in table.rows(symbol):
+                if table.flags[row]:
+                    query_symbol = f"{symbol}"
+                    if symbol.find('.') != -1:
+                        symbols_list = symbol.split('.')
+                        query_symbol = symbols_list[1]
+                    query = query + f"/q/{query_symbol}/f/{self.period}/"
+        return query
+
+    def save_fundamental_analysis(self, file_name, res):
+        """Save fundamental finance analysis data,
+        failed fetches are not saved"""
+        data_to_save = {'data': res}
+        if res:
+            with open(file_name, "w") as data_file:
+                data_file.write(json.dumps(data_to_save))
+        return data_to_save
+
+    def get_fundamental_analysis(self, symbol, file_name, fetcher=None,
+                                 revalidate=False):
+        """Get fundamental finance analysis data, revalidate checks the
+        cached page even before it expires"""
+        if self.cache is not None:
+            query = self.get_fundamental_query(symbol)
+            bulk = {'data': []}
+            if query:
+                bulk = self.get_cached(
+                    self.cache.symbol_key(self.page_key(symbol)),
+                    [(query, url) for url in self.endpoints],
+                    partial(self.parse_fundamental_analysis, symbol=symbol),
+                    fetcher, revalidate)
+            return self.save_fundamental_analysis(file_name, bulk['data'])
         bulk = self.read_filename(file_name)
         if bulk is None:
-            data_to_save = {'data': []}
-            if self.list_symbols and symbol:
-                query = ''
+            res = []
+            query = self.get_fundamental_query(symbol)
+            if query:
                 print(f"symbol {symbol}")
-                for item in self.list_symbols['data']:
-                    if item['symbol'] and item['symbol'] == symbol \
-                            and item['fundamental_analysis']:
-                        # print(item)
-                        query_symbol = f"{item['symbol']}"
-                        if item['symbol'].find('.') != -1:
-                            symbols_list = item['symbol'].split('.')
-                            query_symbol = symbols_list[1]
-                        query = query + f"/q/{query_symbol}/f/y/"
+                for url in self.endpoints.items():
+                    response_body = self.get_request(query, url[0])
+                    if response_body != '':
+                        res = self.parse_financial_page(symbol,
+                                                        response_body)
+            bulk = self.save_fundamental_analysis(file_name, res)
+
+        return bulk
+
+    def get_fundamental_analysis_bulk(self, symbols, file_name,
+                                      concurrency=8, rate=None):
+        """Get fundamental finance analysis data for many symbols.
+        Pages are fetched concurrently over one pooled session,
+        file_name is a format string with {symbol}."""
+        if self.cache is not None:
+            with Fetcher(concurrency, rate) as fetcher, \
+                    ThreadPoolExecutor(fetcher.concurrency) as executor:
+                return dict(zip(symbols, executor.map(
+                    lambda symbol: self.get_fundamental_analysis(
+                        symbol, file_name.format(symbol=symbol), fetcher),
+                    symbols)))
+        res = {}
+        pages = []
+        for symbol in symbols:
+            bulk = self.read_filename(file_name.format(symbol=symbol))
+            if bulk is None:
+                query = self.get_fundamental_query(symbol)
                 if query:
-                    for url in self.endpoints.items():
-                        response_body = self.get_request(query, url[0])
-                        if response_body != '':
-                            res = \
-                                self.parse_body_financial(response_body)
-                            data_to_save['data'] = res
-                            # print(res)
-            if self.json_validator(json.dumps(data_to_save)):
-                data_file = open(file_name, "w")
-                data_file.write(json.dumps(data_to_save))
-                data_file.close()
-        else:
-            res = bulk
-
+                    for url in self.endpoints:
+                        pages.append((symbol, query, url))
+                res[symbol] = None
+            else:
+                res[symbol] = bulk
+
+        with Fetcher(concurrency, rate) as fetcher:
+            bodies = fetcher.get_many([page[1:] for page in pages])
+        parsed = {}
+        for (symbol, _, _), response_body in zip(pages, bodies):
+            if response_body != '':
+                parsed[symbol] = self.parse_financial_page(symbol,
+                                                           response_body)
+
+        for symbol, bulk in res.items():
+            if bulk is None:
+                res[symbol] = self.save_fundamental_analysis(
+                    file_name.format(symbol=symbol), parsed.get(symbol, []))
         return res
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Module for the indexed fundamentals store."""
+
+import glob
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+import normalize
+from batch import METRICS
+from records import Fundamentals
+from scrapping import Scrapper
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS headers (
+    symbol_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    label TEXT,
+    PRIMARY KEY (symbol_id, year)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fundamentals (
+    symbol_id INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (symbol_id, metric, year)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fundamentals_metric
+    ON fundamentals (metric, year);
+"""
+
+SUFFIX = '_financials.json'
+
+
+class FundamentalsStore:
+    """SQLite store of parsed fundamentals.
+
+    Values are kept as floats (NULL for empty cells) indexed by symbol,
+    metric and year position, so analysis reads only the metrics and
+    years it needs without parsing JSON.
+    """
+
+    def __init__(self, file_name):
+        self.connection = sqlite3.connect(file_name)
+        self.connection.executescript(SCHEMA)
+
+    def symbol_id(self, symbol):
+        """Id of the symbol, created when missing"""
+        self.connection.execute("INSERT OR IGNORE INTO symbols (symbol) "
+                                "VALUES (?)", (symbol,))
+        return self.connection.execute("SELECT id FROM symbols "
+                                       "WHERE symbol = ?", (symbol,)) \
+            .fetchone()[0]
+
+    @staticmethod
+    def fields(values):
+        """Fields dict of a get_fundamental_analysis result
+        or a records.Fundamentals"""
+        if isinstance(values, Fundamentals):
+            return values.to_json()['data']
+        if isinstance(values, dict) and isinstance(values.get('data'), dict):
+            return values['data']
+        return {}
+
+    def put(self, symbol, values):
+        """Store one symbol, replacing what was stored before"""
+        self.put_many({symbol: values})
+
+    def put_many(self, companies):
+        """Store {symbol: {'data': {...}}} in one transaction"""
+        with self.connection:
+            for symbol, values in companies.items():
+                fields = self.fields(values)
+                if not fields:
+                    continue
+                symbol_id = self.symbol_id(symbol)
+                self.connection.execute("DELETE FROM fundamentals "
+                                        "WHERE symbol_id = ?", (symbol_id,))
+                self.connection.execute("DELETE FROM headers "
+                                        "WHERE symbol_id = ?", (symbol_id,))
+                self.connection.executemany(
+                    "INSERT INTO headers VALUES (?, ?, ?)",
+                    [(symbol_id, year, label) for year, label
+                     in enumerate(fields.get('header_row', []))])
+                self.connection.executemany(
+                    "INSERT INTO fundamentals VALUES (?, ?, ?, ?)",
+                    [(symbol_id, metric, year, self.value(cell))
+                     for metric, series in fields.items() if metric in METRICS
+                     for year, cell in enumerate(series)])
+
+    @staticmethod
+    def value(cell):
+        """Parsed cell, None for gaps"""
+        value = normalize.parse_cell(cell)
+        return None if np.isnan(value) else value
+
+    def symbols(self):
+        """Stored symbols"""
+        return [row[0] for row in self.connection.execute(
+            "SELECT symbol FROM symbols ORDER BY id")]
+
+    def select(self, symbols=None, metrics=None, years=None):
+        """Rows (symbol, metric, year, value) for the wanted slice,
+        years is a (start, stop) range of year positions"""
+        query = "SELECT s.symbol, f.metric, f.year, f.value " \
+                "FROM fundamentals f JOIN symbols s ON s.id = f.symbol_id " \
+                "WHERE 1 = 1"
+        order = " ORDER BY f.symbol_id, f.metric, f.year"
+        params = []
+        if metrics is not None:
+            query += f" AND f.metric IN ({','.join('?' * len(metrics))})"
+            params += list(metrics)
+        if years is not None:
+            query += " AND f.year >= ? AND f.year < ?"
+            params += list(years)
+        if symbols is None:
+            return self.connection.execute(query + order, params).fetchall()
+        rows = []
+        symbols = list(symbols)
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            rows += self.connection.execute(
+                query + f" AND s.symbol IN ({','.join('?' * len(chunk))})"
+                + order, params + chunk).fetchall()
+        position = {symbol: row for row, symbol in enumerate(symbols)}
+        rows.sort(key=lambda row: position[row[0]])
+        return rows
+
+    def load(self, symbols=None, metrics=None, years=None):
+        """Companies in the get_fundamental_analysis shape with floats"""
+        companies = {}
+        for symbol, metric, year, value in self.select(symbols, metrics,
+                                                       years):
+            series = companies.setdefault(symbol, {'data': {}})['data'] \
+                .setdefault(metric, [])
+            offset = year - (years[0] if years else 0)
+            series.extend([None] * (offset + 1 - len(series)))
+            series[offset] = value
+        if metrics is None:
+            for symbol, labels in self.headers(list(companies)).items():
+                companies[symbol]['data']['header_row'] = \
+                    labels[years[0]:years[1]] if years else labels
+        return companies
+
+    def headers(self, symbols):
+        """header_row labels of the symbols"""
+        res = {}
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            for symbol, label in self.connection.execute(
+                    "SELECT s.symbol, h.label FROM headers h "
+                    "JOIN symbols s ON s.id = h.symbol_id "
+                    f"WHERE s.symbol IN ({','.join('?' * len(chunk))}) "
+                    "ORDER BY h.symbol_id, h.year", chunk):
+                res.setdefault(symbol, []).append(label)
+        return res
+
+    def load_matrix(self, symbols=None, years=None):
+        """Symbol x year x metric matrix for BatchAnalyze.
+
+        Returns (index, values, lengths) like BatchAnalyze.pack.
+        """
+        rows = self.select(symbols, METRICS, years)
+        index = list(dict.fromkeys(symbol for symbol, _, _, _ in rows))
+        position = {symbol: row for row, symbol in enumerate(index)}
+        start = years[0] if years else 0
+        width = max((year - start + 1 for _, _, year, _ in rows), default=0)
+        values = np.full((len(index), width, len(METRICS)), np.nan)
+        lengths = np.zeros((len(index), len(METRICS)), dtype=int)
+        for symbol, metric, year, value in rows:
+            row, column = position[symbol], METRICS.index(metric)
+            if value is not None:
+                values[row, year - start, column] = value
+            lengths[row, column] = max(lengths[row, column], year - start + 1)
+        return index, values, lengths
+
+    def migrate_json(self, directory):
+        """Import every data/<symbol>_financials.json file"""
+        companies = {}
+        for file_name in sorted(glob.glob(os.path.join(directory,
+                                                       f"*{SUFFIX}"))):
+            symbol = os.path.basename(file_name)[:-len(SUFFIX)]
+            bulk = Scrapper.read_filename(file_name)
+            if self.fields(bulk):
+                companies[symbol] = bulk
+        self.put_many(companies)
+        return list(companies)
+
+    def close(self):
+        """Close the store"""
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: storage.py DATA_DIR STORE_FILE")
+        sys.exit(1)
+    STORE = FundamentalsStore(sys.argv[2])
+    print(f"migrated {len(STORE.migrate_json(sys.argv[1]))} symbols")
+    STORE.close()
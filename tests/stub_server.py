@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Local HTTP stand-in for smart-lab serving the fixture pages."""
+
+import collections
+import hashlib
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fixtures')
+
+
+def read_fixture(name):
+    """Fixture page body"""
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as page:
+        return page.read()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve listing and financials pages"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def route(self):
+        """Fixture page for the path, None for 404"""
+        if re.search(r'/q/[^/]+/f/y/$', self.path):
+            return self.server.pages['financials']
+        if re.search(r'/q/[^/]+/f/q/$', self.path):
+            return self.server.pages['quarterly']
+        if self.path.endswith('/q/usa/'):
+            return self.server.pages['usa']
+        if self.path.endswith('/q/shares/'):
+            return self.server.pages['shares']
+        return None
+
+    def inject(self, fault):
+        """Answer with a fault, False when the page is served after it"""
+        if fault == 'reset':
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return True
+        if fault == 'hang':
+            time.sleep(self.server.hang)
+            return False
+        self.send_response(fault)
+        if fault in (429, 503):
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Handle GET"""
+        self.server.count(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        fault = self.server.next_fault()
+        if fault is not None and self.inject(fault):
+            return
+        body = self.route()
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        payload = body.encode('utf-8')
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Keep test output quiet"""
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stand-in server, use as a context manager.
+
+    faults (status codes, 'hang' or 'reset') are injected into the next
+    requests in order.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, handler=StubHandler, faults=(),
+                 hang=1.0):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.faults = collections.deque(faults)
+        self.hang = hang
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.pages = {'financials': read_fixture('financials.html'),
+                      'quarterly': read_fixture('quarterly.html'),
+                      'usa': read_fixture('usa.html'),
+                      'shares': read_fixture('shares.html')}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """Base url like https://smart-lab.ru/"""
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def next_fault(self):
+        """Next injected fault: a status code, 'hang' or 'reset'"""
+        with self.lock:
+            return self.faults.popleft() if self.faults else None
+
+    def count(self, request_path):
+        """Remember served path"""
+        with self.lock:
+            self.requests.append(request_path)
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections.add(client_address)
+        super().process_request(request, client_address)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Synthetic fundamentals in the smart-lab financials shape, shared by
+the tests and the benchmarks."""
+
+import random
+
+
+def company(rnd, years=6):
+    """Random company, cells formatted like the scrapped table"""
+    def series(start, growth, suffix=''):
+        values = []
+        value = start
+        for _ in range(years):
+            value = value * (1 + growth + rnd.uniform(-0.05, 0.05))
+            values.append(f"{value:,.1f}{suffix}".replace(',', ' '))
+        return values
+
+    return {'data': {
+        'header_row': [str(2014 + year) for year in range(years)],
+        'market_cap': series(rnd.uniform(100, 10000), 0.1),
+        'debt': series(rnd.uniform(10, 9000), rnd.uniform(-0.1, 0.1)),
+        'assets': series(rnd.uniform(100, 10000), 0.05),
+        'revenue': series(rnd.uniform(100, 10000), 0.05),
+        'net_income': series(rnd.uniform(1, 1000), rnd.uniform(-0.1, 0.1)),
+        'p_e': series(rnd.uniform(2, 20), rnd.uniform(-0.1, 0.1)),
+        'p_s': series(rnd.uniform(0.5, 3), rnd.uniform(-0.1, 0.1)),
+        'p_bv': series(rnd.uniform(0.5, 3), rnd.uniform(-0.1, 0.1)),
+        'roe': series(rnd.uniform(1, 90), 0, '%'),
+        'roa': series(rnd.uniform(1, 90), 0, '%'),
+        'ev_ebitda': series(rnd.uniform(2, 14), rnd.uniform(-0.1, 0.1)),
+        'debt_ebitda': series(rnd.uniform(1, 8), rnd.uniform(-0.1, 0.1)),
+    }}
+
+
+def companies(count, seed=7, years=6):
+    """{symbol: company} of count symbols"""
+    rnd = random.Random(seed)
+    return {f"S{number}": company(rnd, years) for number in range(count)}
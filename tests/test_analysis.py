@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the analyze module."""
+
+import unittest
+import os
+import sys
+import random
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import synthetic
+from analysis import Analyze
+
+
+class ParallelAnalyzeTestCase(unittest.TestCase):
+    """Process pool sharding."""
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.symbols = [f"S{number}" for number in range(25)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+
+    def test_chunks(self):
+        """Chunks cover every symbol once and keep the order"""
+        chunks = Analyze.chunks(self.data, 4)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual([symbol for chunk in chunks for symbol in chunk],
+                         self.symbols)
+        self.assertEqual(len(Analyze.chunks(self.data, 100)), 25)
+
+    def test_same_result(self):
+        """Workers give the same calculations and points"""
+        single = Analyze(self.data, self.symbols)
+        expected = single.calculate()
+        parallel = Analyze(self.data, self.symbols, workers=3)
+        self.assertEqual(parallel.calculate(), expected)
+        self.assertEqual(list(parallel.calculations['p_e_limitations']),
+                         self.symbols)
+        self.assertEqual(repr(parallel.calculations),
+                         repr(single.calculations))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,12 +6,19 @@
 import unittest
 import os
 import sys
+import json
+import random
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
 sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, TEST_DIR)
+import synthetic
 from src.app import Application
-from src.app import main
+from src.app import arguments, main
 
 
 class MyTestCase(unittest.TestCase):
@@ -88,5 +95,77 @@ class MyTestCase(unittest.TestCase):
         main(sys.argv[1:])
 
 
+class MainTestCase(unittest.TestCase):
+    """Analysis runs of main over saved fundamentals."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        data = os.path.join(self.directory.name, 'data')
+        work = os.path.join(self.directory.name, 'work')
+        os.mkdir(data)
+        os.mkdir(work)
+        with open(os.path.join(data, 'stocks.json'), 'w') as stocks:
+            stocks.write(json.dumps({'data': []}))
+        rnd = random.Random(16)
+        for symbol in ('A', 'B'):
+            file_name = os.path.join(data, f"{symbol}_financials.json")
+            with open(file_name, 'w') as financials:
+                financials.write(json.dumps(synthetic.company(rnd)))
+        self.cwd = os.getcwd()
+        os.chdir(work)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def run_main(self, *flags):
+        """Output of main with the flags"""
+        output = StringIO()
+        with redirect_stdout(output):
+            main(arguments().parse_args(['-m', 'MICEX', '-s', 'A,B']
+                                        + list(flags)))
+        return output.getvalue()
+
+    def test_analyze(self):
+        """Symbols without --batch are scored by Analyze"""
+        self.assertIn('total_points', self.run_main())
+
+    def test_engines(self):
+        """--batch and --cross-section score every symbol"""
+        for flag in ('--batch', '--cross-section'):
+            output = self.run_main(flag, '--top-points', '1')
+            self.assertIn("'total_points': {'A'", output)
+            self.assertIn('top_points', output)
+
+    def test_store(self):
+        """--store scores the stored floats without the JSON files"""
+        scores = self.run_main().splitlines()[-1]
+        for flags in ([], ['--batch']):
+            self.assertEqual(
+                self.run_main('--store', *flags).splitlines()[-1],
+                self.run_main(*flags).splitlines()[-1])
+        os.remove(os.path.join(self.directory.name, 'data',
+                               'A_financials.json'))
+        self.assertEqual(self.run_main('--store').splitlines()[-1], scores)
+
+    def test_postgres_dsn(self):
+        """--postgres without a DSN or POSTGRES_DSN stops before scraping"""
+        dsn = os.environ.pop('POSTGRES_DSN', None)
+        try:
+            with self.assertRaisesRegex(ValueError, 'POSTGRES_DSN'):
+                self.run_main('--postgres')
+        finally:
+            if dsn is not None:
+                os.environ['POSTGRES_DSN'] = dsn
+
+    def test_incremental(self):
+        """--incremental keeps the results in data/analysis.db"""
+        first = self.run_main('--incremental')
+        self.assertIn('total_points', first)
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.directory.name, 'data', 'analysis.db')))
+        self.assertEqual(self.run_main('--incremental'), first)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the raw page archive."""
+
+import unittest
+import os
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+from archive import PageArchive
+from scrapping import Scrapper
+from stub_server import StubServer
+
+DAY = 24 * 60 * 60
+
+
+class Clock:
+    """Manual clock"""
+
+    def __init__(self):
+        self.now = 1600000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class PageArchiveTestCase(unittest.TestCase):
+    """Dedup, compression and lookup by symbol and date."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = Clock()
+        self.archive = PageArchive(self.directory.name, clock=self.clock)
+
+    def tearDown(self):
+        self.archive.close()
+        self.directory.cleanup()
+
+    def test_dedup(self):
+        """Same body is written once, dates are kept per symbol"""
+        body = '<table>' + 'row ' * 5000 + '</table>'
+        first = self.archive.put('AAPL', body)
+        self.clock.now += DAY
+        self.assertEqual(self.archive.put('AAPL', body), first)
+        self.archive.put('MSFT', body)
+        size, count = self.archive.size()
+        self.assertEqual(count, 1)
+        self.assertLess(size, len(body) // 10)
+        self.assertEqual(self.archive.dates('AAPL'),
+                         ['2020-09-13', '2020-09-14'])
+        self.assertEqual(self.archive.get('MSFT'), body)
+
+    def test_get_by_date(self):
+        """Last page stored on or before a date"""
+        self.archive.put('AAPL', 'old')
+        self.clock.now += 2 * DAY
+        self.archive.put('AAPL', 'new')
+        self.assertEqual(self.archive.get('AAPL'), 'new')
+        self.assertEqual(self.archive.get('AAPL', '2020-09-14'), 'old')
+        self.assertIsNone(self.archive.get('AAPL', '2020-09-01'))
+        self.assertIsNone(self.archive.get('MISSING'))
+
+        reopened = PageArchive(self.directory.name, clock=self.clock)
+        self.assertEqual(reopened.get('AAPL', '2020-09-13'), 'old')
+        reopened.close()
+
+    def test_parse_unchanged(self):
+        """An archived body is not parsed again"""
+        calls = []
+
+        def parse(body):
+            calls.append(body)
+            return [{'field': body}]
+
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse),
+                         [{'field': 'a'}])
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse),
+                         [{'field': 'a'}])
+        self.assertEqual(calls, ['a'])
+        self.archive.parse('AAPL', 'b', parse)
+        self.assertEqual(calls, ['a', 'b'])
+
+    def test_parser_stamp(self):
+        """A body parsed by another backend or result format, or archived
+        before the stamp, is parsed again"""
+        calls = []
+
+        def parse(body):
+            calls.append(body)
+            return [len(calls)]
+
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse, 'lxml/2'),
+                         [1])
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse, 'lxml/2'),
+                         [1])
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse, 'lxml/3'),
+                         [2])
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse, 'stream/3'),
+                         [3])
+        self.archive.connection.executescript(
+            "ALTER TABLE bodies DROP COLUMN parser;")
+        self.archive.close()
+        self.archive = PageArchive(self.directory.name, clock=self.clock)
+        self.assertEqual(self.archive.parse('AAPL', 'a', parse, 'stream/3'),
+                         [4])
+
+
+class ScrapperArchiveTestCase(unittest.TestCase):
+    """Scrapper refresh through the archive."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = StubServer().__enter__()
+        self.archive = PageArchive(self.path('pages'))
+        self.scrapper = Scrapper([], archive=self.archive)
+        self.scrapper.endpoints = {self.server.url: ['q/usa/', 'q/shares/']}
+        self.scrapper.get_symbols(self.path('stocks.json'))
+        self.parsed = 0
+        parse = self.scrapper.parse_body_financial
+
+        def counting_parse(html):
+            self.parsed += 1
+            return parse(html)
+
+        self.scrapper.parse_body_financial = counting_parse
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.archive.close()
+        self.directory.cleanup()
+
+    def path(self, name):
+        """File in the temporary data directory"""
+        return os.path.join(self.directory.name, name)
+
+    def test_refresh_unchanged(self):
+        """A page seen before is not parsed again"""
+        first = self.scrapper.get_fundamental_analysis('NYSE:DDD',
+                                                       self.path('DDD.json'))
+        self.assertTrue(first['data'])
+        os.remove(self.path('DDD.json'))
+        bulk = self.scrapper.get_fundamental_analysis_bulk(
+            ['NYSE:DDD', 'NYSE:FDX'], self.path('{symbol}.json'))
+        self.assertEqual(bulk['NYSE:DDD'], first)
+        self.assertEqual(bulk['NYSE:FDX'], first)
+        self.assertEqual(self.parsed, 1)
+
+        self.server.pages['financials'] = self.server.pages['financials'] \
+            .replace('field="p_e"', 'field="p_e_old"')
+        changed = self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', self.path('changed.json'))
+        self.assertNotIn('p_e', changed['data'])
+        self.assertEqual(self.parsed, 2)
+        self.assertEqual(self.archive.size()[1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the historical backtest."""
+
+import unittest
+import os
+import sys
+import random
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import backtest
+import synthetic
+from analysis import Analyze
+from incremental import ResultStore
+from normalize import parse_cell
+from periods import PeriodStore
+
+
+class PricesTestCase(unittest.TestCase):
+    """Price file and forward returns."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, 'prices.csv')
+        with open(self.file_name, 'w') as prices_file:
+            prices_file.write("date,symbol,close\n"
+                              "2017-03-31,A,10\n"
+                              "2016-03-30,A,8\n"
+                              "2018-03-29,A,15\n"
+                              "2018-03-29,B,x\n"
+                              "2015-01-02,B,4\n")
+        self.prices = backtest.load_prices(self.file_name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_price_on(self):
+        """Last recent close on or before the date"""
+        self.assertEqual(self.prices['A'][0],
+                         ['2016-03-30', '2017-03-31', '2018-03-29'])
+        self.assertEqual(backtest.price_on(self.prices, 'A', '2017-04-01'),
+                         10.0)
+        self.assertIsNone(backtest.price_on(self.prices, 'A', '2016-01-01'))
+        self.assertIsNone(backtest.price_on(self.prices, 'B', '2016-04-01'))
+        self.assertIsNone(backtest.price_on(self.prices, 'C', '2016-04-01'))
+        self.assertEqual(backtest.forward_return(self.prices, 'A',
+                                                 '2017-04-01', '2018-04-01'),
+                         0.5)
+
+    def test_rank_correlation(self):
+        """Spearman correlation on mid ranks"""
+        self.assertAlmostEqual(backtest.rank_correlation([1, 2, 3],
+                                                         [10, 40, 90]), 1.0)
+        self.assertAlmostEqual(backtest.rank_correlation([3, 2, 1],
+                                                         [10, 40, 90]), -1.0)
+        self.assertIsNone(backtest.rank_correlation([1, 1], [2, 3]))
+
+
+class BacktestTestCase(unittest.TestCase):
+    """Point in time replay of the scoring model."""
+
+    def setUp(self):
+        rnd = random.Random(21)
+        self.symbols = [f"S{number}" for number in range(12)]
+        self.companies = {symbol: synthetic.company(rnd, years=7)
+                          for symbol in self.symbols}
+        self.store = PeriodStore(':memory:')
+        self.store.put_many(self.companies)
+        self.prices = {}
+        for symbol in self.symbols:
+            closes = [rnd.uniform(10, 100) for _ in range(8)]
+            self.prices[symbol] = ([f"{2016 + year}-03-31"
+                                    for year in range(8)], closes)
+        self.results = ResultStore(':memory:')
+
+    def tearDown(self):
+        self.results.close()
+        self.store.close()
+
+    def run_backtest(self, workers=1):
+        """Fiscal years 2016..2019"""
+        harness = backtest.Backtest(self.store, self.prices,
+                                    results=self.results, top=3,
+                                    workers=workers)
+        return harness, harness.run(2016, 2019)
+
+    def test_no_lookahead(self):
+        """A year sees only its periods, later pages change nothing"""
+        harness, report = self.run_backtest()
+        views = harness.views(2017)
+        self.assertEqual(views['S0']['data']['header_row'],
+                         ['2014', '2015', '2016', '2017'])
+        self.assertEqual(views['S0']['data']['revenue'],
+                         [parse_cell(cell) for cell in
+                          self.companies['S0']['data']['revenue'][:4]])
+        changed = dict(self.companies['S5']['data'])
+        changed['revenue'] = changed['revenue'][:-1] + ['99999.0']
+        self.store.put('S5', {'data': changed})
+        harness, again = self.run_backtest()
+        self.assertEqual(harness.dirty, [])
+        self.assertEqual(again['years'][:3], report['years'][:3])
+        self.assertEqual(len(backtest.Backtest(
+            self.store, self.prices, min_periods=7).views(2019)), 0)
+
+    def test_scores(self):
+        """Scores of a year are the Analyze ones of its universe"""
+        harness, report = self.run_backtest()
+        year = report['years'][1]
+        views = harness.views(2017)
+        scores = Analyze(views, list(views)).calculate()['total_points']
+        ranked = sorted(scores, key=lambda symbol: -scores[symbol])
+        self.assertEqual(year['picks'], ranked[:3])
+        self.assertEqual(year['scored'], 12)
+        self.assertEqual((year['start'], year['end']),
+                         ('2018-04-01', '2019-04-01'))
+        expected = [backtest.forward_return(self.prices, symbol,
+                                            year['start'], year['end'])
+                    for symbol in ranked[:3]]
+        self.assertAlmostEqual(year['top_return'],
+                               sum(expected) / len(expected))
+        self.assertAlmostEqual(year['excess'],
+                               year['top_return'] - year['universe_return'])
+        summary = report['summary']
+        self.assertEqual(summary['years'], 4)
+        self.assertGreaterEqual(summary['hit_rate'], 0)
+
+    def test_reuse(self):
+        """Stored results are reused, a process pool gives the same"""
+        first, report = self.run_backtest()
+        self.assertEqual(len(first.dirty), 4 * 12)
+        harness, again = self.run_backtest(workers=2)
+        self.assertEqual(harness.dirty, [])
+        self.assertEqual(again, report)
+        self.results = ResultStore(':memory:')
+        _, parallel = self.run_backtest(workers=2)
+        self.assertEqual(parallel, report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the batch analyze module."""
+
+import unittest
+import os
+import sys
+import random
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import synthetic
+from analysis import Analyze
+from batch import BatchAnalyze
+
+
+class BatchAnalyzeTestCase(unittest.TestCase):
+    """Batch engine against the per-symbol path."""
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.symbols = [f"S{number}" for number in range(25)]
+        self.data = {symbol: synthetic.company(rnd)
+                     for symbol in self.symbols}
+
+    def test_same_points(self):
+        """Same points and total points as Analyze.calculate"""
+        expected = Analyze(self.data, self.symbols).calculate()
+        result = BatchAnalyze(self.data, self.symbols).calculate()
+        self.assertEqual(list(result['points']), list(expected['points']))
+        for title, scores in expected['points'].items():
+            self.assertEqual(list(result['points'][title]), list(scores))
+            for symbol, point in scores.items():
+                self.assertAlmostEqual(result['points'][title][symbol],
+                                       point, msg=f"{title} {symbol}")
+        self.assertEqual(result['total_points'], expected['total_points'])
+
+    def test_mixed_lengths(self):
+        """Points are summed year by year like Analyze, 0.999.. for 10
+        years and 1.0 for 5, so the best of a criteria is the same"""
+        rnd = random.Random(3)
+        data = {f"S{number}": synthetic.company(rnd, years=years)
+                for number, years in enumerate([10, 5, 7, 10, 3, 6])}
+        for values in data.values():
+            years = len(values['data']['header_row'])
+            values['data']['p_e'] = [str(30 - year / 2)
+                                     for year in range(years)]
+        data['S0']['data']['p_e'] = [str(7 - year / 2) for year in range(10)]
+        data['S1']['data']['p_e'] = [str(7 - year / 2) for year in range(5)]
+        symbols = list(data)
+        expected = Analyze(data, symbols).calculate()
+        self.assertLess(expected['points']['p_e']['S0'],
+                        expected['points']['p_e']['S1'])
+        result = BatchAnalyze(data, symbols).calculate()
+        for title, scores in expected['points'].items():
+            self.assertEqual(result['points'][title], scores, title)
+        self.assertEqual(result['total_points'], expected['total_points'])
+
+    def test_regression(self):
+        """Vectorized regression matches Analyze.regression"""
+        engine = BatchAnalyze(self.data, self.symbols)
+        engine.pack()
+        regression = engine.regression(engine.values, engine.lengths)
+        column = engine.column('revenue')
+        analyze = Analyze(self.data, self.symbols)
+        for row, symbol in enumerate(engine.index):
+            expected = analyze.regression(self.data[symbol]['data']['revenue'])
+            self.assertAlmostEqual(regression['rsquared'][row, column],
+                                   expected['rsquared'])
+            self.assertAlmostEqual(regression['regression_coef'][row, column],
+                                   expected['regression_coef'])
+
+    def test_regression_statsmodels(self):
+        """Batched OLS outputs match the per-symbol fits"""
+        analyze = Analyze(self.data, self.symbols)
+        analyze.calculate()
+        engine = BatchAnalyze(self.data, self.symbols)
+        engine.calculate()
+        result = engine.calculations['debt_regression_statsmodels']
+        for row, symbol in enumerate(engine.index):
+            expected = analyze.calculations['debt_regression_statsmodels'][symbol]
+            self.assertAlmostEqual(result['rsquared'][row], expected['rsquared'])
+            self.assertAlmostEqual(result['params'][row][1],
+                                   expected['params'][1])
+
+    def test_gaps(self):
+        """Ragged series and missing metrics are masked"""
+        self.data['S0']['data']['p_e'] = ['5', '', '9']
+        del self.data['S1']['data']['p_bv']
+        result = BatchAnalyze(self.data, self.symbols + ['MISSING']).calculate()
+        self.assertNotIn('S1', result['points']['p_bv'])
+        self.assertEqual(result['total_points']['MISSING'], 0)
+        expected = Analyze(self.data, self.symbols) \
+            .limitations('p_e', ['5', '', '9'])
+        self.assertAlmostEqual(
+            result['points']['p_e']['S0'],
+            expected['p_e']['points'] + 0.5 * (expected['regression_coef'] > 0))
+
+    def test_empty(self):
+        """No data"""
+        self.assertIsNone(BatchAnalyze({}, []).calculate())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the page cache."""
+
+import unittest
+import os
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+from cache import PageCache
+from scrapping import Scrapper
+from stub_server import StubServer
+
+
+class Clock:
+    """Manual clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    """Minimal requests response"""
+
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class PageCacheTestCase(unittest.TestCase):
+    """Expiry, negative entries and eviction."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = Clock()
+        self.cache = PageCache(os.path.join(self.directory.name, 'cache.db'),
+                               ttl=100, negative_ttl=10, max_bytes=25,
+                               clock=self.clock)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_ttl(self):
+        """Entries expire but stay available for revalidation"""
+        self.cache.put('page', 'body')
+        self.cache.put('short', 'body', ttl=5)
+        self.clock.now += 50
+        self.assertEqual(self.cache.get('page'), 'body')
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('short', stale=True), 'body')
+
+    def test_negative_expiry(self):
+        """Failed fetches are retried after negative_ttl"""
+        sent = []
+
+        def send(headers):
+            sent.append(headers)
+            return Response(503)
+
+        self.assertEqual(self.cache.fetch('page', send), ('', True))
+        self.assertEqual(self.cache.fetch('page', send), ('', False))
+        self.assertEqual(len(sent), 1)
+        self.clock.now += 11
+        self.cache.fetch('page', send)
+        self.assertEqual(len(sent), 2)
+
+    def test_revalidation(self):
+        """Stale pages are revalidated with ETag/Last-Modified"""
+        self.cache.fetch('page', lambda headers: Response(
+            200, 'body', {'ETag': '"1"', 'Last-Modified': 'yesterday'}))
+        self.clock.now += 101
+        sent = []
+
+        def send(headers):
+            sent.append(headers)
+            return Response(304)
+
+        self.assertEqual(self.cache.fetch('page', send), ('body', False))
+        self.assertEqual(sent, [{'If-None-Match': '"1"',
+                                 'If-Modified-Since': 'yesterday'}])
+        self.assertEqual(self.cache.get('page'), 'body')
+
+    def test_stale_on_error(self):
+        """An error answer serves the stale page and keeps it"""
+        self.cache.fetch('page', lambda headers: Response(
+            200, 'body', {'ETag': '"1"'}))
+        self.clock.now += 101
+        self.assertEqual(self.cache.fetch('page', lambda headers: Response(
+            503)), ('body', False))
+        self.assertEqual(self.cache.get('page', stale=True), 'body')
+        self.assertEqual(self.cache.fetch('page', lambda headers: Response(
+            304)), ('body', False))
+        self.assertEqual(self.cache.get('page'), 'body')
+
+    def test_revalidate_fresh(self):
+        """Fresh pages are revalidated on demand, negative ones wait"""
+        self.cache.fetch('page', lambda headers: Response(
+            200, 'body', {'ETag': '"1"'}))
+        sent = []
+
+        def send(headers):
+            sent.append(headers)
+            return Response(304)
+
+        self.assertEqual(self.cache.fetch('page', send), ('body', False))
+        self.assertEqual(sent, [])
+        self.assertEqual(self.cache.fetch('page', send, revalidate=True),
+                         ('body', False))
+        self.assertEqual(sent, [{'If-None-Match': '"1"'}])
+        self.cache.put_negative('missing')
+        self.assertEqual(self.cache.fetch('missing', send, revalidate=True),
+                         ('', False))
+        self.assertEqual(len(sent), 1)
+
+    def test_lru_eviction(self):
+        """Least recently used entries go first"""
+        self.cache.put('first', '1' * 10)
+        self.clock.now += 1
+        self.cache.put('second', '2' * 10)
+        self.clock.now += 1
+        self.cache.get('first')
+        self.clock.now += 1
+        self.cache.put('third', '3' * 10)
+        self.assertIsNone(self.cache.lookup('second'))
+        self.assertEqual(self.cache.get('first'), '1' * 10)
+        self.assertEqual(self.cache.size(), (20, 2))
+
+    def test_running_size(self):
+        """Replaced entries and reopened caches keep the byte count"""
+        self.cache.put('page', '1' * 10)
+        self.cache.put('page', '2' * 20)
+        self.cache.put_negative('missing')
+        self.assertEqual(self.cache.total, 20)
+        self.cache.close()
+        self.cache = PageCache(os.path.join(self.directory.name, 'cache.db'),
+                               max_bytes=25, clock=self.clock)
+        self.assertEqual(self.cache.total, 20)
+        self.clock.now += 1
+        self.cache.put('other', '3' * 10)
+        self.assertIsNone(self.cache.lookup('page'))
+        self.assertEqual(self.cache.size(), (self.cache.total, 2))
+
+
+class ScrapperCacheTestCase(unittest.TestCase):
+    """Scrapper refresh through the cache."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = StubServer().__enter__()
+        self.clock = Clock()
+        self.cache = PageCache(self.path('cache.db'), ttl=100,
+                               clock=self.clock)
+        self.scrapper = Scrapper([], cache=self.cache)
+        self.scrapper.endpoints = {self.server.url: ['q/usa/', 'q/shares/']}
+        self.scrapper.get_symbols(self.path('stocks.json'))
+        self.parsed = 0
+        parse = self.scrapper.parse_body_financial
+
+        def counting_parse(html):
+            self.parsed += 1
+            return parse(html)
+
+        self.scrapper.parse_body_financial = counting_parse
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.cache.close()
+        self.directory.cleanup()
+
+    def path(self, name):
+        """File in the temporary data directory"""
+        return os.path.join(self.directory.name, name)
+
+    def test_refresh_only_changed(self):
+        """Unchanged pages are revalidated and not parsed again"""
+        first = self.scrapper.get_fundamental_analysis('NYSE:DDD',
+                                                       self.path('DDD.json'))
+        self.assertTrue(first['data'])
+        requests = len(self.server.requests)
+        self.assertEqual(self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', self.path('DDD.json')), first)
+        self.assertEqual(len(self.server.requests), requests)
+
+        self.clock.now += 101
+        self.assertEqual(self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', self.path('DDD.json')), first)
+        self.assertEqual(len(self.server.requests), requests + 1)
+        self.assertEqual(self.parsed, 1)
+
+        self.clock.now += 101
+        self.server.pages['financials'] = self.server.pages['financials'] \
+            .replace('field="p_e"', 'field="p_e_old"')
+        changed = self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', self.path('DDD.json'))
+        self.assertNotIn('p_e', changed['data'])
+        self.assertEqual(self.parsed, 2)
+
+    def test_revalidate(self):
+        """A scheduled refresh checks fresh pages and parses changed
+        ones only"""
+        first = self.scrapper.get_fundamental_analysis('NYSE:DDD',
+                                                       self.path('DDD.json'))
+        requests = len(self.server.requests)
+        self.assertEqual(self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', self.path('DDD.json'), revalidate=True), first)
+        self.assertEqual(len(self.server.requests), requests + 1)
+        self.assertEqual(self.parsed, 1)
+        self.server.pages['financials'] = self.server.pages['financials'] \
+            .replace('field="p_e"', 'field="p_e_old"')
+        changed = self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', self.path('DDD.json'), revalidate=True)
+        self.assertNotIn('p_e', changed['data'])
+        self.assertEqual(self.parsed, 2)
+        self.scrapper.get_symbols(self.path('stocks.json'), revalidate=True)
+        self.assertEqual(len(self.server.requests), requests + 4)
+
+    def test_failed_fetch_not_saved(self):
+        """Failed fetches do not poison the file cache"""
+        self.server.pages['financials'] = None
+        result = self.scrapper.get_fundamental_analysis('NYSE:FDX',
+                                                        self.path('FDX.json'))
+        self.assertEqual(result, {'data': []})
+        self.assertFalse(os.path.exists(self.path('FDX.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the cross-sectional ranking."""
+
+import unittest
+import os
+import sys
+import random
+import time
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import crosssection
+import synthetic
+from batch import BatchAnalyze
+
+NAN = np.nan
+
+
+class RankTestCase(unittest.TestCase):
+    """Grouped percentile ranks and z-scores."""
+
+    def test_percentiles(self):
+        """Mid ranks for ties, per group and column, NaN kept"""
+        values = np.array([[1.0, 5.0],
+                           [2.0, NAN],
+                           [2.0, 3.0],
+                           [3.0, 4.0],
+                           [9.0, 1.0]])
+        codes = np.array([0, 0, 0, 0, 1])
+        np.testing.assert_array_equal(
+            crosssection.percentiles(values, codes),
+            [[0.0, 1.0], [0.5, NAN], [0.5, 0.0], [1.0, 0.5], [0.5, 0.5]])
+
+    def test_brute_force(self):
+        """Same ranks as counting the peers of every cell"""
+        rng = np.random.default_rng(3)
+        values = rng.integers(0, 6, (60, 4)).astype(float)
+        values[rng.random(values.shape) < 0.1] = NAN
+        codes = rng.integers(0, 4, 60)
+        ranks = crosssection.percentiles(values, codes)
+        for row in range(60):
+            for column in range(4):
+                value = values[row, column]
+                if np.isnan(value):
+                    self.assertTrue(np.isnan(ranks[row, column]))
+                    continue
+                peers = values[(codes == codes[row])
+                               & ~np.isnan(values[:, column]), column]
+                expected = 0.5
+                if len(peers) > 1:
+                    expected = (np.sum(peers < value)
+                                + (np.sum(peers == value) - 1) / 2) \
+                        / (len(peers) - 1)
+                self.assertAlmostEqual(ranks[row, column], expected)
+
+    def test_zscores(self):
+        """Standard scores inside the group, 0 without spread"""
+        values = np.array([[1.0], [3.0], [7.0], [7.0], [NAN]])
+        codes = np.array([0, 0, 1, 1, 1])
+        np.testing.assert_array_equal(crosssection.zscores(values, codes),
+                                      [[-1.0], [1.0], [0.0], [0.0], [NAN]])
+
+    def test_latest(self):
+        """Last present value inside the series"""
+        values = np.array([[[1.0], [NAN], [NAN]],
+                           [[1.0], [2.0], [7.0]],
+                           [[NAN], [NAN], [NAN]]])
+        lengths = np.array([[3], [2], [3]])
+        np.testing.assert_array_equal(crosssection.latest(values, lengths),
+                                      [[1.0], [2.0], [NAN]])
+
+    def test_market(self):
+        """Exchange prefix of the listing symbols"""
+        self.assertEqual(crosssection.market('NYSE:DDD'), 'NYSE')
+        self.assertEqual(crosssection.market('NYSE.BRK'), 'NYSE')
+        self.assertEqual(crosssection.market('SBER'), 'MOEX')
+
+
+class CrossSectionTestCase(unittest.TestCase):
+    """Scores of a universe."""
+
+    def setUp(self):
+        rnd = random.Random(4)
+        self.symbols = [f"S{number}" for number in range(30)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+
+    def test_calculate(self):
+        """Percentiles of every feature and their mean"""
+        result = crosssection.CrossSection(
+            self.data, self.symbols + ['MISSING']).calculate()
+        revenue = result['points']['revenue_trend']
+        best = max(self.symbols, key=lambda symbol: revenue[symbol])
+        self.assertEqual(revenue[best], 1.0)
+        debt = result['points']['debt_trend']
+        coef = BatchAnalyze.regression(*self.packed())['regression_coef']
+        lowest = self.symbols[int(np.argmin(coef[:, 1]))]
+        self.assertEqual(debt[lowest], 1.0)
+        p_e = result['points']['p_e']
+        cheapest = min(self.symbols, key=lambda symbol: float(
+            self.data[symbol]['data']['p_e'][-1]))
+        self.assertEqual(p_e[cheapest], 1.0)
+        self.assertEqual(len(result['points']), 12)
+        total = result['total_points']
+        self.assertEqual(total['MISSING'], 0.0)
+        self.assertAlmostEqual(total['S3'], np.mean(
+            [ranks['S3'] for ranks in result['points'].values()]))
+        self.assertAlmostEqual(np.mean(list(
+            result['zscores']['p_s'].values())), 0.0)
+
+    def packed(self):
+        """(values, lengths) of the universe"""
+        batch = BatchAnalyze(self.data, self.symbols)
+        batch.pack()
+        return batch.values, batch.lengths
+
+    def test_groups(self):
+        """Ranks inside every group"""
+        groups = {symbol: 'A' if number % 2 else 'B'
+                  for number, symbol in enumerate(self.symbols)}
+        result = crosssection.CrossSection(self.data, self.symbols,
+                                           groups=groups).calculate()
+        for name in 'AB':
+            members = [symbol for symbol in self.symbols
+                       if groups[symbol] == name]
+            ranks = sorted(result['points']['roe'][symbol]
+                           for symbol in members)
+            self.assertEqual((ranks[0], ranks[-1]), (0.0, 1.0))
+        self.assertEqual(result['groups']['S1'], 'A')
+        self.assertIsNone(crosssection.CrossSection({}, []).calculate())
+
+    def test_speed(self):
+        """10k symbols over every feature well under a second"""
+        rng = np.random.default_rng(5)
+        values = rng.normal(size=(10000, 12))
+        codes = rng.integers(0, 10, 10000)
+        started = time.perf_counter()
+        crosssection.percentiles(values, codes)
+        crosssection.zscores(values, codes)
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the daemon mode."""
+
+import unittest
+import http.client
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import daemon
+import logzero
+import synthetic
+from analysis import Analyze
+
+
+class Clock:
+    """Settable clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DaemonTestCase(unittest.TestCase):
+    """Scheduled refresh and the HTTP answers."""
+
+    def setUp(self):
+        rnd = random.Random(5)
+        self.symbols = [f"S{number}" for number in range(8)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+        self.fetched = []
+        self.revalidated = []
+        self.listed = []
+        self.clock = Clock()
+        self.app = daemon.Daemon(self.symbols, self.fetch, interval=100,
+                                 jitter=0.2, clock=self.clock, seed=1,
+                                 listing=self.listing, listing_interval=50)
+        with self.assertLogs(logzero.logger, 'ERROR') as logs:
+            self.app.warm()
+        self.assertIn('refresh of S7 failed', logs.output[0])
+
+    def tearDown(self):
+        self.app.stop()
+
+    def fetch(self, symbol, revalidate):
+        """Fake fundamentals fetch"""
+        self.fetched.append(symbol)
+        self.revalidated.append(revalidate)
+        if symbol == 'S7':
+            raise ConnectionError(symbol)
+        return self.data[symbol]
+
+    def listing(self):
+        """Fake symbol listing refresh"""
+        self.listed.append(self.clock.now)
+
+    def get(self, path):
+        """(status, JSON) of an answer"""
+        status, _, body = self.app.response(path)
+        return status, json.loads(body)
+
+    def test_warm_scores(self):
+        """Scores of the warm companies, failed fetch left out"""
+        expected = Analyze({symbol: self.data[symbol]
+                            for symbol in self.symbols[:7]},
+                           self.symbols[:7]).calculate()
+        status, body = self.get('/scores')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['scores'], expected['total_points'])
+        status, body = self.get('/scores/S3')
+        self.assertEqual(body['score'], expected['total_points']['S3'])
+        self.assertEqual(body['points']['p_e'],
+                         expected['points']['p_e']['S3'])
+        self.assertEqual(self.get('/scores/S7')[0], 404)
+        top = self.get('/top?k=3')[1]
+        self.assertEqual(len(top), 3)
+        self.assertEqual(top[0]['score'],
+                         max(expected['total_points'].values()))
+        self.assertEqual(self.get('/top?k=x')[0], 400)
+
+    def test_jittered_deadlines(self):
+        """Deadlines spread inside interval +- jitter"""
+        deadlines = sorted(deadline for deadline, _ in self.app.deadlines)
+        self.assertGreaterEqual(deadlines[0], 80)
+        self.assertLessEqual(deadlines[-1], 120)
+        self.assertGreater(len(set(deadlines)), 1)
+
+    def test_refresh_due(self):
+        """Only symbols past their deadline are fetched again, the
+        cached pages are revalidated"""
+        self.assertEqual(set(self.revalidated), {False})
+        self.fetched.clear()
+        self.revalidated.clear()
+        self.assertEqual(self.app.refresh_due(), [])
+        first = min(self.app.deadlines)
+        self.clock.now = first[0]
+        with self.assertLogs(logzero.logger, 'ERROR'):
+            due = self.app.refresh_due()
+            self.app.refresh_due()
+            self.clock.now = 1000
+            self.app.refresh_due()
+        self.assertIn(first[1], due)
+        self.assertEqual(self.fetched[:len(due)], due)
+        self.assertEqual(set(self.revalidated), {True})
+        self.assertEqual(len(self.app.deadlines), len(self.symbols))
+        self.assertGreater(min(self.app.deadlines)[0], first[0])
+
+    def test_listing(self):
+        """The symbol listing is refreshed on its own interval"""
+        self.assertEqual(self.listed, [])
+        self.assertEqual(self.app.next_deadline(), 50)
+        self.clock.now = 50
+        self.app.refresh_due()
+        self.clock.now = 60
+        self.app.refresh_due()
+        self.assertEqual(self.listed, [50])
+        self.assertEqual(self.app.next_deadline(),
+                         min(self.app.deadlines)[0] - 60)
+
+    def test_changed_company(self):
+        """Refreshed values are rescored"""
+        self.data['S2'] = synthetic.company(random.Random(99))
+        self.clock.now = 1000
+        with self.assertLogs(logzero.logger, 'ERROR'):
+            self.app.refresh_due()
+        expected = Analyze({symbol: self.data[symbol]
+                            for symbol in self.symbols[:7]},
+                           self.symbols[:7]).calculate()
+        self.assertEqual(self.get('/scores')[1]['scores'],
+                         expected['total_points'])
+
+    def test_http(self):
+        """Answers over TCP and a Unix socket"""
+        httpd = daemon.server(self.app, '127.0.0.1:0')
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            connection = http.client.HTTPConnection(*httpd.server_address)
+            connection.request('GET', '/scores/S1')
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(response.read())['symbol'], 'S1')
+            connection.request('GET', '/health')
+            self.assertEqual(json.loads(connection.getresponse().read())
+                             ['symbols'], 7)
+            connection.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'daemon.sock')
+            httpd = daemon.server(self.app, f"unix:{path}")
+            thread = threading.Thread(target=httpd.serve_forever,
+                                      daemon=True)
+            thread.start()
+            try:
+                with socket.socket(socket.AF_UNIX) as client:
+                    client.connect(path)
+                    client.sendall(b"GET /top?k=1 HTTP/1.0\r\n\r\n")
+                    answer = b''
+                    while True:
+                        chunk = client.recv(4096)
+                        if not chunk:
+                            break
+                        answer += chunk
+                head, _, body = answer.partition(b'\r\n\r\n')
+                self.assertIn(b'200', head.split(b'\r\n')[0])
+                self.assertEqual(len(json.loads(body)), 1)
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
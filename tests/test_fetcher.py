@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the resilient fetch layer."""
+
+import unittest
+import os
+import random
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import metrics
+from fetcher import (AdaptiveRateLimiter, Backoff, CircuitBreaker,
+                     CircuitOpenError, Fetcher)
+from stub_server import StubServer
+
+
+class Clock:
+    """Settable clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counter(name, **labels):
+    """Value of a metrics counter"""
+    return sum(item['value'] for item in metrics.REGISTRY.summary()['counters']
+               if item['name'] == name
+               and labels.items() <= item['labels'].items())
+
+
+class FetcherTestCase(unittest.TestCase):
+    """Retries, timeouts and the circuit against a faulty stub server."""
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.sleeps = []
+
+    def fetcher(self, **kwargs):
+        """Fetcher recording its backoff sleeps"""
+        kwargs.setdefault('backoff', Backoff(rnd=random.Random(1)))
+        return Fetcher(concurrency=1, sleep=self.sleeps.append, **kwargs)
+
+    def test_retry_throttled(self):
+        """429 and 503 are retried, the page is returned at last"""
+        with StubServer(faults=[429, 503]) as server, \
+                self.fetcher() as fetcher:
+            body = fetcher.get('q/usa/', server.url)
+        self.assertIn('usa_shares', body)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(counter('fetch_retries'), 2)
+
+    def test_retries_exhausted(self):
+        """Last failed answer is '' for get"""
+        with StubServer(faults=[500] * 3) as server, \
+                self.fetcher(retries=2) as fetcher:
+            self.assertEqual(fetcher.get('q/usa/', server.url), '')
+            self.assertEqual(fetcher.request('q/usa/', server.url)
+                             .status_code, 200)
+
+    def test_timeout_and_reset(self):
+        """Hung and reset connections are retried"""
+        with StubServer(faults=['hang', 'reset'], hang=1.0) as server, \
+                self.fetcher(timeout=0.2) as fetcher:
+            self.assertIn('usa_shares', fetcher.get('q/usa/', server.url))
+        self.assertEqual(counter('fetch_errors'), 2)
+
+    def test_circuit_breaker(self):
+        """Failing host fails fast until the probe succeeds"""
+        clock = Clock()
+        breaker = CircuitBreaker(threshold=2, reset=10, clock=clock)
+        with StubServer(faults=[503, 503]) as server, \
+                self.fetcher(retries=5, breaker=breaker) as fetcher:
+            with self.assertRaises(CircuitOpenError):
+                fetcher.request('q/usa/', server.url)
+            self.assertEqual(len(server.requests), 2)
+            self.assertEqual(fetcher.get('q/usa/', server.url), '')
+            self.assertEqual(len(server.requests), 2)
+            clock.now = 10
+            self.assertIn('usa_shares', fetcher.get('q/usa/', server.url))
+        host = server.url.split('/')[2]
+        self.assertEqual(breaker.state(host), 'closed')
+        self.assertEqual(counter('fetch_circuit', state='open'), 1)
+        self.assertEqual(counter('fetch_circuit', state='closed'), 1)
+        self.assertEqual(counter('fetch_circuit_rejected'), 2)
+
+
+class PartsTestCase(unittest.TestCase):
+    """Backoff, breaker and limiter on their own."""
+
+    def test_backoff(self):
+        """Full jitter under the exponential cap, Retry-After respected"""
+        backoff = Backoff(base=1, cap=8, rnd=random.Random(3))
+        for attempt in range(6):
+            self.assertLessEqual(backoff.delay(attempt),
+                                 min(8, 2 ** attempt))
+        self.assertGreaterEqual(backoff.delay(0, retry_after=5), 5)
+        self.assertEqual(backoff.delay(0, retry_after=60), 8)
+
+    def test_half_open(self):
+        """One probe in half open, its failure opens again"""
+        clock = Clock()
+        breaker = CircuitBreaker(threshold=1, reset=5, clock=clock)
+        breaker.failure('h')
+        self.assertFalse(breaker.allow('h'))
+        clock.now = 5
+        self.assertTrue(breaker.allow('h'))
+        self.assertFalse(breaker.allow('h'))
+        breaker.failure('h')
+        self.assertEqual(breaker.state('h'), 'open')
+        self.assertFalse(breaker.allow('h'))
+
+    def test_aimd(self):
+        """Multiplicative decrease on throttling, additive increase back"""
+        limiter = AdaptiveRateLimiter(rate=8, increase=1, decrease=0.5)
+        limiter.feedback('h', 200, 0.1)
+        self.assertEqual(limiter.rate('h'), 8)
+        limiter.feedback('h', 429, 0.1)
+        limiter.feedback('h', 503, 0.1)
+        self.assertEqual(limiter.rate('h'), 2)
+        self.assertEqual(limiter.rate('other'), 8)
+        limiter.feedback('h', 200, 0.1)
+        self.assertEqual(limiter.rate('h'), 3)
+        for _ in range(10):
+            limiter.feedback('h', 200, 0.1)
+        self.assertEqual(limiter.rate('h'), 8)
+
+        limiter = AdaptiveRateLimiter(slow=1.0, throttled=4)
+        self.assertIsNone(limiter.rate('h'))
+        limiter.feedback('h', 200, 2.5)
+        self.assertEqual(limiter.rate('h'), 2)
+        self.assertAlmostEqual(limiter.host_interval('h'), 0.5)
+        limiter.feedback('h', 200, 0.1)
+        limiter.feedback('h', 200, 0.1)
+        limiter.feedback('h', 200, 0.1)
+        limiter.feedback('h', 200, 0.1)
+        self.assertIsNone(limiter.rate('h'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the incremental re-analysis."""
+
+import unittest
+import os
+import sys
+import random
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import incremental
+import normalize
+import synthetic
+from analysis import Analyze
+
+
+class IncrementalAnalyzeTestCase(unittest.TestCase):
+    """Stored per-symbol results against a full Analyze."""
+
+    def setUp(self):
+        rnd = random.Random(11)
+        self.symbols = [f"S{number}" for number in range(20)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+        self.store = incremental.ResultStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+
+    def analyze(self, data, workers=1):
+        """Incremental run over the shared store"""
+        analyze = incremental.IncrementalAnalyze(data, self.symbols,
+                                                 self.store, workers=workers)
+        return analyze, analyze.calculate()
+
+    def test_first_run(self):
+        """Every symbol is calculated, result is the Analyze one"""
+        expected = Analyze(self.data, self.symbols)
+        analyze, result = self.analyze(self.data)
+        self.assertEqual(analyze.dirty, self.symbols)
+        self.assertEqual(result, expected.calculate())
+        self.assertEqual(repr(analyze.calculations),
+                         repr(expected.calculations))
+
+    def test_unchanged(self):
+        """Second run reuses every symbol"""
+        _, first = self.analyze(self.data)
+        analyze, result = self.analyze(self.data)
+        self.assertEqual(analyze.dirty, [])
+        self.assertEqual(result, first)
+
+    def test_changed_symbol(self):
+        """Only the changed symbol is calculated, ranking is redone"""
+        self.analyze(self.data)
+        changed = dict(self.data)
+        fields = dict(changed['S4']['data'])
+        fields['revenue'] = fields['revenue'][1:] + ['9999.0']
+        changed['S4'] = {'data': fields}
+        analyze, result = self.analyze(changed, workers=2)
+        self.assertEqual(analyze.dirty, ['S4'])
+        expected = Analyze(changed, self.symbols)
+        self.assertEqual(result, expected.calculate())
+        self.assertEqual(repr(analyze.calculations),
+                         repr(expected.calculations))
+
+    def test_content_hash(self):
+        """Hash of the values, not of the cell formatting"""
+        values = {'data': {'revenue': ['1 234,5', '', '7%']}}
+        same = {'data': {'revenue': [1234.5, None, 7.0]}}
+        other = {'data': {'revenue': [1234.5, 0.0, 7.0]}}
+
+        def content(company, statsmodels=False):
+            return incremental.content_hash(
+                normalize.normalize_company(company), statsmodels)
+
+        self.assertEqual(content(values), content(same))
+        self.assertNotEqual(content(values), content(other))
+        self.assertNotEqual(content(values), content(values, True))
+
+    def test_sums(self):
+        """Stored sufficient statistics give the regression back"""
+        self.analyze(self.data)
+        sums = self.store.sums('S2')
+        self.assertEqual(sums['revenue']['n'], 6)
+        expected = Analyze({}, []).regression(
+            self.data['S2']['data']['revenue'])
+        result = Analyze.regression_from_sums(sums['revenue'])
+        self.assertAlmostEqual(result['regression_coef'],
+                               expected['regression_coef'])
+        self.assertIsNone(self.store.sums('MISSING'))
+
+
+if __name__ == '__main__':
+    unittest.main()
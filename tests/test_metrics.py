@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for run metrics and profiling hooks."""
+
+import unittest
+import asyncio
+import json
+import os
+import sys
+import random
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import metrics
+import synthetic
+from analysis import Analyze
+from app import log
+from pipeline import Pipeline
+from scrapping import Scrapper
+from stub_server import StubServer
+
+
+def values(name, **labels):
+    """Counter values and timer counts of a metric"""
+    summary = metrics.REGISTRY.summary()
+    return [item.get('value', item.get('count'))
+            for item in summary['counters'] + summary['timers']
+            if item['name'] == name
+            and all(item['labels'].get(key) == value
+                    for key, value in labels.items())]
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Counters, timers and exports."""
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_prometheus(self):
+        """Text exposition with labels, counts and sums"""
+        self.registry.describe('requests', 'Requests')
+        self.registry.count('requests', host='a', status=200)
+        self.registry.count('requests', 2, host='a', status=200)
+        self.registry.observe('latency', 0.5, host='a"b')
+        self.registry.observe('latency', 1.5, host='a"b')
+        text = self.registry.to_prometheus()
+        self.assertIn('# HELP financials_requests_total Requests', text)
+        self.assertIn('# TYPE financials_requests_total counter', text)
+        self.assertIn('financials_requests_total{host="a",status="200"} 3',
+                      text)
+        self.assertIn('financials_latency_count{host="a\\"b"} 2', text)
+        self.assertIn('financials_latency_sum{host="a\\"b"} 2.000000', text)
+
+    def test_write(self):
+        """Files are UTF-8 whatever the locale"""
+        self.registry.count('requests', market='Мосбиржа')
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'run.prom')
+            self.registry.write(file_name)
+            with open(file_name, encoding='utf-8') as file:
+                self.assertIn('market="Мосбиржа"} 1', file.read())
+
+    def test_json(self):
+        """JSON summary keeps the max of timers"""
+        with self.registry.timed('stage', stage='x'):
+            pass
+        self.registry.observe('stage', 2, stage='x')
+        summary = json.loads(self.registry.to_json())
+        self.assertEqual(summary['timers'][0]['count'], 2)
+        self.assertEqual(summary['timers'][0]['max'], 2)
+
+    def test_merge(self):
+        """Snapshots of another registry add up, timers keep the max"""
+        self.registry.count('requests', host='a')
+        self.registry.observe('latency', 0.5)
+        worker = metrics.Registry()
+        worker.count('requests', 2, host='a')
+        worker.observe('latency', 1.5)
+        self.registry.merge(worker.snapshot())
+        summary = self.registry.summary()
+        self.assertEqual(summary['counters'][0]['value'], 3)
+        self.assertEqual((summary['timers'][0]['count'],
+                          summary['timers'][0]['seconds'],
+                          summary['timers'][0]['max']), (2, 2.0, 1.5))
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    """Scrapper, Analyze and app hooks."""
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_log_returns_value(self):
+        """log decorator keeps the return value and times the call"""
+        @log
+        def answer():
+            return 42
+        self.assertEqual(answer(), 42)
+        self.assertEqual(len(values('call_seconds')), 1)
+
+    def test_scrapper(self):
+        """Requests, bytes, file cache and parse time are recorded"""
+        file_name = os.path.join(self.directory.name, 'stocks.json')
+        with StubServer() as server:
+            scrapper = Scrapper([])
+            scrapper.endpoints = {server.url: ['q/usa/', 'q/shares/']}
+            scrapper.get_symbols(file_name)
+        self.assertEqual(sum(values('http_requests', status=200)), 2)
+        self.assertGreater(sum(values('http_response_bytes')), 0)
+        self.assertEqual(values('parse_seconds', page='listing'), [2])
+        self.assertEqual(values('file_cache', result='miss'), [1])
+        Scrapper.read_filename(file_name)
+        self.assertEqual(values('file_cache', result='hit'), [1])
+
+    def test_analyze(self):
+        """Metric families and OLS fits are recorded"""
+        rnd = random.Random(7)
+        data = {f"S{number}": synthetic.company(rnd) for number in range(5)}
+        Analyze(data, list(data)).calculate()
+        self.assertEqual(values('ols_fits', backend='numpy'), [25])
+        for family in ('regression', 'limitations', 'l_a', 'roe'):
+            self.assertEqual(values('analysis_seconds', family=family), [1])
+        self.assertEqual(values('analysis_stage_seconds', stage='points'),
+                         [1])
+
+    def test_workers(self):
+        """Metrics of the process pool workers reach the parent"""
+        rnd = random.Random(7)
+        data = {f"S{number}": synthetic.company(rnd) for number in range(8)}
+        metrics.count('file_cache', result='hit')
+        Analyze(data, list(data), workers=2).calculate()
+        self.assertEqual(values('ols_fits', backend='numpy'), [40])
+        self.assertEqual(values('analysis_seconds', family='regression'),
+                         [8])
+        self.assertEqual(values('file_cache', result='hit'), [1])
+        with StubServer() as server:
+            scrapper = Scrapper([])
+            scrapper.endpoints = {server.url: ['q/usa/', 'q/shares/']}
+            asyncio.run(Pipeline(scrapper, concurrency=2, parse_workers=2)
+                        .get_symbols(os.path.join(self.directory.name,
+                                                  'stocks.json')))
+        self.assertEqual(values('parse_seconds', page='listing'), [2])
+
+    def test_profiled(self):
+        """cProfile and sampling profiles are written"""
+        for profiler in ('cprofile', 'sampling'):
+            file_name = os.path.join(self.directory.name, profiler)
+            with metrics.profiled(file_name, profiler):
+                sum(number * number for number in range(300000))
+            self.assertTrue(os.path.getsize(file_name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the normalization stage."""
+
+import unittest
+import os
+import sys
+import math
+import random
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import normalize
+import synthetic
+from analysis import Analyze
+
+
+class NormalizeTestCase(unittest.TestCase):
+    """Cells to typed series."""
+
+    def test_parse_cell(self):
+        """smart-lab cell formats"""
+        self.assertEqual(normalize.parse_cell('1 234.5'), 1234.5)
+        self.assertEqual(normalize.parse_cell('1\xa0234,5'), 1234.5)
+        self.assertEqual(normalize.parse_cell('-12.5%'), -12.5)
+        self.assertEqual(normalize.parse_cell(3), 3.0)
+        for cell in ('', None, '-', 'n/a', True):
+            self.assertTrue(math.isnan(normalize.parse_cell(cell)), cell)
+
+    def test_series(self):
+        """Values with an explicit missing mask"""
+        series = normalize.series(['5', '', '9%', 'x'])
+        np.testing.assert_array_equal(series.mask,
+                                      [True, False, True, False])
+        self.assertEqual(series.filled().tolist(), [5.0, 0.0, 9.0, 0.0])
+        self.assertEqual(series.present().tolist(), [5.0, 9.0])
+        self.assertEqual(len(series), 4)
+        self.assertIs(normalize.series(series), series)
+
+    def test_normalize(self):
+        """Metric lists become series, other fields are kept"""
+        company = synthetic.company(random.Random(1))
+        normalized = normalize.normalize({'S': company, 'EMPTY': {'data': []}})
+        self.assertEqual(normalized['EMPTY'], {'data': []})
+        fields = normalized['S']['data']
+        self.assertEqual(fields['header_row'], company['data']['header_row'])
+        self.assertIsInstance(fields['roe'], normalize.Series)
+        self.assertEqual(normalize.normalize(normalized)['S']['data']['roe'],
+                         fields['roe'])
+
+    def test_parse_float(self):
+        """Invalid cells are 0.0 instead of raising"""
+        self.assertEqual(Analyze.parse_float('1 234,5'), 1234.5)
+        self.assertEqual(Analyze.parse_float('n/a'), 0.0)
+        self.assertEqual(Analyze.parse_float(''), 0.0)
+
+    def test_analysis_on_series(self):
+        """Analyze scores normalized and raw data alike"""
+        rnd = random.Random(7)
+        symbols = [f"S{number}" for number in range(10)]
+        data = {symbol: synthetic.company(rnd) for symbol in symbols}
+        data['S2']['data']['roe'][1] = ''
+        expected = Analyze(data, symbols).calculate()
+        self.assertEqual(Analyze(normalize.normalize(data), symbols)
+                         .calculate(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
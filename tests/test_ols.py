@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the batched least squares module."""
+
+import unittest
+import os
+import sys
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+import ols
+from analysis import Analyze
+
+
+class OlsTestCase(unittest.TestCase):
+    """Closed-form fits against statsmodels OLS."""
+
+    def assert_fit(self, result, expected):
+        """Compare one fit with the statsmodels result"""
+        np.testing.assert_allclose(result['rsquared'], expected['rsquared'])
+        np.testing.assert_allclose(result['rsquared_adj'],
+                                   expected['rsquared_adj'])
+        np.testing.assert_allclose(result['params'], expected['params'],
+                                   atol=1e-9)
+
+    def test_complete_series(self):
+        """Equal length series in one solve"""
+        rnd = np.random.default_rng(3)
+        y_axis = rnd.normal(100, 20, size=(50, 7)) + np.arange(7) * 5
+        result = ols.fit(y_axis)
+        for row in range(len(y_axis)):
+            self.assert_fit({key: value[row] for key, value in result.items()},
+                            ols.fit_statsmodels(y_axis[row]))
+
+    def test_masked_years(self):
+        """NaN years are left out of the fit"""
+        y_axis = np.array([[1.0, np.nan, 3.5, 4.0, 6.0],
+                           [2.0, 2.5, 3.0, np.nan, np.nan]])
+        result = ols.fit(y_axis)
+        for row, series in enumerate(y_axis):
+            years = np.flatnonzero(~np.isnan(series))
+            # statsmodels fit on the kept years only
+            # pylint: disable=import-outside-toplevel
+            import statsmodels.api as sm
+            expected = sm.OLS(series[years], sm.add_constant(years)).fit()
+            self.assertAlmostEqual(result['rsquared'][row], expected.rsquared)
+            self.assertAlmostEqual(result['rsquared_adj'][row],
+                                   expected.rsquared_adj)
+            np.testing.assert_allclose(result['params'][row], expected.params)
+
+    def test_analyze_statsmodels_outputs(self):
+        """Analyze keeps the statsmodels values"""
+        values = ['1 200,5', '1 300', '', '1 500,25', '1 450']
+        analyze = Analyze({}, [])
+        self.assert_fit(analyze.regression_stat_model(values),
+                        Analyze({}, [], statsmodels=True)
+                        .regression_stat_model(values))
+
+    def test_fit_many(self):
+        """Series are grouped by length"""
+        series = [[1, 2, 4], [1, 2, 3, 5], [3, 2, 2], []]
+        results = ols.fit_many(series)
+        self.assertIsNone(results[3])
+        for values, result in zip(series[:3], results):
+            self.assert_fit(result, ols.fit_statsmodels(values))
+
+
+class RegressionAccumulatorTestCase(unittest.TestCase):
+    """Updatable trend against refits of the whole series."""
+
+    def setUp(self):
+        rnd = np.random.default_rng(5)
+        self.y_axis = (1e6 + np.cumsum(rnd.normal(0, 3, 16))).tolist()
+
+    def assert_trend(self, result, y_axis):
+        """Slope, intercept and correlation of a numpy fit"""
+        b_coef, a_coef = np.polyfit(np.arange(len(y_axis)), y_axis, 1)
+        rsquared = np.corrcoef(np.arange(len(y_axis)), y_axis)[0, 1]
+        np.testing.assert_allclose(result['params']['b_coef'], b_coef,
+                                   rtol=1e-7)
+        np.testing.assert_allclose(result['params']['a_coef'], a_coef,
+                                   rtol=1e-12)
+        np.testing.assert_allclose(result['rsquared'], rsquared, rtol=1e-7)
+        np.testing.assert_allclose(result['regression_coef'], b_coef,
+                                   rtol=1e-7)
+        np.testing.assert_allclose(result['regression_adj'], a_coef,
+                                   rtol=1e-12)
+
+    def test_same_as_analyze(self):
+        """Result has the keys and values of Analyze.regression"""
+        y_axis = [10.0, 12.5, 11.0, 15.0, 18.0, 17.5]
+        result = ols.RegressionAccumulator.from_series(y_axis).result()
+        expected = Analyze({}, []).regression(y_axis)
+        self.assertEqual(result.keys(), expected.keys())
+        for key in ['rsquared', 'regression_coef', 'regression_adj']:
+            self.assertAlmostEqual(result[key], expected[key])
+        self.assertAlmostEqual(result['params']['b_coef'],
+                               expected['params']['b_coef'])
+        sums = Analyze.regression_sums(y_axis)
+        for key, value in ols.RegressionAccumulator.from_series(
+                y_axis).sums().items():
+            self.assertAlmostEqual(value, sums[key])
+        self.assertAlmostEqual(ols.RegressionAccumulator.from_sums(
+            sums).result()['regression_coef'], expected['regression_coef'])
+
+    def test_add(self):
+        """Appended years on a large level keep their precision"""
+        self.assert_trend(
+            ols.RegressionAccumulator.from_series(self.y_axis).result(),
+            self.y_axis)
+
+    def test_rolling(self):
+        """Dropping the oldest year is a refit of the window"""
+        results = ols.rolling_regressions(self.y_axis, 5)
+        self.assertEqual(len(results), len(self.y_axis) - 4)
+        for start, result in enumerate(results):
+            self.assert_trend(result, self.y_axis[start:start + 5])
+
+    def test_merge(self):
+        """Merged partial accumulators equal one of all years"""
+        first = ols.RegressionAccumulator.from_series(self.y_axis[:7])
+        second = ols.RegressionAccumulator.from_series(self.y_axis[7:],
+                                                       first=7)
+        self.assert_trend(first.merge(second).result(), self.y_axis)
+        part = ols.RegressionAccumulator.from_series(self.y_axis[:7])
+        self.assert_trend(ols.RegressionAccumulator().merge(part).result(),
+                          self.y_axis[:7])
+
+    def test_degenerate(self):
+        """Empty, single and flat series give NaN like Analyze"""
+        for y_axis in [[], [5.0], [1.0, 1.0, 1.0]]:
+            accumulator = ols.RegressionAccumulator.from_series(y_axis)
+            self.assertTrue(np.isnan(accumulator.result()['regression_coef']))
+        accumulator = ols.RegressionAccumulator.from_series([1.0, 2.0])
+        accumulator.remove(1.0).remove(2.0)
+        self.assertEqual((accumulator.count, accumulator.first), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
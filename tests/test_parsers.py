@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the html parsing backends."""
+
+import unittest
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import parsers
+import records
+from scrapping import Scrapper
+from stub_server import read_fixture
+
+LISTING = """<html><body>
+<table class="trades"><tr><td>1</td><td>x</td></tr></table>
+<div id="usa_shares"><table>
+<tr><td><a href="/forum/A">A &amp; Co<br>Inc</a></td>
+<td><span class="x portfolio_action" symbol="NYSE:A"/></td>
+<td><a class="charticon2"></a><a href="/forum/B">ignored</a></td></tr>
+<tr><td><a href="/forum/C">C</a></td><td><span class="portfolio_action"></span>
+<table><tr><td><a class="charticon2">nested</a></td></tr></table></td></tr>
+<tr><td>no</td><td>links</td></tr>
+</table></div>
+</body></html>"""
+
+FINANCIALS = """<html><body><table class="financials">
+<tr class="header_row"><td></td><td class="chartrow"></td><td><b>2019</b></td>
+<td>2020</td></tr>
+<tr field="p_e" class="odd"><th>P/E</th><td> 10,5 </td><td></td><td>12</td></tr>
+<tr field="other"><td>1</td><td>2</td></tr>
+<tr field="roe"><td>5%</td></tr>
+</table></body></html>"""
+
+
+class ParsersTestCase(unittest.TestCase):
+    """Every backend returns what the BeautifulSoup path returns."""
+
+    def backends(self):
+        """Scrappers for the soup reference and the fast backends"""
+        names = ['stream'] + (['lxml'] if parsers.LXML else [])
+        return Scrapper([], parser='soup'), \
+            [Scrapper([], parser=name) for name in names]
+
+    def assert_same(self, method, html):
+        """Compare backends on one page"""
+        reference, backends = self.backends()
+        expected = getattr(reference, method)(html)
+        for scrapper in backends:
+            self.assertEqual(getattr(scrapper, method)(html), expected,
+                             scrapper.parser.name)
+        return expected
+
+    def test_listing_fixtures(self):
+        """Saved listing pages"""
+        self.assertEqual(len(self.assert_same('parse_body',
+                                              read_fixture('usa.html'))), 12)
+        self.assertEqual(len(self.assert_same('parse_body',
+                                              read_fixture('shares.html'))), 8)
+
+    def test_financials_fixture(self):
+        """Saved financials page"""
+        result = self.assert_same('parse_body_financial',
+                                  read_fixture('financials.html'))
+        self.assertEqual(len(result['header_row']), 8)
+
+    def test_edge_cases(self):
+        """Nested tables, entities, class matching and missing tables"""
+        self.assertEqual(len(self.assert_same('parse_body', LISTING)), 2)
+        self.assertEqual(self.assert_same('parse_body_financial', FINANCIALS),
+                         {'header_row': ['10,5', None, '12'],
+                          'p_e': ['10,5', None, '12']})
+        self.assertEqual(self.assert_same('parse_body', ''), [])
+        self.assertEqual(self.assert_same('parse_body_financial',
+                                          '<p>nothing</p>'), [])
+
+    def test_chunked(self):
+        """Tables read across chunks of a long page"""
+        filler = '<div><p>filler</p><span>text</span></div>' \
+            * (parsers.CHUNK_SIZE // 20)
+        listing = LISTING.replace('<div id="usa_shares">',
+                                  filler + '<div id="usa_shares">')
+        self.assertEqual(len(self.assert_same('parse_body', listing)), 2)
+        trades = '<html><body>' + filler \
+            + '<table class="trades"><tr><td>1</td></tr>' + filler \
+            + '<tr><td><a href="/forum/T">T</a></td>' \
+              '<td><span class="portfolio_action" symbol="T"/></td></tr>' \
+              '</table>' + filler + '</body></html>'
+        self.assertEqual(self.assert_same('parse_body', trades),
+                         [records.SymbolRecord('T', 'T', False)])
+        financials = FINANCIALS.replace('<body>', '<body>' + filler)
+        self.assertEqual(self.assert_same('parse_body_financial',
+                                          financials + filler)['p_e'],
+                         ['10,5', None, '12'])
+
+    def test_default_backend(self):
+        """lxml when installed, streaming extractor otherwise"""
+        expected = 'lxml' if parsers.LXML else 'stream'
+        self.assertEqual(Scrapper([]).parser.name, expected)
+        self.assertIsNone(parsers.get_parser('soup'))
+        with self.assertRaises(ValueError):
+            parsers.get_parser('html5')
+
+
+if __name__ == '__main__':
+    unittest.main()
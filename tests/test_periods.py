@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the period-indexed store and the quarterly pages."""
+
+import unittest
+import os
+import sys
+import random
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import periods
+import records
+import synthetic
+from analysis import Analyze
+from normalize import parse_cell
+from scrapping import Scrapper
+from stub_server import StubServer
+
+
+class PeriodOrdinalTestCase(unittest.TestCase):
+    """Header labels as sortable periods."""
+
+    def test_labels(self):
+        """Years, quarters and LTM"""
+        self.assertEqual(periods.period_ordinal('2019'), 2019 * 4 + 3)
+        self.assertEqual(periods.period_ordinal('2019', first=True),
+                         2019 * 4)
+        self.assertEqual(periods.period_ordinal(' 2019Q2 '), 2019 * 4 + 1)
+        self.assertEqual(periods.period_ordinal('2 кв 2019'), 2019 * 4 + 1)
+        self.assertEqual(periods.period_ordinal('LTM'), periods.LTM)
+        self.assertIsNone(periods.period_ordinal(''))
+        self.assertIsNone(periods.period_ordinal('2019Q5'))
+
+    def test_align(self):
+        """Short rows end on the last periods, gaps are left out"""
+        fields = {'header_row': ['2017', '2018', '', '2019'],
+                  'revenue': ['1', '', '3', '4'],
+                  'debt': ['5', '6']}
+        labels, observations = periods.align(fields)
+        self.assertEqual([label for _, label in labels],
+                         ['2017', '2018', '2019'])
+        self.assertEqual(sorted((metric, value)
+                                for _, metric, value in observations),
+                         [('debt', 6.0), ('revenue', 1.0), ('revenue', 4.0)])
+
+    def test_gap(self):
+        """An empty cell between values keeps the next ones on their
+        columns with every parser backend"""
+        html = """<table class="financials">
+<tr class="header_row"><td></td><td class="chartrow"></td><td>2016</td>
+<td>2017</td><td>2018</td><td>2019</td></tr>
+<tr field="revenue"><th>Revenue</th><td class="chartrow"></td><td>10</td>
+<td></td><td>30</td><td></td></tr>
+<tr field="debt"><th>Debt</th><td class="chartrow"></td><td></td>
+<td>5</td><td> </td><td>7</td></tr>
+</table>"""
+        for parser in ('soup', 'stream', 'lxml'):
+            fields = Scrapper([], parser=parser).parse_body_financial(html)
+            self.assertEqual(fields['revenue'], ['10', None, '30', None])
+            labels, observations = periods.align(fields)
+            self.assertEqual([label for _, label in labels],
+                             ['2016', '2017', '2018', '2019'], parser)
+            self.assertEqual(sorted((label, metric, value) for period,
+                                    metric, value in observations
+                                    for ordinal, label in labels
+                                    if ordinal == period), [
+                ('2016', 'revenue', 10.0), ('2017', 'debt', 5.0),
+                ('2018', 'revenue', 30.0), ('2019', 'debt', 7.0)], parser)
+
+    def test_leading_blanks(self):
+        """Blank cells before the first value are kept, so every row is as
+        long as header_row and its values stay on their periods"""
+        with open(os.path.join(TEST_DIR, 'fixtures', 'quarterly.html'),
+                  encoding='utf-8') as file:
+            html = file.read()
+        for parser in ('soup', 'stream', 'lxml'):
+            fields = Scrapper([], parser=parser).parse_body_financial(html)
+            for metric, values in fields.items():
+                self.assertEqual(len(values), len(fields['header_row']),
+                                 f"{parser} {metric}")
+            self.assertEqual(fields['net_income'][:3], [None, None, '4,20'],
+                             parser)
+            labels = dict(zip(fields['header_row'], fields['net_income']))
+            self.assertIsNone(labels['2019Q2'], parser)
+            self.assertEqual(labels['2019Q4'], '4,20', parser)
+
+
+class PeriodStoreTestCase(unittest.TestCase):
+    """Storage by fiscal period and range queries."""
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.symbols = [f"S{number}" for number in range(6)]
+        self.companies = {symbol: synthetic.company(rnd)
+                          for symbol in self.symbols}
+        self.store = periods.PeriodStore(':memory:')
+        self.store.put_many(self.companies)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_analyze(self):
+        """Analyze of the stored periods is the one of the pages"""
+        loaded = self.store.load(self.symbols)
+        self.assertEqual(loaded['S1']['data']['header_row'],
+                         self.companies['S1']['data']['header_row'])
+        self.assertEqual(Analyze(loaded, self.symbols).calculate(),
+                         Analyze(self.companies, self.symbols).calculate())
+        compact = records.from_companies(self.companies)
+        self.store.put_many(compact)
+        self.assertEqual(self.store.load(self.symbols), loaded)
+
+    def test_ranges(self):
+        """Last N and from/to periods"""
+        last = self.store.load(['S2', 'S3'], ['revenue'], last=3)
+        self.assertEqual(list(last), ['S2', 'S3'])
+        self.assertEqual(last['S2']['data']['header_row'],
+                         ['2017', '2018', '2019'])
+        self.assertEqual(last['S2']['data']['revenue'],
+                         [parse_cell(cell) for cell in
+                          self.companies['S2']['data']['revenue'][-3:]])
+        self.assertNotIn('debt', last['S2']['data'])
+        between = self.store.load(start='2015', end='2016')
+        self.assertEqual(list(between), self.symbols)
+        self.assertEqual(between['S0']['data']['header_row'],
+                         ['2015', '2016'])
+        self.assertEqual(self.store.load(start='2030'), {})
+        with self.assertRaises(ValueError):
+            self.store.load(start='soon')
+        with self.assertRaises(ValueError):
+            self.store.load(frequency='m')
+
+    def test_history(self):
+        """A later page adds its periods and replaces the ones it shows,
+        a gap stays on its period"""
+        self.store.put('S0', {'data': {
+            'header_row': ['2018', '2019', '2020'],
+            'revenue': ['1', '', '3']}})
+        self.assertEqual(self.store.periods('S0'),
+                         [str(year) for year in range(2014, 2021)])
+        revenue = self.store.load(['S0'], ['revenue'])['S0']['data']
+        self.assertEqual(revenue['revenue'][-3:], [1.0, None, 3.0])
+        self.assertEqual(len(revenue['revenue']), 7)
+        self.assertNotIn('debt', self.store.load(['S0'], ['debt'], last=3)
+                         ['S0']['data'])
+        debt = self.store.load(['S0'], ['debt'])['S0']['data']['debt']
+        self.assertEqual(debt, [parse_cell(cell) for cell in
+                                self.companies['S0']['data']['debt'][:4]]
+                         + [None] * 3)
+        self.assertEqual(self.store.periods('S0', periods.QUARTERLY), [])
+
+
+class QuarterlyScrapperTestCase(unittest.TestCase):
+    """Quarterly fundamentals pages."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = StubServer().__enter__()
+        self.scrapper = Scrapper([], period='q')
+        self.scrapper.endpoints = {self.server.url: ['q/usa/', 'q/shares/']}
+        self.scrapper.get_symbols(os.path.join(self.directory.name,
+                                               'stocks.json'))
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.directory.cleanup()
+
+    def test_quarterly(self):
+        """/f/q/ pages are stored on their quarters"""
+        self.assertEqual(self.scrapper.get_fundamental_query('NYSE:DDD'),
+                         '/q/NYSE:DDD/f/q/')
+        company = self.scrapper.get_fundamental_analysis(
+            'NYSE:DDD', os.path.join(self.directory.name, 'DDD.json'))
+        self.assertTrue(any(path.endswith('/f/q/')
+                            for path in self.server.requests))
+        store = periods.PeriodStore(':memory:')
+        store.put('NYSE:DDD', company, periods.QUARTERLY)
+        loaded = store.load(['NYSE:DDD'], frequency=periods.QUARTERLY,
+                            start='2019Q3', end='2020Q1')['NYSE:DDD']['data']
+        self.assertEqual(loaded['header_row'], ['2019Q3', '2019Q4', '2020Q1'])
+        self.assertEqual(loaded['net_income'], [4.2, 3.1])
+        self.assertEqual(loaded['revenue'], [32.45, 33.1, 30.52])
+        self.assertEqual(store.load(['NYSE:DDD']), {})
+        store.close()
+        with self.assertRaises(ValueError):
+            Scrapper([], period='m')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the PostgreSQL store.
+
+Runs against POSTGRES_DSN, or a throwaway local server when pgserver is
+installed, and is skipped otherwise.
+"""
+
+import unittest
+import os
+import sys
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import synthetic
+from analysis import Analyze
+from batch import BatchAnalyze
+
+SERVER = {}
+
+
+def setUpModule():
+    """Connect to POSTGRES_DSN or start a local server"""
+    try:
+        # pylint: disable=import-outside-toplevel,unused-import
+        import psycopg2  # noqa: F401
+    except ImportError:
+        raise unittest.SkipTest('psycopg2 is not installed')
+    if os.environ.get('POSTGRES_DSN'):
+        SERVER['dsn'] = os.environ['POSTGRES_DSN']
+        return
+    try:
+        # pylint: disable=import-outside-toplevel
+        import pgserver
+    except ImportError:
+        raise unittest.SkipTest('set POSTGRES_DSN or install pgserver')
+    SERVER['directory'] = tempfile.TemporaryDirectory()
+    SERVER['server'] = pgserver.get_server(SERVER['directory'].name,
+                                           cleanup_mode='stop')
+    SERVER['dsn'] = SERVER['server'].get_uri()
+
+
+def tearDownModule():
+    """Stop the local server"""
+    if 'server' in SERVER:
+        SERVER['server'].cleanup()
+        SERVER['directory'].cleanup()
+
+
+class PostgresStoreTestCase(unittest.TestCase):
+    """Bulk load, streaming reads and score snapshots."""
+
+    def setUp(self):
+        # pylint: disable=import-outside-toplevel
+        from persistence import PostgresStore
+        self.store = PostgresStore(SERVER['dsn'], max_connections=4)
+        with self.store.connection() as connection, \
+                connection.cursor() as cursor:
+            cursor.execute("TRUNCATE symbols, headers, fundamentals, "
+                           "snapshots, scores RESTART IDENTITY")
+        rnd = random.Random(5)
+        self.symbols = [f"S{number}" for number in range(12)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+        self.data['S3']['data']['p_e'][2] = ''
+        self.store.put_many(self.data)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_put_many(self):
+        """Companies are copied as floats and replaced on a new put"""
+        self.assertEqual(self.store.symbols(), self.symbols)
+        loaded = self.store.load(['S3'])['S3']['data']
+        self.assertIsNone(loaded['p_e'][2])
+        self.assertEqual(loaded['roe'][0],
+                         float(self.data['S3']['data']['roe'][0][:-1]))
+        self.assertEqual(loaded['header_row'],
+                         self.data['S3']['data']['header_row'])
+
+        self.store.put('S3', {'data': {'debt': ['1', '2']}})
+        self.assertEqual(self.store.load(['S3']),
+                         {'S3': {'data': {'debt': [1.0, 2.0]}}})
+        self.store.put('S4', {'data': []})
+        self.assertIn('p_e', self.store.load(['S4'])['S4']['data'])
+
+    def test_shared_pool(self):
+        """Scraping workers write through one pool"""
+        rnd = random.Random(7)
+        extra = {f"W{number}": synthetic.company(rnd) for number in range(16)}
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda item: self.store.put(*item),
+                              extra.items()))
+        self.assertEqual(sorted(self.store.load(list(extra))), sorted(extra))
+
+    def test_analysis_from_store(self):
+        """Scores from streamed rows match scores from the JSON data"""
+        expected = BatchAnalyze(self.data, self.symbols).calculate()
+        packed = self.store.load_matrix(self.symbols)
+        reference = BatchAnalyze(self.data, self.symbols)
+        reference.pack()
+        self.assertEqual(packed[0], self.symbols)
+        np.testing.assert_array_equal(packed[1], reference.values)
+        np.testing.assert_array_equal(packed[2], reference.lengths)
+        self.assertEqual(BatchAnalyze({}, self.symbols, packed=packed)
+                         .calculate(), expected)
+        self.assertEqual(
+            Analyze(dict(self.store.stream(self.symbols)), self.symbols)
+            .calculate()['total_points'],
+            Analyze(self.data, self.symbols).calculate()['total_points'])
+
+    def test_score_snapshots(self):
+        """Every calculate() result is kept as its own snapshot"""
+        result = BatchAnalyze(self.data, self.symbols).calculate()
+        first = self.store.save_scores(result)
+        self.store.put('S0', {'data': {'debt': ['1', '2']}})
+        second = self.store.save_scores(
+            BatchAnalyze(self.store.load(self.symbols), self.symbols)
+            .calculate())
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.store.scores(first), result['total_points'])
+        self.assertEqual(self.store.scores(first, 'p_e'),
+                         result['points']['p_e'])
+        self.assertEqual(set(self.store.scores()), set(self.symbols))
+
+
+if __name__ == '__main__':
+    unittest.main()
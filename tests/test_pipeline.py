@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the asyncio scrapping pipeline."""
+
+import asyncio
+import unittest
+import os
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import metrics
+from archive import PageArchive
+from cache import PageCache
+from scrapping import Scrapper
+from pipeline import Pipeline
+from stub_server import StubServer
+
+
+class Clock:
+    """Manual clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def values(name, **labels):
+    """Counter values of a metric"""
+    return [item['value'] for item in metrics.REGISTRY.summary()['counters']
+            if item['name'] == name
+            and all(item['labels'].get(key) == value
+                    for key, value in labels.items())]
+
+
+class PipelineTestCase(unittest.TestCase):
+    """Pipeline against the sequential Scrapper."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = StubServer(latency=0.01).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.directory.cleanup()
+
+    def scrapper(self):
+        """Scrapper pointed at the stand-in"""
+        scrapper = Scrapper([])
+        scrapper.endpoints = {self.server.url: ['q/usa/', 'q/shares/']}
+        return scrapper
+
+    def path(self, name):
+        """File in the temporary data directory"""
+        return os.path.join(self.directory.name, name)
+
+    def test_refresh_same_as_sequential(self):
+        """Symbols and fundamentals match the blocking path"""
+        expected_scrapper = self.scrapper()
+        expected_scrapper.get_symbols(self.path('expected.json'))
+        symbols = expected_scrapper.list_symbols.symbols
+
+        scrapper = self.scrapper()
+        result = Pipeline(scrapper, concurrency=3, parse_workers=2).refresh(
+            self.path('stocks.json'), symbols, self.path('{symbol}.json'))
+
+        self.assertEqual(scrapper.list_symbols, expected_scrapper.list_symbols)
+        self.assertEqual(Scrapper.read_filename(self.path('stocks.json')),
+                         expected_scrapper.list_symbols.to_json())
+        for symbol in symbols:
+            self.assertEqual(result[symbol],
+                             expected_scrapper.get_fundamental_analysis(
+                                 symbol, self.path(f"{symbol}_expected.json")))
+
+    def test_cache_and_archive(self):
+        """Pages go through the page cache and the archive"""
+        expected = self.scrapper()
+        expected.get_symbols(self.path('expected.json'))
+        expected = expected.get_fundamental_analysis(
+            'NYSE:DDD', self.path('expected_DDD.json'))
+        clock = Clock()
+        scrapper = self.scrapper()
+        scrapper.cache = PageCache(self.path('cache.db'), ttl=100,
+                                   clock=clock)
+        scrapper.archive = PageArchive(self.path('pages'))
+        pipeline = Pipeline(scrapper, concurrency=2, parse_workers=1)
+
+        def refresh():
+            return pipeline.refresh(self.path('stocks.json'), ['NYSE:DDD'],
+                                    self.path('{symbol}.json'))['NYSE:DDD']
+
+        metrics.REGISTRY.reset()
+        self.assertEqual(refresh(), expected)
+        self.assertEqual(sum(values('page_archive', result='parsed')), 1)
+        requests = len(self.server.requests)
+        self.assertEqual(refresh(), expected)
+        self.assertEqual(len(self.server.requests), requests)
+
+        clock.now += 101
+        self.assertEqual(refresh(), expected)
+        self.assertEqual(len(self.server.requests), requests + 3)
+        self.assertEqual(sum(values('page_cache', result='revalidated')), 3)
+        self.assertEqual(sum(values('page_archive', result='parsed')), 1)
+
+        clock.now += 101
+        self.server.pages['financials'] = self.server.pages['financials'] \
+            .replace('field="p_e"', 'field="p_e_old"')
+        changed = refresh()
+        self.assertNotIn('p_e', changed['data'])
+        self.assertEqual(sum(values('page_archive', result='parsed')), 2)
+        self.assertEqual(Scrapper.read_filename(self.path('NYSE:DDD.json')),
+                         changed)
+        scrapper.archive.close()
+        scrapper.cache.close()
+
+    def test_bounded_queues(self):
+        """Results keep task order with a queue smaller than the tasks"""
+        pipeline = Pipeline(self.scrapper(), concurrency=2, parse_workers=1,
+                            queue_size=1)
+        tasks = [(len, f"/q/S{number}/f/y/", self.server.url)
+                 for number in range(10)] + [(len, '/missing/', self.server.url)]
+        results = asyncio.run(pipeline.run(tasks))
+        self.assertEqual(len(set(results[:10])), 1)
+        self.assertGreater(results[0], 0)
+        self.assertEqual(results[10], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
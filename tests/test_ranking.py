@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the streaming ranking."""
+
+import unittest
+import os
+import sys
+import random
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import ranking
+import synthetic
+from analysis import Analyze, CRITERIA_REGRESSION
+
+
+def full_ranking(data):
+    """Summed criteria points of every symbol from one Analyze of the
+    whole universe, trend points per symbol"""
+    analyze = Analyze(data, list(data))
+    points = analyze.calculate()['points']
+    totals = dict.fromkeys(data, 0.0)
+    for title, values in points.items():
+        if title not in CRITERIA_REGRESSION:
+            for symbol, point in values.items():
+                totals[symbol] += point
+    for title in CRITERIA_REGRESSION:
+        sign = -1 if title == 'debt' else 1
+        coef = {symbol: sign * result['regression_coef'] for symbol, result
+                in analyze.calculations[f"{title}_regression"].items()}
+        for symbol, value in coef.items():
+            if value > 0:
+                totals[symbol] += 0.5
+        best = max(coef, key=coef.get)
+        if coef[best] > 0:
+            totals[best] += 0.5
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+class TopKTestCase(unittest.TestCase):
+    """Bounded ranking against the full one."""
+
+    def setUp(self):
+        rnd = random.Random(3)
+        self.data = {f"S{number}": synthetic.company(rnd)
+                     for number in range(60)}
+        self.results = list(ranking.symbol_results(self.data.items()))
+
+    def test_same_as_full_ranking(self):
+        """Top k matches the head of the full ranking in any order"""
+        expected = full_ranking(self.data)[:7]
+        for seed in range(3):
+            results = list(self.results)
+            random.Random(seed).shuffle(results)
+            top = ranking.TopK(7).extend(results)
+            self.assertEqual([symbol for symbol, _ in top.result()],
+                             [symbol for symbol, _ in expected])
+            for (_, score), (_, value) in zip(top.result(), expected):
+                self.assertAlmostEqual(score, value)
+
+    def test_bounded(self):
+        """Only k symbols and the bonus holders are kept"""
+        top = ranking.TopK(3).extend(self.results)
+        self.assertEqual(len(top.heap), 3)
+        self.assertLessEqual(len(top.held), len(top.rules.trend))
+        self.assertEqual(len(top.result()), 3)
+
+    def test_top(self):
+        """Raw companies are scored one at a time"""
+        data = dict(self.data, EMPTY={'data': []})
+        self.assertEqual(ranking.top(data.items(), 5),
+                         ranking.TopK(5).extend(self.results).result())
+        self.assertEqual(ranking.top(data.items(), 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
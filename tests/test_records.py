@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the compact record types."""
+
+import unittest
+import os
+import sys
+import random
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import records
+import synthetic
+from analysis import Analyze
+from batch import BatchAnalyze
+from scrapping import Scrapper
+from storage import FundamentalsStore
+
+LISTING = {'data': [
+    {'fundamental_analysis': True, 'name': 'Apple', 'symbol': 'AAPL'},
+    {'fundamental_analysis': False, 'name': 'Nokia', 'symbol': 'NOK'},
+    {'fundamental_analysis': True, 'name': 'BRK', 'symbol': 'NYSE.BRK'},
+    {'fundamental_analysis': True, 'name': 'Apple', 'symbol': 'AAPL'},
+]}
+
+
+class SymbolTableTestCase(unittest.TestCase):
+    """Column-wise listing."""
+
+    def test_round_trip(self):
+        """to_json gives the listing back"""
+        table = records.SymbolTable.from_json(LISTING)
+        self.assertEqual(table.to_json(), LISTING)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.get('NOK'),
+                         records.SymbolRecord('NOK', 'Nokia', False))
+        self.assertEqual(table.rows('AAPL'), (0, 3))
+        self.assertIsNone(table.get('MISSING'))
+        self.assertIn('NYSE.BRK', table)
+        self.assertEqual(table.with_fundamentals(),
+                         ['AAPL', 'NYSE.BRK', 'AAPL'])
+        self.assertFalse(hasattr(table[0], '__dict__'))
+
+    def test_fundamental_query(self):
+        """Scrapper finds queries through the table"""
+        scrapper = Scrapper([])
+        scrapper.list_symbols = records.SymbolTable.from_json(LISTING)
+        self.assertEqual(scrapper.get_fundamental_query('AAPL'),
+                         '/q/AAPL/f/y//q/AAPL/f/y/')
+        self.assertEqual(scrapper.get_fundamental_query('NYSE.BRK'),
+                         '/q/BRK/f/y/')
+        self.assertEqual(scrapper.get_fundamental_query('NOK'), '')
+        scrapper.list_symbols = records.SymbolTable([LISTING['data'][1]])
+        self.assertEqual(scrapper.get_fundamental_query('AAPL'), '')
+
+
+class FundamentalsTestCase(unittest.TestCase):
+    """Contiguous float block of a company."""
+
+    def setUp(self):
+        rnd = random.Random(2)
+        self.companies = {f"S{number}": synthetic.company(rnd)
+                          for number in range(12)}
+        self.symbols = list(self.companies)
+
+    def test_round_trip(self):
+        """Floats, None for gaps, ragged series keep their length"""
+        company = {'data': {'header_row': ['2019', '2020', '2021'],
+                            'revenue': ['1 234,5', '', '7%'],
+                            'debt': ['3']}}
+        record = records.Fundamentals.from_json(company)
+        self.assertEqual(record.block.shape, (2, 3))
+        self.assertTrue(record.block.flags['C_CONTIGUOUS'])
+        expected = {'data': {'header_row': ['2019', '2020', '2021'],
+                             'revenue': [1234.5, None, 7.0],
+                             'debt': [3.0]}}
+        self.assertEqual(record.to_json(), expected)
+        self.assertEqual(records.Fundamentals.from_json(expected).to_json(),
+                         expected)
+        series = record.series('revenue')
+        np.testing.assert_array_equal(series.mask, [True, False, True])
+        self.assertEqual(records.Fundamentals.from_json({'data': []})
+                         .to_json(), {'data': {}})
+
+    def test_analyze(self):
+        """Analyze and BatchAnalyze score records like the JSON"""
+        compact = records.from_companies(self.companies)
+        expected = Analyze(self.companies, self.symbols)
+        result = Analyze(compact, self.symbols)
+        self.assertEqual(result.calculate(), expected.calculate())
+        self.assertEqual(repr(result.calculations),
+                         repr(expected.calculations))
+        self.assertEqual(BatchAnalyze(compact, self.symbols).calculate(),
+                         BatchAnalyze(self.companies,
+                                      self.symbols).calculate())
+
+    def test_store(self):
+        """FundamentalsStore takes records like the JSON"""
+        compact = records.from_companies(self.companies)
+        store = FundamentalsStore(':memory:')
+        store.put_many(compact)
+        self.assertEqual(store.load(self.symbols),
+                         records.to_companies(compact))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
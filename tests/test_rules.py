@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the scoring rules."""
+
+import unittest
+import copy
+import os
+import sys
+import random
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import rules
+import synthetic
+from batch import BatchAnalyze
+
+
+def ladder_if_chain(precents):
+    """Liabilities/Assets ladder of Analyze.liabilities_assets"""
+    point = 0
+    if precents < 50:
+        point += 2
+    if 60 >= precents > 50:
+        point += 1 / 2
+    if 70 >= precents > 60:
+        point += 1 / 3
+    if 80 >= precents > 70:
+        point += 1 / 4
+    if 90 >= precents > 80:
+        point += 1 / 5
+    if precents > 90:
+        point += 1 / 6
+    return point
+
+
+class LadderTestCase(unittest.TestCase):
+    """Compiled bands."""
+
+    def test_bounds(self):
+        """Open and closed bounds on and between the edges"""
+        ladder = rules.Ladder({'(-inf, 6]': 2, '(6, 10)': 1, '[20, 20]': 5})
+        values = [-1, 6, 6.5, 10, 15, 20, 21, np.nan]
+        self.assertEqual(ladder(values).tolist(),
+                         [2, 2, 1, 0, 0, 5, 0, 0])
+
+    def test_same_as_if_chain(self):
+        """Default l_a bands score like the hard-coded ladder"""
+        ladder = rules.default().l_a
+        values = [value / 2 for value in range(0, 220)]
+        self.assertEqual(ladder(values).tolist(),
+                         [ladder_if_chain(value) for value in values])
+
+    def test_invalid_band(self):
+        """Bands must be intervals"""
+        with self.assertRaises(ValueError):
+            rules.Ladder({'< 8': 1})
+
+
+class RulesTestCase(unittest.TestCase):
+    """Rules in the batch engine."""
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.symbols = [f"S{number}" for number in range(25)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+
+    def test_custom_rules(self):
+        """Tuned bands change the scores without code changes"""
+        config = copy.deepcopy(rules.default().config)
+        config['limitations']['p_e']['bands'] = {'(-inf, inf)': 1}
+        config['rank_bonus']['p_e'] = 0
+        config['limitations']['p_e']['trend_bonus'] = 0
+        engine = BatchAnalyze(self.data, self.symbols,
+                              scoring=rules.Rules(config))
+        result = engine.calculate()
+        # every one of the 6 years in the band, added year by year
+        self.assertEqual(set(result['points']['p_e'].values()),
+                         {sum([1 / 6] * 6)})
+        default = BatchAnalyze(self.data, self.symbols).calculate()
+        self.assertEqual(result['points']['p_s'], default['points']['p_s'])
+
+    def test_load(self):
+        """Rules file is read from disk"""
+        loaded = rules.Rules.load(rules.RULES_FILE)
+        self.assertEqual(loaded.config, rules.default().config)
+        self.assertEqual(loaded.trend_bonus('p_e'), 0.5)
+        self.assertEqual(loaded.trend_bonus('l_a'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
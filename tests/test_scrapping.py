@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the scrapping module against the local stand-in."""
+
+import unittest
+import os
+import sys
+import tempfile
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+from scrapping import Scrapper
+from fetcher import Fetcher, RateLimiter
+from stub_server import StubServer, read_fixture
+
+
+class ScrapperTestCase(unittest.TestCase):
+    """Scrapper against the stand-in server."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = StubServer(latency=0.02).__enter__()
+        self.scrapper = Scrapper([])
+        self.scrapper.endpoints = {self.server.url: ['q/usa/', 'q/shares/']}
+        self.scrapper.get_symbols(self.path('stocks.json'))
+
+    def tearDown(self):
+        self.server.__exit__()
+        self.directory.cleanup()
+
+    def path(self, name):
+        """File in the temporary data directory"""
+        return os.path.join(self.directory.name, name)
+
+    def symbols(self):
+        """Symbols with a fundamental analysis page"""
+        return self.scrapper.list_symbols.with_fundamentals()
+
+    def test_get_symbols(self):
+        """Listing pages are parsed and saved"""
+        self.assertEqual(len(self.scrapper.list_symbols), 20)
+        self.assertEqual(Scrapper.read_filename(self.path('stocks.json')),
+                         self.scrapper.list_symbols.to_json())
+
+    def test_stream_symbols(self):
+        """Records are yielded and written as NDJSON as pages are parsed"""
+        scrapper = Scrapper([])
+        scrapper.endpoints = self.scrapper.endpoints
+        stream = scrapper.stream_symbols(self.path('stream.json'))
+        first = next(stream)
+        self.assertEqual(list(scrapper.list_symbols), [first])
+        self.assertTrue(os.path.exists(self.path('stream.json.part')))
+        records = [first] + list(stream)
+        self.assertEqual(records, list(self.scrapper.list_symbols))
+        self.assertFalse(os.path.exists(self.path('stream.json.part')))
+        with open(self.path('stream.json')) as file:
+            self.assertEqual(len(file.readlines()), 20)
+        self.assertEqual(Scrapper.read_symbols(self.path('stream.json')),
+                         self.scrapper.list_symbols)
+        self.assertEqual(Scrapper.read_symbols(self.path('stocks.json')),
+                         self.scrapper.list_symbols)
+        requests = len(self.server.requests)
+        self.assertEqual(list(scrapper.stream_symbols(self.path('stream.json'))),
+                         records)
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_bulk_same_as_single(self):
+        """Bulk fetch has the get_fundamental_analysis shape"""
+        symbols = self.symbols()
+        result = self.scrapper.get_fundamental_analysis_bulk(
+            symbols + ['UNKNOWN'], self.path('{symbol}_bulk.json'),
+            concurrency=4)
+        expected = {'data': self.scrapper.parse_body_financial(
+            read_fixture('financials.html'))}
+        for symbol in symbols:
+            self.assertEqual(result[symbol], expected)
+            self.assertEqual(self.scrapper.get_fundamental_analysis(
+                symbol, self.path(f"{symbol}_single.json")), expected)
+        self.assertEqual(result['UNKNOWN'], {'data': []})
+
+    def test_bulk_pooled_and_concurrent(self):
+        """Connections are reused and requests overlap"""
+        pages = [(f"/q/{symbol}/f/y/", self.server.url)
+                 for symbol in self.symbols()]
+        requests_before = len(self.server.requests)
+        started = time.monotonic()
+        with Fetcher(concurrency=4) as fetcher:
+            bodies = fetcher.get_many(pages)
+        elapsed = time.monotonic() - started
+        self.assertEqual(len(self.server.requests) - requests_before,
+                         len(pages))
+        self.assertTrue(all(bodies))
+        self.assertLess(elapsed, len(pages) * self.server.latency)
+        # listing pages used one connection each, the fetcher at most 4
+        self.assertLessEqual(len(self.server.connections), 2 + 4)
+
+    def test_rate_limiter(self):
+        """Requests to one host are spaced out"""
+        limiter = RateLimiter(rate=50)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.wait('smart-lab.ru')
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 50 - 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the import time budget of the CLI."""
+
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+SRC_DIR = os.path.join(PROJECT_DIR, 'src')
+
+HEAVY = ['numpy', 'requests', 'bs4', 'lxml', 'statsmodels', 'scipy',
+         'pandas', 'psycopg2']
+# microseconds of imports over a bare interpreter, generous for slow CI
+BUDGET = 150000
+
+CACHED_ANALYSIS = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import app
+company = {'data': {metric: ['10', '12', '15'] for metric in [
+    'market_cap', 'debt', 'assets', 'revenue', 'net_income', 'p_e', 'p_s',
+    'p_bv', 'roe', 'roa', 'ev_ebitda', 'debt_ebitda']}}
+company['data']['debt'] = ['15', '12', '10']
+with open(sys.argv[2], 'w') as file:
+    json.dump({'data': [{'symbol': 'X'}]}, file)
+with open(sys.argv[3], 'w') as file:
+    json.dump(company, file)
+scrapper = app.scrapping.Scrapper(['MICEX'])
+scrapper.get_symbols(sys.argv[2])
+companies = {'X': scrapper.get_fundamental_analysis('X', sys.argv[3])}
+app.analysis.Analyze(companies, ['X']).calculate()
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def import_times(*args):
+    """{module: cumulative us} of the top level imports of a run"""
+    process = subprocess.run([sys.executable, '-X', 'importtime', *args],
+                             cwd=SRC_DIR, capture_output=True, text=True,
+                             check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+class StartupTestCase(unittest.TestCase):
+    """Heavy dependencies load only on the code paths using them."""
+
+    def test_version(self):
+        """--version imports no heavy module and stays in budget"""
+        bare = import_times('-c', 'pass')
+        times = import_times('app.py', '--version')
+        for module in HEAVY:
+            self.assertNotIn(module, times)
+        spent = sum(cumulative for name, cumulative in times.items()
+                    if name not in bare)
+        self.assertLess(spent, BUDGET)
+
+    def test_cached_analysis(self):
+        """Analysis of saved files needs no http, html or OLS library"""
+        with tempfile.TemporaryDirectory() as directory:
+            process = subprocess.run(
+                [sys.executable, '-c', CACHED_ANALYSIS, SRC_DIR,
+                 os.path.join(directory, 'stocks.json'),
+                 os.path.join(directory, 'X_financials.json')],
+                capture_output=True, text=True, check=True)
+        modules = json.loads(process.stdout.splitlines()[-1])
+        self.assertIn('numpy', modules)
+        for module in ['requests', 'bs4', 'lxml', 'statsmodels']:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the fundamentals store."""
+
+import unittest
+import json
+import os
+import sys
+import random
+import tempfile
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(TEST_DIR, os.pardir))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+sys.path.insert(0, TEST_DIR)
+import synthetic
+from analysis import Analyze
+from batch import BatchAnalyze
+from normalize import parse_cell
+from storage import FundamentalsStore
+
+
+class FundamentalsStoreTestCase(unittest.TestCase):
+    """Migration and loading."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rnd = random.Random(5)
+        self.symbols = [f"S{number}" for number in range(12)]
+        self.data = {symbol: synthetic.company(rnd) for symbol in self.symbols}
+        self.data['S3']['data']['p_e'][2] = ''
+        for symbol, values in self.data.items():
+            with open(self.path(f"{symbol}_financials.json"), 'w') as file:
+                file.write(json.dumps(values))
+        with open(self.path('EMPTY_financials.json'), 'w') as file:
+            file.write(json.dumps({'data': []}))
+        self.store = FundamentalsStore(self.path('fundamentals.db'))
+        self.migrated = self.store.migrate_json(self.directory.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def path(self, name):
+        """File in the temporary data directory"""
+        return os.path.join(self.directory.name, name)
+
+    def test_migrate_json(self):
+        """JSON files are imported as floats"""
+        self.assertEqual(sorted(self.migrated), sorted(self.symbols))
+        loaded = self.store.load(['S3'])['S3']['data']
+        self.assertIsNone(loaded['p_e'][2])
+        self.assertEqual(loaded['roe'][0],
+                         float(self.data['S3']['data']['roe'][0][:-1]))
+        self.assertEqual(loaded['header_row'],
+                         self.data['S3']['data']['header_row'])
+
+    def test_load_slice(self):
+        """Only wanted symbols, metrics and years are read"""
+        loaded = self.store.load(['S5', 'S1'], metrics=['debt'], years=(2, 4))
+        self.assertEqual(list(loaded), ['S5', 'S1'])
+        self.assertEqual(list(loaded['S1']['data']), ['debt'])
+        self.assertEqual(loaded['S1']['data']['debt'],
+                         [parse_cell(value) for value
+                          in self.data['S1']['data']['debt'][2:4]])
+
+    def test_analysis_from_store(self):
+        """Scores from the store match scores from the JSON files"""
+        expected = BatchAnalyze(self.data, self.symbols).calculate()
+        packed = self.store.load_matrix(self.symbols)
+        reference = BatchAnalyze(self.data, self.symbols)
+        reference.pack()
+        np.testing.assert_array_equal(packed[1], reference.values)
+        np.testing.assert_array_equal(packed[2], reference.lengths)
+        self.assertEqual(BatchAnalyze({}, self.symbols, packed=packed)
+                         .calculate(), expected)
+        self.assertEqual(
+            Analyze(self.store.load(self.symbols), self.symbols)
+            .calculate()['total_points'],
+            Analyze(self.data, self.symbols).calculate()['total_points'])
+
+
+if __name__ == '__main__':
+    unittest.main()